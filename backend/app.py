@@ -1,7 +1,6 @@
 from typing import Dict, Type
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from enum import Enum
 from layers.activation_function_layers.convolutional_layer import ConvolutionalLayer, ConvolutionType
 from layers.activation_function_layers.pooling_layer import PoolingLayer
 from activation_functions.activation_function import ReLUFunction, LeakyReLUFunction, TanhFunction, SoftMaxFunction
@@ -22,16 +21,36 @@ from layers.misc_layers.attention_layer import AttentionLayer
 from layers.misc_layers.normalization_layer import NormalizationLayer
 from layers.misc_layers.dropout_layer import DropoutLayer
 from layers.misc_layers.recurrent_layer import RecurrentLayer
-from layers.layer import Layer
-import inspect
+from layers.layer import Layer, ParamError, jsonable
 import json
 from neural_network import NeuralNetwork
 from connection import Connection
+from catalog import LayerCatalog
+from network_store import create_network_store
+from batch import BatchPlan, BatchError, graph_to_operations
+from event_log import create_event_log, EventLogFull
+from shape_inference import shape_inference_for
+from cost_model import cost_model
+from memory_planner import MemoryPlan
+from parallelism import ParallelismAnalysis, layer_weights, measure_latencies
+from sweep import Sweep
+from pytorch_export import stream_pytorch, check_exportable, ExportError
+from graph_optimizer import GraphOptimizer
+from graph_validator import graph_validator_for
+from numpy_executor import NumpyExecutor, ExecutorError, numpy_available, MAX_BATCH_SIZE
+from graph_diff import GraphDiff, MATCH_MODES, merge
+from structural_hash import block_index_for
+from collaboration import CollaborationHub
+from history import NetworkHistory, history_for
+from snapshot import create_snapshot_store, SnapshotError, MAGIC
+from asset_store import asset_store, ASSET_DIRS
+from metrics import RequestMetrics, InstrumentedApp, create_profiler, ROUTE_KEY
 from flask_jwt_extended import (
     JWTManager, create_access_token,
     jwt_required, get_jwt_identity
 )
 import os
+from contextlib import ExitStack
 
 app = Flask(__name__)
 #how to use env variables in flask?
@@ -62,8 +81,7 @@ def login():
 
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-networks = []
-current_id = 0
+networks = create_network_store()
 
 @app.route("/")
 def hello_world():
@@ -76,74 +94,47 @@ def test():
 def get_class_info(cls):    
     if issubclass(cls, Layer):
         all_params = []
-        for c in cls.__mro__:
-            if c == object:  
-                break
-                
-            if hasattr(c, '__init__'):
-                sig = inspect.signature(c.__init__)
-                for name, param in sig.parameters.items():
-                    if name != 'self' and name not in [p['name'] for p in all_params]:
-                        param_type = param.annotation
-                        param_info = {
-                            "name": name,
-                            "type": "string",
-                            "is_basic": False 
-                        }
-                        
-                        if cls == ConvolutionalLayer and name in ['conv_type', 'filters', 'kernel_size', 'stride', 'in_channels']:
-                            param_info["is_basic"] = True
-                        elif cls == PoolingLayer and name in ['pooling_type', 'pool_dimension', 'pool_size', 'kernel_size']:
-                            param_info["is_basic"] = True
-                        elif cls == BaseInputLayer and name in ['input_shape', 'input_type']:
-                            param_info["is_basic"] = True
-                        elif cls == DenseLayer and name in ['units']:
-                            param_info["is_basic"] = True
-                        elif cls == DropoutLayer and name in ['probability', 'inplace']:
-                            param_info["is_basic"] = True
-                        elif cls == FlatteningLayer and name in ['start_dim', 'end_dim']:
-                            param_info["is_basic"] = True
-                        elif cls == EmbeddingLayer and name in ['num_embeddings', 'embedding_dim']:
-                            param_info["is_basic"] = True
-                        elif cls == AttentionLayer and name in ['embed_dim', 'num_heads']:
-                            param_info["is_basic"] = True
-                        elif cls == NormalizationLayer and name in ['normalization_type']:
-                            param_info["is_basic"] = True
-                      
-                        elif cls == RecurrentLayer and name in ['recurrent_type', 'input_size', 'hidden_size', 'num_layers']:
-                            param_info["is_basic"] = True
-                        
-                        default_attr_name = f"DEFAULT_{name.upper()}"
-                        if hasattr(c, default_attr_name):
-                            default_value = getattr(c, default_attr_name)
-                            # Handle enum values
-                            if isinstance(default_value, Enum):
-                                param_info["default"] = default_value.name
-                            else:
-                                param_info["default"] = default_value
-                        elif param.default != inspect.Parameter.empty:
-                            if isinstance(param.default, Enum):
-                                param_info["default"] = param.default.name
-                            else:
-                                param_info["default"] = param.default
-                                
-                        if param_type != inspect.Parameter.empty:
-                            if inspect.isclass(param_type) and issubclass(param_type, Enum):
-                                param_info["type"] = "enum"
-                                param_info["enum_type"] = param_type.__name__
-                                param_info["enum_values"] = [e.name for e in param_type]
-                            elif param_type == int:
-                                param_info["type"] = "number"
-                            elif param_type == float:
-                                param_info["type"] = "number"
-                            elif param_type == bool:
-                                param_info["type"] = "boolean"
-                            elif param_type == list or str(param_type).startswith("typing.List"):
-                                param_info["type"] = "array"
-                            elif param_type == dict or str(param_type).startswith("typing.Dict"):
-                                param_info["type"] = "object"
-                        
-                        all_params.append(param_info)
+        for param in cls.schema().params:
+            name = param.name
+            param_info = {
+                "name": name,
+                "type": param.kind,
+                "is_basic": False 
+            }
+            
+            if cls == ConvolutionalLayer and name in ['conv_type', 'filters', 'kernel_size', 'stride', 'in_channels']:
+                param_info["is_basic"] = True
+            elif cls == PoolingLayer and name in ['pooling_type', 'pool_dimension', 'pool_size', 'kernel_size']:
+                param_info["is_basic"] = True
+            elif cls == BaseInputLayer and name in ['input_shape', 'input_type']:
+                param_info["is_basic"] = True
+            elif issubclass(cls, BaseInputLayer) and name in ['input_shape']:
+                param_info["is_basic"] = True
+            elif cls == DenseLayer and name in ['units']:
+                param_info["is_basic"] = True
+            elif cls == DropoutLayer and name in ['probability', 'inplace']:
+                param_info["is_basic"] = True
+            elif cls == FlatteningLayer and name in ['start_dim', 'end_dim']:
+                param_info["is_basic"] = True
+            elif cls == EmbeddingLayer and name in ['num_embeddings', 'embedding_dim']:
+                param_info["is_basic"] = True
+            elif cls == AttentionLayer and name in ['embed_dim', 'num_heads']:
+                param_info["is_basic"] = True
+            elif cls == NormalizationLayer and name in ['normalization_type']:
+                param_info["is_basic"] = True
+          
+            elif cls == RecurrentLayer and name in ['recurrent_type', 'input_size', 'hidden_size', 'num_layers']:
+                param_info["is_basic"] = True
+            
+            # Defaults and types come from the same schema that validates
+            # from_params, so the catalog always matches what the API accepts.
+            if not param.required:
+                param_info["default"] = jsonable(param.default)
+            if param.enum is not None:
+                param_info["enum_type"] = param.enum.__name__
+                param_info["enum_values"] = [e.name for e in param.enum]
+            
+            all_params.append(param_info)
         
         if hasattr(cls, '__name__') and cls.__name__.endswith('InputLayer') and cls != BaseInputLayer:
             if not any(p['name'] == 'input_type' for p in all_params):
@@ -181,44 +172,43 @@ def get_class_info(cls):
     
     return {"type": "unknown", "name": cls.__name__}
 
+def build_layer_catalog():
+    asset_store.refresh()
+    return {
+        "layer_types": [get_class_info(cls) for cls in LAYER_TYPES.values()]
+    }
+
+
+def send_cached_payload(payload, mimetype, cache_control):
+    if payload.etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        encoding = request.accept_encodings.best_match(list(payload.encodings), default='identity')
+        response = Response(payload.body_for(encoding), mimetype=mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(payload.etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+
 @app.route('/api/layer-types', methods=['GET'])
 def get_layer_types():
-    layer_types = [
-        get_class_info(ConvolutionalLayer),
-        get_class_info(PoolingLayer),
-        get_class_info(ReLUFunction),
-        get_class_info(LeakyReLUFunction),
-        get_class_info(TanhFunction),
-        get_class_info(SoftMaxFunction),
-        get_class_info(BaseInputLayer),  
-        get_class_info(ImageInputLayer), 
-        get_class_info(TextInputLayer),
-        get_class_info(TabularInputLayer),
-        get_class_info(AudioInputLayer),
-        get_class_info(VideoInputLayer),
-        get_class_info(DenseLayer),
-        get_class_info(FlatteningLayer),
-        get_class_info(EmbeddingLayer),
-        get_class_info(AttentionLayer),
-        get_class_info(NormalizationLayer),
-        get_class_info(DropoutLayer),
-        get_class_info(RecurrentLayer),
-        get_class_info(CustomLayer)
+    return send_cached_payload(layer_catalog.get(), 'application/json', 'no-cache')
 
-    ]
 
-    return jsonify({
-        "layer_types": layer_types
-    })
+@app.route('/api/assets/<asset_hash>.svg', methods=['GET'])
+def get_asset(asset_hash):
+    asset = asset_store.get(asset_hash)
+    if asset is None:
+        return jsonify({"error": f"Asset not found: {asset_hash}"}), 404
+    return send_cached_payload(asset, 'image/svg+xml', 'public, max-age=31536000, immutable')
 
 
 @app.route('/api/networks', methods=['POST'])
 def create_network():
-    global current_id
-    network_id = str(current_id)
-    current_id += 1
-    network = NeuralNetwork(network_id)
-    networks.append(network)
+    network_id = networks.create_network()
     
     return jsonify({"id": network_id})
 
@@ -245,6 +235,13 @@ LAYER_TYPES : Dict[str, Type[Layer]] = {
     'CustomLayer': CustomLayer
 }
 
+layer_catalog = LayerCatalog(
+    build_layer_catalog,
+    LAYER_TYPES.values(),
+    ASSET_DIRS
+)
+layer_catalog.rebuild()
+
 @app.route('/api/networks/<network_id>/layers', methods=['POST'])
 def add_layer(network_id):
     data = request.json
@@ -256,16 +253,18 @@ def add_layer(network_id):
     if not layer_class:
         return jsonify({"error": f"Unknown layer type: {layer_type}"}), 400
         
-    layer = layer_class.from_params(params)
+    try:
+        layer = layer_class.from_params(params)
+    except ParamError as e:
+        return jsonify({"error": f"Invalid params for {layer_type}", "details": e.errors}), 400
 
-    network = find_network_by_id(network_id)
-    
-    if not network:
-        return jsonify({"error": f"Network not found: {network_id}"}), 404
-        
-    layer_id = len(network.layers)
-    layer.id = layer_id
-    network.add_layer(layer)
+    with networks.mutate(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+            
+        history = history_for(network)
+        layer_id = network.add_layer(layer)
+        history.commit(f"Add {layer_type} {layer_id}")
 
     return jsonify({"id": layer_id})
 
@@ -274,49 +273,460 @@ def connect_layers(network_id):
     data = request.json
     source_id = data.get('source')
     target_id = data.get('target')
-    network = find_network_by_id(network_id)
-    
-    if not network:
-        return jsonify({"error": f"Network not found: {network_id}"}), 404
+    with networks.mutate(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+            
+        source_layer = network.find_layer(source_id)
+        target_layer = network.find_layer(target_id)
         
-    source_layer = network.find_layer(source_id)
-    target_layer = network.find_layer(target_id)
-    
-    if not source_layer:
-        return jsonify({"error": f"Source layer not found: {source_id}"}), 404
-    if not target_layer:
-        return jsonify({"error": f"Target layer not found: {target_id}"}), 404
-   
-    source_layer.connect_to(target_layer)
-    
-    connection_id = len(network.connections)
-    connection = Connection(source_layer, target_layer)
-    network.add_connection(connection)
+        if not source_layer:
+            return jsonify({"error": f"Source layer not found: {source_id}"}), 404
+        if not target_layer:
+            return jsonify({"error": f"Target layer not found: {target_id}"}), 404
+
+        problem = graph_validator_for(network).check_connection(source_id, target_id)
+        if problem:
+            return jsonify({"error": problem}), 400
+       
+        history = history_for(network)
+        connection = network.connect(source_layer, target_layer)
+        history.commit(f"Connect {source_id} to {target_id}")
     
-    return jsonify({"id": connection_id})
+    return jsonify({"id": connection.id})
+
+@app.route('/api/networks/<network_id>/shapes', methods=['GET'])
+def get_network_shapes(network_id):
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        return jsonify(shape_inference_for(network).summary())
+
+@app.route('/api/networks/<network_id>/validate', methods=['GET'])
+def validate_network(network_id):
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        return jsonify(graph_validator_for(network).validate())
+
+@app.route('/api/networks/<network_id>/blocks', methods=['GET'])
+def get_repeated_blocks(network_id):
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        return jsonify(block_index_for(network).summary())
+
+@app.route('/api/networks/<network_id>/cost', methods=['GET'])
+def get_network_cost(network_id):
+    batch_size = request.args.get('batch_size', 1, type=int)
+    dtype = request.args.get('dtype', 'float32')
+
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        try:
+            return jsonify(cost_model.estimate(network, batch_size, dtype))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+@app.route('/api/networks/<network_id>/memory', methods=['GET'])
+def get_memory_plan(network_id):
+    batch_size = request.args.get('batch_size', 1, type=int)
+    dtype = request.args.get('dtype', 'float32')
+    alignment = request.args.get('alignment', 64, type=int)
+    inplace = request.args.get('inplace', 'true').lower() != 'false'
+
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        try:
+            return jsonify(MemoryPlan(network, batch_size, dtype, alignment, inplace).to_dict())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+@app.route('/api/networks/<network_id>/sweep', methods=['POST'])
+def sweep_network(network_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        sweep = Sweep(data.get('batch_sizes', [1]), data.get('resolutions'), data.get('dtype', 'float32'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+        try:
+            payload = sweep.prepare(network)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    return jsonify(sweep.run(payload))
+
+@app.route('/api/networks/<network_id>/export/pytorch', methods=['GET'])
+def export_pytorch(network_id):
+    class_name = request.args.get('class_name', 'GeneratedNet')
+    if not class_name.isidentifier():
+        return jsonify({"error": f"Invalid class name: {class_name}"}), 400
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+        try:
+            check_exportable(network)
+        except ExportError as e:
+            return jsonify({"error": str(e)}), 400
+
+    def generate():
+        with networks.read(network_id) as network:
+            yield from stream_pytorch(network, class_name)
+
+    response = Response(stream_with_context(generate()), mimetype='text/x-python')
+    response.headers['Content-Disposition'] = f'attachment; filename="network_{network_id}.py"'
+    return response
+
+@app.route('/api/networks/<network_id>/optimize', methods=['POST'])
+def optimize_network(network_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        optimizer = GraphOptimizer(data.get('passes'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    outputs = data.get('outputs')
+    if outputs is not None and not (isinstance(outputs, list) and all(isinstance(i, int) for i in outputs)):
+        return jsonify({"error": "outputs must be a list of layer ids"}), 400
+
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        try:
+            result = optimizer.optimize(network, outputs)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    return jsonify(result.to_dict())
+
+@app.route('/api/networks/<network_id>/run', methods=['POST'])
+def run_network(network_id):
+    if not numpy_available():
+        return jsonify({"error": "Running networks needs NumPy, which is not installed"}), 501
+    data = request.get_json(silent=True) or {}
+    batch_size = data.get('batch_size', 1)
+    if not isinstance(batch_size, int) or not 1 <= batch_size <= MAX_BATCH_SIZE:
+        return jsonify({"error": f"batch_size must be an integer from 1 to {MAX_BATCH_SIZE}"}), 400
+    inputs = data.get('inputs')
+    if inputs is not None:
+        if not isinstance(inputs, dict):
+            return jsonify({"error": "inputs must map input layer ids to nested lists"}), 400
+        try:
+            inputs = {int(layer_id): value for layer_id, value in inputs.items()}
+        except ValueError:
+            return jsonify({"error": "inputs must map input layer ids to nested lists"}), 400
+
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+        try:
+            executor = NumpyExecutor(network, seed=data.get('seed', 0), training=bool(data.get('training')))
+            plan = None
+            if data.get('arena'):
+                batch = len(next(iter(inputs.values()))) if inputs else batch_size
+                plan = MemoryPlan(network, batch, executor.dtype.__name__)
+        except (ExecutorError, ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+
+    # The kernels hold their own weights and configs, so the network is
+    # released before the (possibly long) forward pass.
+    try:
+        result = executor.run(inputs, batch_size, seed=data.get('input_seed'), plan=plan)
+    except (ExecutorError, ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    response = result.to_dict()
+    if plan is not None:
+        response["arena_bytes"] = plan.arena_bytes
+    return jsonify(response)
+
+@app.route('/api/networks/<network_id>/parallelism', methods=['POST'])
+def analyze_parallelism(network_id):
+    data = request.get_json(silent=True) or {}
+    devices = data.get('devices')
+    if devices is not None and (not isinstance(devices, int) or devices < 1):
+        return jsonify({"error": "devices must be a positive integer"}), 400
+    weight = data.get('weight', 'flops')
+    latencies = data.get('latencies')
+    if latencies is not None:
+        try:
+            latencies = {int(layer_id): float(ms) for layer_id, ms in latencies.items()}
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({"error": "latencies must map layer ids to milliseconds"}), 400
+    elif weight == 'latency':
+        if not numpy_available():
+            return jsonify({"error": "Measuring latencies needs NumPy; pass latencies instead"}), 501
+        batch_size = data.get('batch_size', 1)
+        if not isinstance(batch_size, int) or not 1 <= batch_size <= MAX_BATCH_SIZE:
+            return jsonify({"error": f"batch_size must be an integer from 1 to {MAX_BATCH_SIZE}"}), 400
+        with networks.read(network_id) as network:
+            if not network:
+                return jsonify({"error": f"Network not found: {network_id}"}), 404
+            try:
+                executor = NumpyExecutor(network)
+            except (ExecutorError, ValueError, TypeError) as e:
+                return jsonify({"error": str(e)}), 400
+        # Timed outside the lock, like /run; layers added meanwhile weigh nothing.
+        try:
+            latencies = measure_latencies(executor, batch_size)
+        except (ExecutorError, ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+        try:
+            analysis = ParallelismAnalysis(network, layer_weights(network, weight, latencies))
+            return jsonify(analysis.to_dict(devices))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-events_log = []
+snapshots = create_snapshot_store()
+
+@app.route('/api/networks/<network_id>/snapshots', methods=['POST'])
+def save_snapshot(network_id):
+    data = request.get_json(silent=True) or {}
+    format = data.get('format', 'binary')
+    if format not in ('binary', 'json'):
+        return jsonify({"error": f"Unknown snapshot format: {format}"}), 400
+
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        return jsonify(snapshots.save(network, data.get('name'), format))
+
+@app.route('/api/snapshots', methods=['GET'])
+def list_snapshots():
+    return jsonify(snapshots.list(request.args.get('network_id')))
+
+@app.route('/api/snapshots/<snapshot_id>', methods=['GET'])
+def download_snapshot(snapshot_id):
+    data = snapshots.read(snapshot_id)
+    if data is None:
+        return jsonify({"error": f"Snapshot not found: {snapshot_id}"}), 404
+    binary = data[:len(MAGIC)] == MAGIC
+    response = Response(data, mimetype='application/octet-stream' if binary else 'application/json')
+    extension = 'nns' if binary else 'json'
+    response.headers['Content-Disposition'] = f'attachment; filename="snapshot_{snapshot_id}.{extension}"'
+    return response
+
+@app.route('/api/snapshots/<snapshot_id>/restore', methods=['POST'])
+def restore_snapshot(snapshot_id):
+    try:
+        restored = snapshots.load(snapshot_id, LAYER_TYPES)
+    except (SnapshotError, ParamError) as e:
+        return jsonify({"error": f"Cannot restore snapshot {snapshot_id}: {e}"}), 400
+    if restored is None:
+        return jsonify({"error": f"Snapshot not found: {snapshot_id}"}), 404
+
+    network_id = networks.create_network()
+    with networks.mutate(network_id) as network:
+        network.restore(
+            restored.layers.values(),
+            [(c.id, c.source.id, c.target.id) for c in restored.connections.values()],
+            restored.next_layer_id, restored.next_connection_id,
+        )
+
+    return jsonify({"id": network_id})
+
+def run_batch(network_id, data):
+    """Apply a batch request body; returns ``(payload, status)``."""
+    with networks.mutate(network_id) as network:
+        if not network:
+            return {"error": f"Network not found: {network_id}"}, 404
+
+        try:
+            if 'graph' in data:
+                operations = graph_to_operations(data['graph'], data.get('replace', False), network)
+            else:
+                operations = data.get('operations', [])
+            plan = BatchPlan(network, operations, LAYER_TYPES)
+        except BatchError as e:
+            return e.to_dict(), e.status
+
+        history = history_for(network)
+        ids = plan.apply()
+        history.commit(f"Batch of {len(operations)} operations")
+
+    return {"ids": ids, "refs": plan.refs}, 200
+
+@app.route('/api/networks/<network_id>/batch', methods=['POST'])
+def apply_batch(network_id):
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be an object"}), 400
+    payload, status = run_batch(network_id, data)
+    return jsonify(payload), status
+
+collaboration = CollaborationHub(networks, run_batch)
+networks.hooks.append(collaboration.attach)
+networks.removal_hooks.append(collaboration.network_removed)
+
+@app.route('/api/networks/<network_id>/history', methods=['GET'])
+def get_history(network_id):
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        return jsonify(history_for(network).to_dict())
+
+@app.route('/api/networks/<network_id>/history/<int:number>', methods=['GET'])
+def get_version(network_id, number):
+    with networks.read(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        version = history_for(network).version(number)
+        if version is None:
+            return jsonify({"error": f"Version not found: {number}"}), 404
+        return jsonify(dict(version.to_dict(), graph=version.graph()))
+
+def move_in_history(network_id, move, error, status=400):
+    with networks.mutate(network_id) as network:
+        if not network:
+            return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        history = history_for(network)
+        version = move(history)
+        if version is None:
+            return jsonify({"error": error}), status
+        return jsonify(dict(history.to_dict(), version=version.to_dict()))
+
+@app.route('/api/networks/<network_id>/undo', methods=['POST'])
+def undo(network_id):
+    return move_in_history(network_id, NetworkHistory.undo, "Nothing to undo")
+
+@app.route('/api/networks/<network_id>/redo', methods=['POST'])
+def redo(network_id):
+    return move_in_history(network_id, NetworkHistory.redo, "Nothing to redo")
+
+@app.route('/api/networks/<network_id>/history/<int:number>', methods=['POST'])
+def checkout_version(network_id, number):
+    return move_in_history(network_id, lambda history: history.checkout(number),
+                           f"Version not found: {number}", 404)
+
+def hold_networks(ids, writable=()):
+    """Enter ``networks.mutate`` or ``networks.read`` for several networks.
+
+    Locks are taken in id order so two requests over the same networks
+    cannot deadlock. Returns the stack and a dict id -> network (or None).
+    """
+    stack = ExitStack()
+    held = {}
+    for network_id in sorted({str(i) for i in ids}):
+        enter = networks.mutate if network_id in writable else networks.read
+        held[network_id] = stack.enter_context(enter(network_id))
+    return stack, held
+
+@app.route('/api/networks/diff', methods=['POST'])
+def diff_networks():
+    data = request.get_json(silent=True) or {}
+    base_id, other_id = str(data.get('base')), str(data.get('other'))
+    match = data.get('match', 'id')
+    if match not in MATCH_MODES:
+        return jsonify({"error": f"Unknown match mode: {match}"}), 400
+
+    stack, held = hold_networks([base_id, other_id])
+    with stack:
+        for network_id, network in held.items():
+            if not network:
+                return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        return jsonify(GraphDiff(held[base_id], held[other_id], match).to_dict())
+
+@app.route('/api/networks/merge', methods=['POST'])
+def merge_networks():
+    data = request.get_json(silent=True) or {}
+    base_id, ours_id, theirs_id = str(data.get('base')), str(data.get('ours')), str(data.get('theirs'))
+    match = data.get('match', 'id')
+    apply = bool(data.get('apply', False))
+    if match not in MATCH_MODES:
+        return jsonify({"error": f"Unknown match mode: {match}"}), 400
+
+    stack, held = hold_networks([base_id, ours_id, theirs_id], writable=[ours_id] if apply else [])
+    with stack:
+        for network_id, network in held.items():
+            if not network:
+                return jsonify({"error": f"Network not found: {network_id}"}), 404
+
+        ours = held[ours_id]
+        history = history_for(ours) if apply else None
+        result = merge(held[base_id], ours, held[theirs_id], match, in_place=apply)
+        if history is not None:
+            history.commit(f"Merge changes from {theirs_id}")
+
+        return jsonify(result.to_dict())
+
+events_log = create_event_log()
 @app.route('/api/user-logs', methods=['POST'])
 def save_user_logs():
     data = request.get_json()
     event = data.get('events', [])
-    events_log.append(event)
+    try:
+        events_log.append(event)
+    except EventLogFull:
+        response = jsonify({"error": "Event log is busy, retry later"})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     return jsonify({'status': 'ok'})
 
 @app.route('/api/user-logs', methods=['GET'])
 def get_event_log():
-    return jsonify(events_log)
-    #download to file
-    # with open('user_logs.jsonl', 'w') as f:
-    #     for event in event_log:
-    #         f.write(json.dumps(event) + '\\n')
+    since = request.args.get('since', type=int)
+    until = request.args.get('until', type=int)
+    user = request.args.get('user')
+    network_id = request.args.get('network_id')
+    events_log.flush(timeout=1.0)
+    events = events_log.read(since=since, until=until, user=user, network_id=network_id)
+
+    if request.args.get('format') == 'jsonl':
+        lines = (json.dumps(event) + '\n' for event in events)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    def generate():
+        yield '['
+        for index, event in enumerate(events):
+            yield (',' if index else '') + json.dumps(event)
+        yield ']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+request_metrics = RequestMetrics()
+app.wsgi_app = InstrumentedApp(app.wsgi_app, request_metrics, create_profiler())
+
+@app.before_request
+def record_route():
+    if request.url_rule is not None:
+        request.environ[ROUTE_KEY] = request.url_rule.rule
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    store = networks.stats()
+    log = events_log.stats()
+    samples = [
+        ('networks', 'gauge', 'Networks in the store.', store['networks']),
+        ('network_layers', 'gauge', 'Layers over every network.', store['layers']),
+        ('network_connections', 'gauge', 'Connections over every network.', store['connections']),
+        ('event_log_pending_events', 'gauge', 'Logged events queued in memory, not yet on disk.', log['pending']),
+        ('event_log_events_total', 'counter', 'Logged events accepted since start.', log['appended']),
+        ('event_log_written_events_total', 'counter', 'Logged events written to disk since start.', log['written']),
+        ('event_log_failed_events_total', 'counter', 'Logged events lost to write errors since start.', log['failed']),
+    ]
+    return Response(request_metrics.render(samples), mimetype='text/plain; version=0.0.4')
 
 
 def find_network_by_id(id) -> NeuralNetwork:
-    for n in networks:
-        if n.id == id:
-            return n
-    return None
+    return networks.get_network(id)
         
 if __name__ == '__main__':
     print("Starting Flask server on https://msc-project-8fbo.onrender.com")
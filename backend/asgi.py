@@ -0,0 +1,165 @@
+"""ASGI entry point for the backend.
+
+Serve with an ASGI server, e.g. ``uvicorn asgi:application`` from the
+backend directory, or through ``serve.py`` which sets workers and
+keep-alive. The Flask routes run unchanged behind ``WsgiAdapter``;
+WebSockets on ``/api/networks/<id>/live`` go to the collaboration hub.
+"""
+import asyncio
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import chain
+
+from app import app, events_log, collaboration
+
+# Marks the end of a response iterator inside the executor.
+_DONE = object()
+
+LIVE_PATH = re.compile(r'^/api/networks/([^/]+)/live$')
+
+
+def _next_chunk(iterator):
+    for chunk in iterator:
+        if chunk:
+            return chunk
+    return _DONE
+
+
+class WsgiAdapter:
+    """Runs a WSGI app under ASGI without blocking the event loop.
+
+    The event loop only moves bytes: it collects the request body, then
+    the WSGI call and the whole response iterator (file reads, log
+    flushes, streamed exports) run on one thread of a bounded pool, so
+    locks held across a streamed response stay with their thread. The
+    thread waits for each chunk to be sent before producing the next, so
+    a slow client holds back its own stream rather than filling memory,
+    while the loop keeps serving other connections.
+    """
+
+    def __init__(self, wsgi_app, threads=32):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, events_log.flush, 5.0)
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = BytesIO()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        environ = self.environ(scope, body)
+
+        loop = asyncio.get_running_loop()
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                            for name, value in headers],
+            }
+
+        def emit(message):
+            # Blocks this thread, not the loop, until the chunk is handed
+            # to the server.
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def respond():
+            iterable = self.wsgi_app(environ, start_response)
+            try:
+                chunks = iter(iterable)
+                first = _next_chunk(chunks)
+                second = _next_chunk(chunks) if first is not _DONE else _DONE
+                if second is _DONE:
+                    # Single-chunk bodies, i.e. everything but streamed
+                    # exports and logs, go back to the loop in one hop.
+                    return b'' if first is _DONE else first
+                response['started'] = True
+                emit(response['start'])
+                for chunk in chain((first, second), chunks):
+                    if chunk:
+                        emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                emit({'type': 'http.response.body', 'body': b''})
+                return None
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+
+        body = await loop.run_in_executor(self.executor, respond)
+        if body is not None:
+            await send(response['start'])
+            await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    def environ(scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+                key = name
+            else:
+                key = 'HTTP_' + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+
+http_application = WsgiAdapter(app, threads=int(os.getenv('ASGI_THREADS', '32')))
+
+
+async def application(scope, receive, send):
+    if scope['type'] != 'websocket':
+        return await http_application(scope, receive, send)
+    match = LIVE_PATH.match(scope['path'])
+    if match is None:
+        await receive()
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    await collaboration.serve(match.group(1), scope, receive, send, http_application.executor)
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import re
+import threading
+
+from catalog import CachedBody
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSET_DIRS = [
+    os.path.join(PROJECT_ROOT, 'assets'),
+    os.path.join(PROJECT_ROOT, 'assets', 'input'),
+]
+
+_EDITOR_NS = r'(?:inkscape|sodipodi)'
+_XML_DECLARATION = re.compile(r'<\?xml[^>]*\?>')
+_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_METADATA = re.compile(r'<metadata\b.*?</metadata>', re.S)
+_EDITOR_BLOCK = re.compile(r'<(' + _EDITOR_NS + r':[\w-]+)\b[^>]*?(?:/>|>.*?</\1>)', re.S)
+_EDITOR_ATTR = re.compile(r'\s+(?:xmlns:)?' + _EDITOR_NS + r'(?::[\w-]+)?="[^"]*"')
+_TAG_GAP = re.compile(r'>\s+<')
+_SPACE_RUN = re.compile(r'\s+')
+
+
+def minify_svg(text):
+    """Strip editor metadata, comments and insignificant whitespace from an SVG."""
+    text = _XML_DECLARATION.sub('', text)
+    text = _COMMENT.sub('', text)
+    text = _METADATA.sub('', text)
+    text = _EDITOR_BLOCK.sub('', text)
+    text = _EDITOR_ATTR.sub('', text)
+    text = _TAG_GAP.sub('><', text)
+    text = _SPACE_RUN.sub(' ', text)
+    return text.replace(' />', '/>').replace(' >', '>').strip()
+
+
+class SvgAsset(CachedBody):
+    def __init__(self, path, content):
+        self.path = path
+        self.content = content
+        self.hash = hashlib.sha256(content.encode('utf-8')).hexdigest()[:20]
+        super().__init__(content.encode('utf-8'))
+
+
+class AssetStore:
+    """Loads the SVG assets once, minified and addressed by content hash.
+
+    Assets are keyed by their path relative to the project root, so lookups
+    do not depend on the working directory the server was started from.
+    """
+
+    def __init__(self, directories=None):
+        self.directories = list(directories or ASSET_DIRS)
+        self._lock = threading.Lock()
+        self._by_hash = {}
+        self._by_path = {}
+        self._mtimes = {}
+
+    @staticmethod
+    def normalize_path(path):
+        if os.path.isabs(path):
+            path = os.path.relpath(path, PROJECT_ROOT)
+        return os.path.normpath(path).replace(os.sep, '/')
+
+    def _scan(self):
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.svg'):
+                    yield os.path.join(directory, name)
+
+    def refresh(self):
+        """(Re)load every asset whose mtime changed since the last call.
+
+        Superseded hashes stay resolvable so clients holding an older catalog
+        can still fetch the icons it references.
+        """
+        with self._lock:
+            for full_path in self._scan():
+                mtime = os.stat(full_path).st_mtime_ns
+                if self._mtimes.get(full_path) == mtime:
+                    continue
+                with open(full_path, 'r', encoding='utf-8') as svg_file:
+                    asset = SvgAsset(self.normalize_path(full_path), minify_svg(svg_file.read()))
+                self._mtimes[full_path] = mtime
+                self._by_hash.setdefault(asset.hash, asset)
+                self._by_path[asset.path] = asset.hash
+
+    def hash_for(self, path):
+        asset_hash = self._by_path.get(self.normalize_path(path))
+        if asset_hash is None:
+            raise FileNotFoundError(path)
+        return asset_hash
+
+    def content_for(self, path):
+        return self._by_hash[self.hash_for(path)].content
+
+    def get(self, asset_hash):
+        return self._by_hash.get(asset_hash)
+
+
+asset_store = AssetStore()
+asset_store.refresh()
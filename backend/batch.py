@@ -0,0 +1,197 @@
+from graph_validator import PlannedEdges, graph_validator_for
+from layers.layer import ParamError
+
+
+class BatchError(Exception):
+    """An operation in a batch could not be applied; nothing was changed."""
+
+    def __init__(self, index, message, status=400, details=None):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+        self.status = status
+        self.details = details
+
+    def to_dict(self):
+        result = {"error": self.message, "operation": self.index}
+        if self.details:
+            result["details"] = self.details
+        return result
+
+
+def graph_to_operations(graph, replace=False, network=None):
+    """Translate a full-graph import into batch operations.
+
+    ``graph`` is ``{"layers": [{"ref", "type", "params"}], "connections":
+    [{"source", "target"}]}`` where connection endpoints name layer refs.
+    With ``replace`` every existing layer of ``network`` is removed first.
+    """
+    if not isinstance(graph, dict):
+        raise BatchError(None, "'graph' must be an object")
+    layers, connections = graph.get('layers', []), graph.get('connections', [])
+    if not isinstance(layers, list) or not isinstance(connections, list):
+        raise BatchError(None, "'graph' layers and connections must be lists")
+
+    operations = []
+    if replace and network is not None:
+        operations.extend({"op": "remove_layer", "id": layer_id} for layer_id in network.layers)
+    for index, layer in enumerate(layers):
+        if not isinstance(layer, dict):
+            raise BatchError(None, f"Graph layer {index} must be an object")
+        operations.append({
+            "op": "add_layer",
+            "ref": str(layer.get('ref', index)),
+            "type": layer.get('type'),
+            "params": layer.get('params', {}),
+        })
+    for index, connection in enumerate(connections):
+        if not isinstance(connection, dict):
+            raise BatchError(None, f"Graph connection {index} must be an object")
+        operations.append({
+            "op": "connect",
+            "source_ref": str(connection.get('source')),
+            "target_ref": str(connection.get('target')),
+        })
+    return operations
+
+
+class BatchPlan:
+    """Validated batch, ready to apply to the network it was planned against.
+
+    Planning resolves refs and checks every operation against the ids the
+    network will have at that point in the batch, without touching the
+    network. Applying a plan therefore cannot fail half-way. New edges get
+    the same self-loop, duplicate and cycle checks as single connections,
+    counting the edges planned before them.
+    """
+
+    def __init__(self, network, operations, layer_types):
+        self.network = network
+        self.steps = []
+        self.refs = {}
+        self._plan(operations, layer_types)
+
+    def _plan(self, operations, layer_types):
+        network = self.network
+        layer_ids = set(network.layers)
+        connection_ids = set(network.connections)
+        next_layer_id = network.next_layer_id
+        next_connection_id = network.next_connection_id
+        pending_connections = {}
+        added_layers = {}
+        edges = PlannedEdges(graph_validator_for(network))
+
+        if not isinstance(operations, list):
+            raise BatchError(None, "'operations' must be a list")
+
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                raise BatchError(index, "Operation must be an object")
+            op = operation.get('op')
+
+            if op == 'add_layer':
+                layer_type = operation.get('type')
+                layer_class = layer_types.get(layer_type)
+                if not layer_class:
+                    raise BatchError(index, f"Unknown layer type: {layer_type}")
+                try:
+                    layer = layer_class.from_params(operation.get('params', {}))
+                except ParamError as e:
+                    raise BatchError(index, f"Invalid params for {layer_type}", details=e.errors)
+                layer_id = next_layer_id
+                next_layer_id += 1
+                layer_ids.add(layer_id)
+                edges.add_layer(layer_id)
+                ref = operation.get('ref')
+                if ref is not None:
+                    if str(ref) in self.refs:
+                        raise BatchError(index, f"Duplicate ref: {ref}")
+                    self.refs[str(ref)] = layer_id
+                added_layers[layer_id] = layer
+                self.steps.append(('add_layer', layer))
+
+            elif op == 'set_params':
+                layer_id = self._resolve(index, operation, 'id', layer_ids)
+                params = operation.get('params', {})
+                if not isinstance(params, dict):
+                    raise BatchError(index, "'params' must be an object")
+                current = added_layers.get(layer_id) or network.layers[layer_id]
+                config = current.get_config()
+                config.update(params)
+                try:
+                    layer = type(current).from_params(config)
+                except ParamError as e:
+                    raise BatchError(index, f"Invalid params for {type(current).__name__}", details=e.errors)
+                added_layers[layer_id] = layer
+                self.steps.append(('set_params', (layer_id, layer)))
+
+            elif op == 'connect':
+                source_id = self._resolve(index, operation, 'source', layer_ids)
+                target_id = self._resolve(index, operation, 'target', layer_ids)
+                connection_id = next_connection_id
+                problem = edges.connect(connection_id, source_id, target_id)
+                if problem:
+                    raise BatchError(index, problem)
+                next_connection_id += 1
+                connection_ids.add(connection_id)
+                pending_connections[connection_id] = (source_id, target_id)
+                self.steps.append(('connect', (source_id, target_id)))
+
+            elif op == 'remove_layer':
+                layer_id = self._resolve(index, operation, 'id', layer_ids)
+                layer_ids.discard(layer_id)
+                edges.remove_layer(layer_id)
+                for connection_id, (source_id, target_id) in list(pending_connections.items()):
+                    if layer_id in (source_id, target_id):
+                        connection_ids.discard(connection_id)
+                        del pending_connections[connection_id]
+                for connection_id in list(network.outgoing.get(layer_id, {})) + list(network.incoming.get(layer_id, {})):
+                    connection_ids.discard(connection_id)
+                self.steps.append(('remove_layer', layer_id))
+
+            elif op == 'remove_connection':
+                connection_id = operation.get('id')
+                if connection_id not in connection_ids:
+                    raise BatchError(index, f"Connection not found: {connection_id}", 404)
+                connection_ids.discard(connection_id)
+                pending_connections.pop(connection_id, None)
+                edges.remove_connection(connection_id)
+                self.steps.append(('remove_connection', connection_id))
+
+            else:
+                raise BatchError(index, f"Unknown operation: {op}")
+
+    def _resolve(self, index, operation, key, layer_ids):
+        ref = operation.get(f'{key}_ref')
+        if ref is not None:
+            layer_id = self.refs.get(str(ref))
+            if layer_id is None:
+                raise BatchError(index, f"Unknown ref: {ref}")
+        else:
+            layer_id = operation.get(key)
+        if layer_id not in layer_ids:
+            raise BatchError(index, f"Layer not found: {layer_id}", 404)
+        return layer_id
+
+    def apply(self):
+        """Apply the planned steps and return the id produced by each one."""
+        network = self.network
+        results = []
+        for kind, payload in self.steps:
+            if kind == 'add_layer':
+                results.append(network.add_layer(payload))
+            elif kind == 'connect':
+                source_id, target_id = payload
+                connection = network.connect(network.layers[source_id], network.layers[target_id])
+                results.append(connection.id)
+            elif kind == 'set_params':
+                layer_id, layer = payload
+                network.replace_layer(layer_id, layer)
+                results.append(layer_id)
+            elif kind == 'remove_layer':
+                network.remove_layer(payload)
+                results.append(payload)
+            elif kind == 'remove_connection':
+                network.remove_connection(payload)
+                results.append(payload)
+        return results
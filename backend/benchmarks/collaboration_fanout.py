@@ -0,0 +1,199 @@
+"""Fan-out throughput and ordering of the collaboration hub.
+
+Runs ``--clients`` WebSocket sessions against one network through the hub's
+ASGI handler, in process. ``--editors`` of them drag layers (bursts of
+``--moves`` moves each) and edit params over the socket while a thread
+makes REST-style batch edits. Reports frames and ops delivered, how much
+coalescing saved and the move-to-delivery latency, and checks that:
+
+* every client sees frames with consecutive seq numbers;
+* all clients get the very same frame strings (encoded once);
+* replaying the ops onto the initial state gives the server's graph;
+* a client reconnecting with ``?since=`` gets exactly the missed frames;
+* the network's channel is dropped once every client has left, and
+  removing a network closes its sessions and drops its channel.
+
+    python backend/benchmarks/collaboration_fanout.py --clients 500 --editors 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Client:
+    def __init__(self, hub, network_id, executor, since=None):
+        self.inbox = asyncio.Queue()
+        self.frames = []
+        self.raw = []
+        self.closed = None
+        query = b'' if since is None else f'since={since}'.encode()
+        self.inbox.put_nowait({'type': 'websocket.connect'})
+        self.task = asyncio.ensure_future(hub.serve(network_id, {'type': 'websocket', 'query_string': query},
+                                                    self.inbox.get, self.send, executor))
+
+    async def send(self, message):
+        if message['type'] == 'websocket.close':
+            self.closed = message['code']
+        if message['type'] == 'websocket.send':
+            self.raw.append(message['text'])
+            frame = json.loads(message['text'])
+            frame['received'] = time.perf_counter()
+            self.frames.append(frame)
+
+    def say(self, message):
+        self.inbox.put_nowait({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def close(self):
+        self.inbox.put_nowait({'type': 'websocket.disconnect'})
+        await self.task
+
+
+def replay(state, frames):
+    """Apply op frames to a ``state`` frame's graph; returns (layers, edges)."""
+    layers = {layer['ref']: (layer['type'], json.dumps(layer['params'], sort_keys=True))
+              for layer in state['graph']['layers']}
+    edges = {}
+    for frame in frames:
+        for op in frame['ops']:
+            if op['op'] == 'add_layer':
+                layers[op['id']] = (op['type'], json.dumps(op['params'], sort_keys=True))
+            elif op['op'] == 'params':
+                layers[op['id']] = (layers[op['id']][0], json.dumps(op['params'], sort_keys=True))
+            elif op['op'] == 'remove_layer':
+                del layers[op['id']]
+            elif op['op'] == 'connect':
+                edges[op['id']] = (op['source'], op['target'])
+            elif op['op'] == 'disconnect':
+                del edges[op['id']]
+    return layers, edges
+
+
+async def run(args):
+    from app import collaboration, networks, run_batch
+    from collaboration import NOT_FOUND
+
+    rng = random.Random(args.seed)
+    network_id = networks.create_network()
+    run_batch(network_id, {"operations": [
+        {"op": "add_layer", "type": "DenseLayer", "params": {"units": 32}} for _ in range(args.layers)]})
+    executor = ThreadPoolExecutor(max_workers=32)
+    clients = [Client(collaboration, network_id, executor) for _ in range(args.clients)]
+    while not all(c.frames and c.frames[-1]['type'] == 'state' for c in clients):
+        await asyncio.sleep(0.01)
+
+    sent_moves = 0
+    start = time.perf_counter()
+
+    async def editor(client, editor_rng):
+        nonlocal sent_moves
+        for _ in range(args.drags):
+            layer_id = editor_rng.randrange(args.layers)
+            for step in range(args.moves):
+                client.say({"type": "move", "id": layer_id, "x": time.perf_counter(), "y": step})
+                sent_moves += 1
+                await asyncio.sleep(0.002)
+            client.say({"type": "ops", "ref": layer_id, "operations": [
+                {"op": "set_params", "id": layer_id, "params": {"units": editor_rng.randrange(1, 512)}}]})
+
+    def rest_edits():
+        rest_rng = random.Random(args.seed + 1)
+        for _ in range(args.drags * 5):
+            source, target = sorted(rest_rng.sample(range(args.layers), 2))
+            run_batch(network_id, {"operations": [
+                {"op": "add_layer", "ref": "new", "type": "DropoutLayer", "params": {"probability": 0.2}},
+                {"op": "connect", "source": source, "target": target},
+            ]})
+            time.sleep(0.005)
+
+    rest = threading.Thread(target=rest_edits)
+    rest.start()
+    await asyncio.gather(*(editor(c, random.Random(rng.random())) for c in clients[:args.editors]))
+    await asyncio.get_running_loop().run_in_executor(None, rest.join)
+    await asyncio.sleep(collaboration.interval * 5)
+    elapsed = time.perf_counter() - start
+
+    # Late joiner replaying from the middle of the stream.
+    ops_frames = [f for f in clients[0].frames if f['type'] == 'ops']
+    midpoint = ops_frames[len(ops_frames) // 2]['seq']
+    late = Client(collaboration, network_id, executor, since=midpoint)
+    await asyncio.sleep(0.1)
+
+    for client in clients + [late]:
+        await client.close()
+    assert network_id not in collaboration.channels, "channel kept after every client left"
+
+    removed_id = networks.create_network()
+    removed = [Client(collaboration, removed_id, executor) for _ in range(3)]
+    while not all(c.frames and c.frames[-1]['type'] == 'state' for c in removed):
+        await asyncio.sleep(0.01)
+    networks.remove_network(removed_id)
+    await asyncio.sleep(0.05)
+    assert removed_id not in collaboration.channels, "channel kept after its network was removed"
+    assert all(c.closed == NOT_FOUND for c in removed), "sessions of a removed network stayed open"
+    for client in removed:
+        await client.close()
+    executor.shutdown()
+
+    reference = [f for f in clients[0].frames if f['type'] == 'ops']
+    seqs = [f['seq'] for f in reference]
+    assert seqs == list(range(seqs[0], seqs[0] + len(seqs))), "seq numbers are not consecutive"
+    reference_raw = [r for r in clients[0].raw if r.startswith('{"type":"ops"')]
+    for client in clients[1:]:
+        raw = [r for r in client.raw if r.startswith('{"type":"ops"')]
+        assert raw == reference_raw, "clients saw different frames"
+        assert all(a is b for a, b in zip(raw, reference_raw)), "frames were encoded per client"
+    late_frames = [f for f in late.frames if f['type'] == 'ops']
+    assert [f['seq'] for f in late_frames] == [s for s in seqs if s > midpoint], "replay after since differs"
+
+    state = next(f for f in clients[0].frames if f['type'] == 'state')
+    layers, edges = replay(state, reference)
+    with networks.read(network_id) as network:
+        expected = {i: (type(l).__name__, json.dumps(json.loads(json.dumps(l.get_config())), sort_keys=True))
+                    for i, l in network.layers.items()}
+        assert layers == expected, "replayed layers differ from the server"
+        assert edges == {c.id: (c.source.id, c.target.id) for c in network.connections.values()}, \
+            "replayed connections differ from the server"
+
+    ops = [op for f in reference for op in f['ops']]
+    moves = [op for op in ops if op['op'] == 'move']
+    latencies = [f['received'] - op['x'] for f in reference for op in f['ops'] if op['op'] == 'move']
+    acks = sum(1 for c in clients[:args.editors] for f in c.frames if f['type'] == 'ack')
+    delivered = sum(len(c.frames) for c in clients)
+    print(f"clients {args.clients}, editors {args.editors}, {elapsed:.2f} s")
+    print(f"frames per client {len(reference)}, ops per client {len(ops)}, acks {acks}")
+    print(f"moves sent {sent_moves}, move ops delivered {len(moves)} "
+          f"({1 - len(moves) / max(1, sent_moves):.1%} coalesced)")
+    print(f"frames delivered {delivered} ({delivered / elapsed:.0f}/s)")
+    if latencies:
+        print(f"move latency median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"max {max(latencies) * 1000:.1f} ms")
+    print("ordering, replay and state checks ok")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--editors', type=int, default=10)
+    parser.add_argument('--layers', type=int, default=50)
+    parser.add_argument('--drags', type=int, default=5)
+    parser.add_argument('--moves', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['USER_LOG_DIR'] = directory
+        os.environ.pop('NETWORK_STORE_PATH', None)
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
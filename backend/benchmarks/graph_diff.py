@@ -0,0 +1,128 @@
+"""Speed and correctness of graph diff and three-way merge.
+
+For each size in ``--sizes`` builds a network of repeated conv blocks with
+skip connections and times:
+
+* diffing it against an id-preserving copy with ``--edits`` random edits
+  (param changes, inserted and removed layers), checking the reported
+  changes against the edits that were made;
+* diffing it against the same graph rebuilt with different ids
+  (``match='structure'``), which must come out identical;
+* merging two disjoint sets of edits made on separate copies, which must
+  produce the same graph as making both sets of edits on one copy.
+
+    python backend/benchmarks/graph_diff.py --sizes 2500 5000 10000 20000
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LAYER_TYPES  # noqa: E402
+from graph_diff import GraphDiff, merge  # noqa: E402
+from graph_optimizer import copy_network  # noqa: E402
+from layers.misc_layers.dense_layer import DenseLayer  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+
+BLOCK = [
+    ('DenseLayer', {'units': 256}),
+    ('NormalizationLayer', {'num_features': 256}),
+    ('ReLUFunction', {}),
+    ('DropoutLayer', {'probability': 0.1}),
+]
+
+
+def build(layer_count, first_id=0):
+    network = NeuralNetwork('bench')
+    network.next_layer_id = network.next_connection_id = first_id
+    previous = network.layers[network.add_layer(LAYER_TYPES['TabularInputLayer'].from_params({}))]
+    block_start = previous
+    while len(network.layers) < layer_count:
+        for layer_type, params in BLOCK:
+            layer = LAYER_TYPES[layer_type].from_params(params)
+            network.add_layer(layer)
+            network.connect(previous, layer)
+            previous = layer
+        network.connect(block_start, previous)
+        block_start = previous
+    return network
+
+
+def edit(network, rng, count, exclude=()):
+    """Random edits; returns the ids of edited, inserted and removed layers."""
+    dense = [i for i, layer in network.layers.items() if isinstance(layer, DenseLayer) and i not in exclude]
+    edited, inserted, removed = set(), set(), set()
+    for layer_id in rng.sample(dense, count):
+        kind = rng.randrange(3)
+        if kind == 0:
+            layer = copy.copy(network.layers[layer_id])
+            layer.units = rng.randrange(1, 100)
+            network.replace_layer(layer_id, layer)
+            edited.add(layer_id)
+        elif kind == 1 and network.outgoing[layer_id]:
+            # A dropout between the layer and its first consumer.
+            connection = next(iter(network.outgoing[layer_id].values()))
+            network.remove_connection(connection.id)
+            dropout = LAYER_TYPES['DropoutLayer'].from_params({'probability': 0.3})
+            network.add_layer(dropout)
+            network.connect(network.layers[layer_id], dropout)
+            network.connect(dropout, connection.target)
+            inserted.add(dropout.id)
+        else:
+            network.remove_layer(layer_id)
+            removed.add(layer_id)
+    return edited, inserted, removed
+
+
+def timed(function):
+    start = time.perf_counter()
+    value = function()
+    return value, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2500, 5000, 10000, 20000])
+    parser.add_argument('--edits', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"{'layers':>7} {'diff by id ms':>14} {'by structure ms':>16} {'merge ms':>9}")
+    for size in args.sizes:
+        base = build(size)
+
+        other = copy_network(base)
+        edited, inserted, removed = edit(other, rng, args.edits)
+        diff, by_id = timed(lambda: GraphDiff(base, other))
+        assert set(diff.modified_layers) == edited, "modified layers differ"
+        assert set(diff.added_layers) == inserted, "added layers differ"
+        assert set(diff.removed_layers) == removed, "removed layers differ"
+
+        renumbered = build(size, first_id=10 * size)
+        diff, by_structure = timed(lambda: GraphDiff(base, renumbered, 'structure'))
+        assert diff.is_empty() and len(diff.pairs) == len(base.layers), "renumbered copy not identical"
+
+        # Disjoint edits on two copies; making both on one copy is the expected merge.
+        ours, theirs, expected = copy_network(base), copy_network(base), copy_network(base)
+        ours_seed, theirs_seed = rng.random(), rng.random()
+        touched = set().union(*edit(ours, random.Random(ours_seed), args.edits))
+        touched |= {n.id for network in (base, ours) for i in touched if i in network.layers
+                    for n in network.successors(i) + network.predecessors(i)}
+        edit(theirs, random.Random(theirs_seed), args.edits, exclude=touched)
+        edit(expected, random.Random(ours_seed), args.edits)
+        edit(expected, random.Random(theirs_seed), args.edits, exclude=touched)
+        result, merge_time = timed(lambda: merge(base, ours, theirs))
+        assert not result.conflicts, result.conflicts
+        assert GraphDiff(expected, result.network, 'structure').is_empty(), "merge differs from expected"
+
+        print(f"{size:>7} {by_id * 1000:>14.1f} {by_structure * 1000:>16.1f} {merge_time * 1000:>9.1f}")
+    print("diffs and merges match the edits")
+
+
+if __name__ == '__main__':
+    main()
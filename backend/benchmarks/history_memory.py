@@ -0,0 +1,144 @@
+"""Memory and speed of the version history.
+
+Builds a chain of ``--layers`` layers, starts a NetworkHistory and makes
+``--versions`` committed edits (parameter edits, added layers and
+connections, removed connections). Reports the memory of the live network,
+what the whole history adds on top of it, and what keeping a deep copy per
+version would cost instead. Then walks undo to the first version, redo to
+the last and jumps between both ends, checking the network against the
+state recorded at every version.
+
+    python backend/benchmarks/history_memory.py --layers 500 --versions 1000
+"""
+import argparse
+import copy
+import gc
+import os
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LAYER_TYPES  # noqa: E402
+from history import NetworkHistory  # noqa: E402
+from layers.misc_layers.dense_layer import DenseLayer  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+
+
+def build(layer_count):
+    network = NeuralNetwork('bench')
+    previous = None
+    for index in range(layer_count):
+        layer = LAYER_TYPES['DenseLayer'].from_params({'units': 64 + index % 7})
+        network.add_layer(layer)
+        if previous is not None:
+            network.connect(previous, layer)
+        previous = layer
+    return network
+
+
+def state(network):
+    """A hash of the layers and edges, small enough to keep per version."""
+    return hash((
+        tuple(sorted((layer_id, layer.config_key()) for layer_id, layer in network.layers.items())),
+        tuple(sorted((c.id, c.source.id, c.target.id) for c in network.connections.values())),
+    ))
+
+
+def edit(network, rng):
+    choice = rng.random()
+    layer_ids = list(network.layers)
+    if choice < 0.5:
+        layer_id = rng.choice([i for i in layer_ids if isinstance(network.layers[i], DenseLayer)])
+        layer = copy.copy(network.layers[layer_id])
+        layer.units = rng.randrange(16, 512)
+        network.replace_layer(layer_id, layer)
+        return f"Edit layer {layer_id}"
+    if choice < 0.8 or not network.connections:
+        source = network.layers[rng.choice(layer_ids)]
+        layer = LAYER_TYPES['DropoutLayer'].from_params({})
+        network.add_layer(layer)
+        network.connect(source, layer)
+        return f"Add layer {layer.id}"
+    connection_id = rng.choice(list(network.connections))
+    network.remove_connection(connection_id)
+    return f"Remove connection {connection_id}"
+
+
+def traced(function):
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    value = function()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    return value, tracemalloc.get_traced_memory()[0] - before, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--layers', type=int, default=500)
+    parser.add_argument('--versions', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    tracemalloc.start()
+    network, network_bytes, _ = traced(lambda: build(args.layers))
+    history, start_bytes, _ = traced(lambda: NetworkHistory(network, max_versions=args.versions + 1))
+    states = [state(network)]
+
+    def edits():
+        elapsed = 0
+        for _ in range(args.versions):
+            label = edit(network, rng)
+            start = time.perf_counter()
+            history.commit(label)
+            elapsed += time.perf_counter() - start
+            states.append(state(network))
+        return elapsed
+    edit_time, edit_bytes, _ = traced(edits)
+    pickled = len(pickle.dumps(network, pickle.HIGHEST_PROTOCOL))
+    tracemalloc.stop()
+
+    kib = 1024
+    print(f"{args.layers} layers, {len(history.versions)} versions")
+    print(f"live network                  {network_bytes / kib:10.0f} KiB")
+    print(f"history at first version      {start_bytes / kib:10.0f} KiB")
+    print(f"{args.versions} edits, network + history {edit_bytes / kib:8.0f} KiB "
+          f"({edit_bytes / args.versions:.0f} B per version)")
+    print(f"deep copy per version         {network_bytes * args.versions / kib:10.0f} KiB (estimate)")
+    print(f"pickled network with history  {pickled / kib:10.0f} KiB")
+    print(f"commit                        {edit_time / args.versions * 1e6:10.1f} us per version")
+
+    first, last = history.versions[0].number, history.versions[-1].number
+    def walk(step):
+        elapsed = 0
+        while True:
+            start = time.perf_counter()
+            version = step()
+            elapsed += time.perf_counter() - start
+            if version is None:
+                return elapsed
+            assert state(network) == states[version.number - first], f"state differs at {version.number}"
+
+    undo_time = walk(history.undo)
+    redo_time = walk(history.redo)
+    jump_time = 0
+    for number in (first, last) * 5:
+        start = time.perf_counter()
+        history.checkout(number)
+        jump_time += (time.perf_counter() - start) / 10
+        assert state(network) == states[number - first], f"state differs at {number}"
+
+    print(f"undo                          {undo_time / args.versions * 1e6:10.1f} us per step")
+    print(f"redo                          {redo_time / args.versions * 1e6:10.1f} us per step")
+    print(f"jump first <-> last           {jump_time * 1e3:10.2f} ms")
+    print("states match at every version")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""Throughput, latency and memory baseline for the HTTP API.
+
+For every transport in ``--transports`` (the Flask test client in this
+process, and a real local socket to a threaded werkzeug server) and every
+network size in ``--sizes``, seeds a network of that many layers through
+one batch import, then times ``--requests`` sequential requests to each of
+GET /api/layer-types, POST /api/networks, add_layer, connect_layers and
+POST /api/user-logs. Records requests/sec, p50/p90/p99/max latency and the
+process's peak RSS.
+
+``--save`` writes the results as the baseline; otherwise a run is compared
+with the baseline when there is one and exits with status 1 if any
+endpoint's throughput drops, or its p99 or the peak RSS grows, by more
+than ``--threshold``.
+
+    python backend/benchmarks/http_api.py --save
+    python backend/benchmarks/http_api.py --sizes 10 1000 --threshold 0.3
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http_api_baseline.json')
+ENDPOINTS = ['layer_types', 'create_network', 'add_layer', 'connect_layers', 'user_logs']
+# p99 changes smaller than this are noise, whatever the ratio.
+MIN_P99_DELTA_MS = 1.0
+
+
+class TestClientTransport:
+    name = 'inprocess'
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, payload=None):
+        response = self.client.open(path, method=method, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+
+class SocketTransport:
+    name = 'socket'
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port)
+
+    def request(self, method, path, payload=None):
+        body = None if payload is None else json.dumps(payload)
+        self.connection.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+        response = self.connection.getresponse()
+        data = response.read()
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        self.connection.close()
+        self.server.shutdown()
+
+
+TRANSPORTS = {'inprocess': TestClientTransport, 'socket': SocketTransport}
+
+
+def seed_network(transport, size):
+    status, body = transport.request('POST', '/api/networks', {})
+    network_id = body['id']
+    graph = {
+        "layers": [{"ref": 0, "type": "TabularInputLayer", "params": {}}]
+        + [{"ref": n, "type": "DenseLayer", "params": {"units": 64}} for n in range(1, size)],
+        "connections": [{"source": n, "target": n + 1} for n in range(size - 1)],
+    }
+    status, body = transport.request('POST', f'/api/networks/{network_id}/batch', {"graph": graph})
+    assert status == 200, body
+    return network_id, sorted(body['refs'].values())
+
+
+def requests_for(endpoint, network_id, layer_ids, count, rng):
+    """The ``count`` requests to time for ``endpoint``, as (method, path, payload)."""
+    if endpoint == 'layer_types':
+        return [('GET', '/api/layer-types', None)] * count
+    if endpoint == 'create_network':
+        return [('POST', '/api/networks', {})] * count
+    if endpoint == 'add_layer':
+        return [('POST', f'/api/networks/{network_id}/layers', {'type': 'DenseLayer', 'params': {'units': 64}})] * count
+    if endpoint == 'connect_layers':
+        # New forward edges: never a duplicate and never a cycle.
+        edges = set(zip(layer_ids, layer_ids[1:]))
+        chosen = []
+        while len(chosen) < count:
+            source, target = sorted(rng.sample(layer_ids, 2))
+            if (source, target) not in edges:
+                edges.add((source, target))
+                chosen.append(('POST', f'/api/networks/{network_id}/connections',
+                               {'source': source, 'target': target}))
+        return chosen
+    events = [{'type': 'layer_added', 'network_id': network_id, 'timestamp': time.time()}] * 20
+    return [('POST', '/api/user-logs', {'events': events})] * count
+
+
+def measure(transport, requests):
+    latencies = []
+    added = []
+    start = time.perf_counter()
+    for method, path, payload in requests:
+        begin = time.perf_counter()
+        status, body = transport.request(method, path, payload)
+        latencies.append(time.perf_counter() - begin)
+        if status != 200:
+            raise RuntimeError(f"{method} {path} returned {status}: {body}")
+        if path.endswith('/layers'):
+            added.append(body['id'])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(fraction):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile(0.5),
+        "p90_ms": percentile(0.9),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }, added
+
+
+def peak_rss_kib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run(app, transports, sizes, count, seed):
+    rng = random.Random(seed)
+    results, memory = {}, {}
+    for name in transports:
+        transport = TRANSPORTS[name](app)
+        try:
+            for size in sizes:
+                network_id, layer_ids = seed_network(transport, size)
+                for endpoint in ENDPOINTS:
+                    stats, added = measure(transport, requests_for(endpoint, network_id, layer_ids, count, rng))
+                    layer_ids += added
+                    results[f"{name}/{size}/{endpoint}"] = stats
+                    print(f"{name:<10} {size:>6} {endpoint:<15} {stats['rps']:>9.1f} {stats['p50_ms']:>8.2f} "
+                          f"{stats['p90_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f}")
+                memory[f"{name}/{size}"] = peak_rss_kib()
+        finally:
+            transport.close()
+    return results, memory
+
+
+def regressions(baseline, current, threshold):
+    problems = []
+    for key, stats in current["results"].items():
+        before = baseline["results"].get(key)
+        if before is None:
+            continue
+        if stats["rps"] < before["rps"] * (1 - threshold):
+            problems.append(f"{key}: {stats['rps']} req/s, baseline {before['rps']}")
+        if (stats["p99_ms"] > before["p99_ms"] * (1 + threshold)
+                and stats["p99_ms"] - before["p99_ms"] > MIN_P99_DELTA_MS):
+            problems.append(f"{key}: p99 {stats['p99_ms']} ms, baseline {before['p99_ms']}")
+    # Peak RSS only grows during a run, so it compares only between runs
+    # over the same transports and sizes.
+    same_run = all(baseline["meta"].get(name) == current["meta"][name] for name in ('transports', 'sizes'))
+    for key, peak in current["peak_rss_kib"].items():
+        before = baseline["peak_rss_kib"].get(key) if same_run else None
+        if before is not None and peak > before * (1 + threshold):
+            problems.append(f"{key}: peak RSS {peak} KiB, baseline {before}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transports', nargs='+', choices=list(TRANSPORTS), default=list(TRANSPORTS))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--requests', type=int, default=200, help="timed requests per endpoint and size")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help="write this run as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The app picks its stores up at import time; keep this run's logs out of the project.
+        os.environ['USER_LOG_DIR'] = directory
+        os.environ.pop('NETWORK_STORE_PATH', None)
+        from app import app
+
+        print(f"{'transport':<10} {'layers':>6} {'endpoint':<15} {'req/s':>9} {'p50 ms':>8} "
+              f"{'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        results, memory = run(app, args.transports, args.sizes, args.requests, args.seed)
+
+    current = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "transports": args.transports,
+            "sizes": args.sizes,
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        "results": results,
+        "peak_rss_kib": memory,
+    }
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    problems = regressions(baseline, current, args.threshold)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"no regressions past {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Memory footprint of live layers.
+
+For each layer type, reports the bytes tracemalloc sees per layer for
+``--count`` bare instances, and per layer for a chain of ``--count``
+layers inside a NeuralNetwork (connections and adjacency index included).
+
+    python backend/benchmarks/layer_memory.py --count 20000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LAYER_TYPES  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+
+TYPES = [
+    'ConvolutionalLayer', 'PoolingLayer', 'DenseLayer', 'DropoutLayer', 'FlatteningLayer',
+    'NormalizationLayer', 'EmbeddingLayer', 'AttentionLayer', 'RecurrentLayer',
+    'ReLUFunction', 'ImageInputLayer',
+]
+
+
+def instances(layer_type, count):
+    layer_class = LAYER_TYPES[layer_type]
+    return [layer_class.from_params({}) for _ in range(count)]
+
+
+def chain(layer_type, count):
+    layer_class = LAYER_TYPES[layer_type]
+    network = NeuralNetwork(0)
+    previous = None
+    for _ in range(count):
+        layer = layer_class.from_params({})
+        network.add_layer(layer)
+        if previous is not None:
+            network.connect(previous, layer)
+        previous = layer
+    return network
+
+
+def measure(build, layer_type, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build(layer_type, count)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del built
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=20000)
+    args = parser.parse_args()
+
+    width = max(map(len, TYPES))
+    print(f"{'bytes per layer':<{width}}  {'instance':>9}  {'in network':>10}")
+    totals = [0, 0]
+    for layer_type in TYPES:
+        alone = measure(instances, layer_type, args.count)
+        linked = measure(chain, layer_type, args.count)
+        totals[0] += alone
+        totals[1] += linked
+        print(f"{layer_type:<{width}}  {alone:9.0f}  {linked:10.0f}")
+    print(f"{'mean':<{width}}  {totals[0] / len(TYPES):9.0f}  {totals[1] / len(TYPES):10.0f}")
+
+
+if __name__ == '__main__':
+    main()
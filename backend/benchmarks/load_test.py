@@ -0,0 +1,223 @@
+"""Requests/sec and latency of the Flask dev server against the ASGI server.
+
+Starts each server in ``--servers`` in a subprocess on a free port, seeds
+a few networks, then keeps ``--connections`` keep-alive connections busy
+for ``--duration`` seconds with a mix of add_layer, connect_layers,
+user-log posts and PyTorch exports. Exports go to separate networks (an
+input feeding a chain of dense layers) that are never edited, since the
+edited ones have unconnected layers, which cannot be exported. Reports
+throughput and p50/p99 latency per server and per request kind. The ASGI
+server needs uvicorn.
+
+    python backend/benchmarks/load_test.py --connections 64 --duration 10
+    python backend/benchmarks/load_test.py --servers asgi --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, weight) of each request kind in the mix.
+MIX = [('add_layer', 50), ('connect', 20), ('log', 25), ('export', 5)]
+
+
+class HttpConnection:
+    """Minimal HTTP/1.1 client connection that reconnects when the server closes it."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        """Send one request; returns ``(status, body bytes)``."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = b'' if payload is None else json.dumps(payload).encode()
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode() + body)
+        await self.writer.drain()
+
+        lines = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                data += (await self.reader.readexactly(size + 2))[:-2]
+                if not size:
+                    break
+        else:
+            data = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close' or lines[0].startswith('HTTP/1.0'):
+            await self.close()
+        return status, data
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, port, workers, env):
+    if kind == 'dev':
+        # What app.py runs, minus the debugger and reloader.
+        command = [sys.executable, '-c', f"from app import app; app.run(port={port})"]
+    else:
+        command = [sys.executable, 'serve.py', '--port', str(port), '--workers', str(workers)]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with code {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+async def seed(port, network_count):
+    connection = HttpConnection('127.0.0.1', port)
+    layers = {}
+    for _ in range(network_count):
+        _, body = await connection.request('POST', '/api/networks', {})
+        network_id = json.loads(body)['id']
+        layers[network_id] = []
+        for _ in range(4):
+            _, body = await connection.request('POST', f'/api/networks/{network_id}/layers',
+                                               {'type': 'DenseLayer', 'params': {'units': 64}})
+            layers[network_id].append(json.loads(body)['id'])
+    exportable = []
+    for _ in range(network_count):
+        _, body = await connection.request('POST', '/api/networks', {})
+        network_id = json.loads(body)['id']
+        operations = [{'op': 'add_layer', 'ref': '0', 'type': 'TabularInputLayer', 'params': {'input_shape': [64]}}]
+        for index in range(1, 9):
+            operations += [
+                {'op': 'add_layer', 'ref': str(index), 'type': 'DenseLayer', 'params': {'units': 64}},
+                {'op': 'connect', 'source_ref': str(index - 1), 'target_ref': str(index)},
+            ]
+        await connection.request('POST', f'/api/networks/{network_id}/batch', {'operations': operations})
+        exportable.append(network_id)
+    await connection.close()
+    return layers, exportable
+
+
+async def client(port, layers, exportable, deadline, rng, latencies, errors):
+    connection = HttpConnection('127.0.0.1', port)
+    kinds, weights = zip(*MIX)
+    network_ids = list(layers)
+    while time.monotonic() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        network_id = rng.choice(network_ids)
+        if kind == 'add_layer':
+            request = ('POST', f'/api/networks/{network_id}/layers', {'type': 'DenseLayer', 'params': {'units': 64}})
+        elif kind == 'connect':
+            # Lower id to higher id keeps the graph acyclic.
+            source, target = sorted(rng.sample(layers[network_id], 2))
+            request = ('POST', f'/api/networks/{network_id}/connections', {'source': source, 'target': target})
+        elif kind == 'log':
+            request = ('POST', '/api/user-logs', {'events': [
+                {'type': 'layer_added', 'network_id': network_id, 'timestamp': time.time()}] * 10})
+        else:
+            request = ('GET', f'/api/networks/{rng.choice(exportable)}/export/pytorch', None)
+        start = time.perf_counter()
+        try:
+            status, body = await connection.request(*request)
+        except (OSError, asyncio.IncompleteReadError):
+            await connection.close()
+            errors[kind] += 1
+            continue
+        latencies[kind].append(time.perf_counter() - start)
+        if status >= 400:
+            errors[kind] += 1
+        elif kind == 'add_layer':
+            layers[network_id].append(json.loads(body)['id'])
+    await connection.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def load(port, connections, networks, duration, seed_value):
+    layers, exportable = await seed(port, networks)
+    latencies, errors = defaultdict(list), defaultdict(int)
+    start = time.monotonic()
+    deadline = start + duration
+    await asyncio.gather(*(
+        client(port, layers, exportable, deadline, random.Random(seed_value + n), latencies, errors)
+        for n in range(connections)
+    ))
+    return latencies, errors, time.monotonic() - start
+
+
+def report(name, latencies, errors, elapsed):
+    rows = [(kind, sorted(latencies[kind])) for kind, _ in MIX]
+    rows.append(('all', sorted(t for values in latencies.values() for t in values)))
+    for kind, values in rows:
+        failed = sum(errors.values()) if kind == 'all' else errors[kind]
+        print(f"{name:<6} {kind:<10} {len(values):>8} {len(values) / elapsed:>9.1f} "
+              f"{percentile(values, 0.5) * 1000:>8.2f} {percentile(values, 0.99) * 1000:>8.2f} {failed:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', choices=['dev', 'asgi'], default=['dev', 'asgi'])
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--networks', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=1, help="ASGI worker processes")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'server':<6} {'request':<10} {'count':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in args.servers:
+            env = dict(os.environ, USER_LOG_DIR=os.path.join(directory, kind, 'logs'))
+            if kind == 'asgi' and args.workers > 1:
+                env['NETWORK_STORE_PATH'] = os.path.join(directory, 'networks.db')
+            port = free_port()
+            try:
+                process = start_server(kind, port, args.workers, env)
+            except RuntimeError as error:
+                print(f"{kind:<6} skipped: {error}")
+                continue
+            try:
+                results = asyncio.run(load(port, args.connections, args.networks, args.duration, args.seed))
+            finally:
+                process.terminate()
+                process.wait()
+            report(kind, *results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Activation memory planning: arena size against the no-reuse total.
+
+Plans a transformer encoder (in-place dropout after every block), a
+ResNet-style CNN and a U-Net with long skip connections at ``--blocks``
+depths. For each, reports the activation total, the buffers left after
+in-place aliasing, the planned arena, the live-bytes lower bound and the
+planning time, and checks that:
+
+* no two buffers with overlapping lifetimes overlap in the arena;
+* the arena is never below the peak of live bytes;
+* (with NumPy) running the network out of the arena gives the same
+  outputs as running it with freshly allocated arrays.
+
+    python backend/benchmarks/memory_planner.py --blocks 4 64 512 --batch 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LAYER_TYPES  # noqa: E402
+from memory_planner import MemoryPlan  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+from numpy_executor import NumpyExecutor, numpy_available  # noqa: E402
+
+
+def add(network, layer_type, params, *inputs):
+    layer = LAYER_TYPES[layer_type].from_params(params)
+    network.add_layer(layer)
+    for source in inputs:
+        network.connect(source, layer)
+    return layer
+
+
+def transformer(blocks):
+    network = NeuralNetwork('transformer')
+    previous = add(network, 'EmbeddingLayer', {'num_embeddings': 1000, 'embedding_dim': 64},
+                   add(network, 'TextInputLayer', {'input_shape': [32]}))
+    for _ in range(blocks):
+        attention = add(network, 'AttentionLayer', {'embed_dim': 64, 'num_heads': 4}, previous)
+        norm = add(network, 'NormalizationLayer', {'normalization_type': 'LAYER_NORMALIZATION'},
+                   attention, previous)
+        dense = add(network, 'DenseLayer', {'units': 64}, norm)
+        previous = add(network, 'DropoutLayer', {'probability': 0.1, 'inplace': True}, dense)
+    return network
+
+
+def resnet(blocks):
+    network = NeuralNetwork('resnet')
+    previous = add(network, 'ConvolutionalLayer', {'in_channels': 3, 'filters': 16},
+                   add(network, 'ImageInputLayer', {'input_shape': [3, 16, 16]}))
+    for _ in range(blocks):
+        conv = add(network, 'ConvolutionalLayer', {'in_channels': 16, 'filters': 16}, previous)
+        relu = add(network, 'ReLUFunction', {}, add(network, 'NormalizationLayer', {}, conv))
+        conv = add(network, 'ConvolutionalLayer', {'in_channels': 16, 'filters': 16}, relu)
+        previous = add(network, 'ReLUFunction', {}, add(network, 'NormalizationLayer', {}, conv, previous))
+    return network
+
+
+def unet(blocks):
+    """Encoder/decoder where every encoder stage feeds the mirrored decoder stage."""
+    network = NeuralNetwork('unet')
+    previous = add(network, 'ConvolutionalLayer', {'in_channels': 1, 'filters': 8},
+                   add(network, 'ImageInputLayer', {'input_shape': [1, 16, 16]}))
+    skips = []
+    for _ in range(blocks):
+        previous = add(network, 'ReLUFunction', {},
+                       add(network, 'ConvolutionalLayer', {'in_channels': 8, 'filters': 8}, previous))
+        skips.append(previous)
+    for skip in reversed(skips):
+        merged = add(network, 'ConvolutionalLayer', {'in_channels': 16, 'filters': 8}, previous, skip)
+        previous = add(network, 'DropoutLayer', {'probability': 0.2, 'inplace': True}, merged)
+    return network
+
+
+def check_plan(name, plan):
+    buffers = sorted(plan.buffers, key=lambda b: b.offset)
+    for index, buffer in enumerate(buffers):
+        assert buffer.offset % plan.alignment == 0, f"{name}: layer {buffer.layer_id} is misaligned"
+        for other in buffers[index + 1:]:
+            if other.offset >= buffer.offset + buffer.size:
+                break
+            assert other.end < buffer.start or other.start > buffer.end, \
+                f"{name}: layers {buffer.layer_id} and {other.layer_id} overlap in time and memory"
+    assert plan.arena_bytes >= plan.peak_bytes, f"{name}: arena below the live peak"
+
+
+def check_arena_run(name, network, batch):
+    executor = NumpyExecutor(network, seed=3)
+    plan = MemoryPlan(network, batch, 'float32')
+    inputs = executor.random_inputs(batch, seed=4)
+    expected = executor.run(inputs).outputs
+    actual = executor.run(inputs, plan=plan).outputs
+    for layer_id, value in expected.items():
+        assert (actual[layer_id] == value).all(), f"{name}: arena run differs at layer {layer_id}"
+
+
+def mib(nbytes):
+    return f"{nbytes / 2 ** 20:9.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blocks', type=int, nargs='+', default=[4, 64, 512])
+    parser.add_argument('--batch', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'model':<12} {'blocks':>6} {'layers':>6}  {'total MiB':>9} {'in-place':>9} "
+          f"{'arena':>9} {'peak':>9}  {'plan ms':>8}")
+    for build in (transformer, resnet, unet):
+        for blocks in args.blocks:
+            network = build(blocks)
+            start = time.perf_counter()
+            plan = MemoryPlan(network, args.batch, 'float32')
+            elapsed = time.perf_counter() - start
+            check_plan(build.__name__, plan)
+            totals = plan.to_dict()['totals']
+            print(f"{build.__name__:<12} {blocks:>6} {len(network.layers):>6}  {mib(totals['activation_bytes'])} "
+                  f"{mib(totals['no_reuse_bytes'])} {mib(plan.arena_bytes)} {mib(plan.peak_bytes)}  "
+                  f"{elapsed * 1000:8.1f}")
+            if numpy_available() and blocks <= 64:
+                check_arena_run(build.__name__, network, args.batch)
+    print("placement checks ok" + (", arena runs match" if numpy_available() else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,388 @@
+"""Forward passes on the NumPy executor, checked against naive references.
+
+First runs every kernel on small random cases next to a direct
+loop-per-output implementation of the same (PyTorch) semantics with the
+kernel's own weights: strided, dilated and grouped convolutions in 1D/2D/3D
+with each padding mode, max/average pooling with SAME padding and
+ceil_mode, multi-head attention with bias_kv and zero_attn, stacked
+bidirectional RNN/GRU/LSTMs and the normalization variants. Then runs a
+ResNet-style CNN, a transformer encoder, an LSTM tagger and a small 3D CNN
+at ``--batch`` sizes and reports the per-layer times, checking each output
+shape and weight count against shape inference.
+
+    python backend/benchmarks/numpy_executor.py --batch 1 8 32 --repeat 3
+"""
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LAYER_TYPES  # noqa: E402
+from layers.layer import expand_tuple  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+from numpy_executor import NumpyExecutor, PAD_MODES, EPSILON, _group_count  # noqa: E402
+from shape_inference import shape_inference_for  # noqa: E402
+
+
+def add(network, layer_type, params, *inputs):
+    layer = LAYER_TYPES[layer_type].from_params(params)
+    network.add_layer(layer)
+    for source in inputs:
+        network.connect(source, layer)
+    return layer
+
+
+def single(layer_type, params, *input_shapes, training=False):
+    """Executor for one layer fed by input layers of ``input_shapes``."""
+    network = NeuralNetwork('check')
+    inputs = [add(network, 'TabularInputLayer', {'input_shape': list(shape)}) for shape in input_shapes]
+    add(network, layer_type, params, *inputs)
+    executor = NumpyExecutor(network, seed=1, dtype='float64', training=training)
+    return executor, [i.id for i in inputs]
+
+
+def run_single(layer_type, params, *input_shapes, batch=2, training=False):
+    executor, ids = single(layer_type, params, *input_shapes, training=training)
+    rng = np.random.default_rng(2)
+    inputs = {i: rng.standard_normal((batch,) + tuple(s)) for i, s in zip(ids, input_shapes)}
+    result = executor.run(inputs)
+    step = executor.steps[0]
+    return [inputs[i] for i in ids], result.outputs[step.layer_id], step.params
+
+
+def check(name, actual, expected):
+    assert actual.shape == expected.shape, f"{name}: shape {actual.shape} != {expected.shape}"
+    error = np.abs(actual - expected).max() if actual.size else 0
+    assert error < 1e-9, f"{name}: max error {error}"
+
+
+def naive_convolution(x, weight, bias, layer_params):
+    ndim = x.ndim - 2
+    kernel = expand_tuple(layer_params['kernel_size'], ndim)
+    stride = expand_tuple(layer_params.get('stride', 1), ndim)
+    padding = expand_tuple(layer_params.get('padding', 0), ndim)
+    dilation = expand_tuple(layer_params.get('dilation', 1), ndim)
+    groups = layer_params.get('groups', 1)
+    mode = PAD_MODES[layer_params.get('padding_mode', 'zeros')]
+    x = np.pad(x, ((0, 0), (0, 0)) + tuple((p, p) for p in padding), mode=mode)
+    n, channels = x.shape[:2]
+    filters = weight.shape[0] * weight.shape[2]
+    # Back to PyTorch's (filters, channels / groups, *kernel) layout.
+    weight = weight.transpose(0, 2, 1).reshape((filters, channels // groups) + kernel)
+    out = [(size - d * (k - 1) - 1) // s + 1 for size, k, s, d in zip(x.shape[2:], kernel, stride, dilation)]
+    y = np.zeros((n, filters) + tuple(out))
+    per_group = filters // groups
+    for f in range(filters):
+        g = f // per_group
+        group_channels = slice(g * channels // groups, (g + 1) * channels // groups)
+        for position in itertools.product(*map(range, out)):
+            index = tuple(slice(p * s, p * s + d * (k - 1) + 1, d)
+                          for p, s, d, k in zip(position, stride, dilation, kernel))
+            patch = x[(slice(None), group_channels) + index]
+            y[(slice(None), f) + position] = (patch * weight[f]).reshape(n, -1).sum(axis=1)
+    if bias is not None:
+        y += bias.reshape((1, filters) + (1,) * ndim)
+    return y
+
+
+def naive_pooling(x, layer_params, output_shape):
+    ndim = x.ndim - 2
+    kernel = expand_tuple(layer_params['kernel_size'], ndim)
+    stride = expand_tuple(layer_params.get('stride') or layer_params['kernel_size'], ndim)
+    dilation = expand_tuple(layer_params.get('dilation', 1), ndim)
+    same = layer_params.get('padding') == 'SAME'
+    y = np.zeros(x.shape[:2] + tuple(output_shape[1:]))
+    for position in itertools.product(*map(range, output_shape[1:])):
+        index = []
+        for p, s, d, k, size, out in zip(position, stride, dilation, kernel, x.shape[2:], output_shape[1:]):
+            total = max((out - 1) * s + d * (k - 1) + 1 - size, 0)
+            start = p * s - (total // 2 if same else 0)
+            taps = [start + t * d for t in range(k)]
+            index.append([t for t in taps if 0 <= t < size])
+        window = x[np.ix_(range(x.shape[0]), range(x.shape[1]), *index)].reshape(x.shape[:2] + (-1,))
+        reduce = window.max if layer_params.get('pooling_type') == 'MAX' else window.mean
+        y[(slice(None), slice(None)) + position] = reduce(axis=-1)
+    return y
+
+
+def naive_attention(query, key, value, params, layer_params):
+    heads = layer_params['num_heads']
+    embed_dim = layer_params['embed_dim']
+    head_dim = embed_dim // heads
+    n = query.shape[0]
+    out = np.zeros((n, query.shape[1], embed_dim))
+    for b in range(n):
+        q = query[b] @ params['w_q'] + params.get('b_q', 0)
+        k = key[b] @ params['w_k'] + params.get('b_k', 0)
+        v = value[b] @ params['w_v'] + params.get('b_v', 0)
+        if 'bias_k' in params:
+            k = np.vstack([k, params['bias_k'][0]])
+            v = np.vstack([v, params['bias_v'][0]])
+        context = np.zeros((query.shape[1], embed_dim))
+        for h in range(heads):
+            columns = slice(h * head_dim, (h + 1) * head_dim)
+            k_h, v_h = k[:, columns], v[:, columns]
+            if layer_params.get('add_zero_attn'):
+                k_h = np.vstack([k_h, np.zeros(head_dim)])
+                v_h = np.vstack([v_h, np.zeros(head_dim)])
+            for i in range(query.shape[1]):
+                scores = np.array([q[i, columns] @ k_h[j] for j in range(len(k_h))]) / np.sqrt(head_dim)
+                weights = np.exp(scores - scores.max())
+                context[i, columns] = (weights / weights.sum()) @ v_h
+        out[b] = context @ params['w_o'] + params.get('b_o', 0)
+    return out
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def naive_recurrent(x, params, layer_params):
+    kind = layer_params['recurrent_type']
+    hidden = layer_params['hidden_size']
+    directions = 2 if layer_params.get('bidirectional') else 1
+    for index in range(layer_params.get('num_layers', 1)):
+        outputs = []
+        for direction in range(directions):
+            suffix = f"_l{index}" + ("_reverse" if direction else "")
+            w_ih, w_hh = params['weight_ih' + suffix].T, params['weight_hh' + suffix].T
+            b_ih = params.get('bias_ih' + suffix, np.zeros(len(w_ih)))
+            b_hh = params.get('bias_hh' + suffix, np.zeros(len(w_ih)))
+            y = np.zeros(x.shape[:2] + (hidden,))
+            for b in range(x.shape[0]):
+                h, c = np.zeros(hidden), np.zeros(hidden)
+                steps = range(x.shape[1] - 1, -1, -1) if direction else range(x.shape[1])
+                for t in steps:
+                    gi, gh = w_ih @ x[b, t] + b_ih, w_hh @ h + b_hh
+                    if kind == 'LSTM':
+                        i, f, g, o = np.split(gi + gh, 4)
+                        c = sigmoid(f) * c + sigmoid(i) * np.tanh(g)
+                        h = sigmoid(o) * np.tanh(c)
+                    elif kind == 'GRU':
+                        (i_r, i_z, i_n), (h_r, h_z, h_n) = np.split(gi, 3), np.split(gh, 3)
+                        r, z = sigmoid(i_r + h_r), sigmoid(i_z + h_z)
+                        h = (1 - z) * np.tanh(i_n + r * h_n) + z * h
+                    else:
+                        h = np.tanh(gi + gh)
+                    y[b, t] = h
+            outputs.append(y)
+        x = np.concatenate(outputs, axis=-1)
+    return x
+
+
+def naive_normalization(x, kind, training):
+    y = np.empty_like(x)
+    if kind == 'LAYER_NORMALIZATION':
+        for index in np.ndindex(x.shape[:-1]):
+            row = x[index]
+            y[index] = (row - row.mean()) / np.sqrt(row.var() + EPSILON)
+    elif kind == 'GROUP_NORMALIZATION':
+        groups = _group_count(x.shape[1])
+        size = x.shape[1] // groups
+        for b in range(x.shape[0]):
+            for g in range(groups):
+                block = x[b, g * size:(g + 1) * size]
+                y[b, g * size:(g + 1) * size] = (block - block.mean()) / np.sqrt(block.var() + EPSILON)
+    elif kind.startswith('INSTANCE'):
+        for b, c in np.ndindex(x.shape[:2]):
+            y[b, c] = (x[b, c] - x[b, c].mean()) / np.sqrt(x[b, c].var() + EPSILON)
+    elif training:
+        for c in range(x.shape[1]):
+            y[:, c] = (x[:, c] - x[:, c].mean()) / np.sqrt(x[:, c].var() + EPSILON)
+    else:
+        y = x / np.sqrt(1 + EPSILON)
+    return y
+
+
+def check_kernels():
+    cases = 0
+    for shape, params in [
+        ((4, 9), {'conv_type': 'CONV1D', 'filters': 6, 'kernel_size': 3, 'stride': 2, 'padding': 1}),
+        ((4, 11), {'conv_type': 'CONV1D', 'filters': 4, 'kernel_size': 3, 'dilation': 2, 'padding': 2,
+                   'padding_mode': 'circular', 'groups': 2}),
+        ((3, 7, 8), {'conv_type': 'CONV2D', 'filters': 5, 'kernel_size': 3, 'padding': 1}),
+        ((4, 8, 7), {'conv_type': 'CONV2D', 'filters': 6, 'kernel_size': [3, 2], 'stride': [2, 1],
+                     'padding': [2, 1], 'padding_mode': 'reflect', 'groups': 2, 'bias': False}),
+        ((4, 6, 6), {'conv_type': 'CONV2D', 'filters': 4, 'kernel_size': 3, 'padding': 1,
+                     'padding_mode': 'replicate', 'groups': 4, 'dilation': 2}),
+        ((2, 5, 6, 4), {'conv_type': 'CONV3D', 'filters': 3, 'kernel_size': 3, 'padding': 1, 'stride': 2}),
+    ]:
+        (x,), y, weights = run_single('ConvolutionalLayer', dict(params, in_channels=shape[0]), shape)
+        check(f"conv {params}", y, naive_convolution(x, weights['weight'], weights['bias'], params))
+        cases += 1
+
+    for shape, params in [
+        ((3, 9), {'pool_dimension': 'Pool1D', 'kernel_size': 3, 'stride': 2}),
+        ((3, 7, 8), {'pool_dimension': 'Pool2D', 'kernel_size': 2}),
+        ((3, 7, 8), {'pool_dimension': 'Pool2D', 'kernel_size': 2, 'ceil_mode': True}),
+        ((3, 7, 8), {'pool_dimension': 'Pool2D', 'kernel_size': 3, 'stride': 2, 'padding': 'SAME',
+                     'pooling_type': 'AVG'}),
+        ((2, 9, 9), {'pool_dimension': 'Pool2D', 'kernel_size': 2, 'stride': 2, 'dilation': 2,
+                     'padding': 'SAME'}),
+        ((2, 5, 6, 7), {'pool_dimension': 'Pool3D', 'kernel_size': 2, 'pooling_type': 'AVG',
+                        'ceil_mode': True}),
+    ]:
+        params.setdefault('pooling_type', 'MAX')
+        (x,), y, _ = run_single('PoolingLayer', params, shape)
+        check(f"pool {params}", y, naive_pooling(x, params, y.shape[1:]))
+        cases += 1
+
+    for shapes, params in [
+        (((5, 8),), {'embed_dim': 8, 'num_heads': 2}),
+        (((5, 8), (7, 6), (7, 4)), {'embed_dim': 8, 'num_heads': 4, 'kdim': 6, 'vdim': 4,
+                                    'add_bias_kv': True, 'add_zero_attn': True}),
+        (((3, 6), (4, 6)), {'embed_dim': 6, 'num_heads': 3, 'bias': False}),
+    ]:
+        inputs, y, weights = run_single('AttentionLayer', params, *shapes)
+        query = inputs[0]
+        key = inputs[1] if len(inputs) > 1 else query
+        value = inputs[2] if len(inputs) > 2 else key
+        check(f"attention {params}", y, naive_attention(query, key, value, weights, params))
+        cases += 1
+
+    for kind in ('RNN', 'GRU', 'LSTM'):
+        for params in ({'hidden_size': 5}, {'hidden_size': 4, 'num_layers': 2, 'bidirectional': True},
+                       {'hidden_size': 3, 'bias': False}):
+            params = dict(params, recurrent_type=kind, input_size=6)
+            (x,), y, weights = run_single('RecurrentLayer', params, (7, 6))
+            check(f"recurrent {params}", y, naive_recurrent(x, weights, params))
+            cases += 1
+
+    for kind, shape in [('LAYER_NORMALIZATION', (5, 8)), ('GROUP_NORMALIZATION', (6, 4, 4)),
+                        ('INSTANCE_NORMALIZATION1D', (4, 9)), ('INSTANCE_NORMALIZATION2D', (3, 4, 5)),
+                        ('BATCH_NORMALIZATION1D', (6,)), ('BATCH_NORMALIZATION2D', (3, 4, 5)),
+                        ('BATCH_NORMALIZATION3D', (2, 3, 4, 3))]:
+        for training in (False, True):
+            (x,), y, _ = run_single('NormalizationLayer', {'normalization_type': kind}, shape,
+                                    batch=3, training=training)
+            check(f"{kind} training={training}", y, naive_normalization(x, kind, training))
+            cases += 1
+
+    executor, (input_id,) = single('EmbeddingLayer', {'num_embeddings': 20, 'embedding_dim': 4,
+                                                      'padding_idx': 0, 'max_norm': 1.0}, (6,))
+    ids = np.array([[0, 3, 19, 3, 7, 0]])
+    y = executor.run({input_id: ids}).outputs[executor.steps[0].layer_id]
+    table = executor.steps[0].params['table']
+    norms = np.linalg.norm(table[ids], axis=-1, keepdims=True)
+    check("embedding", y, table[ids] * np.minimum(1, 1.0 / np.maximum(norms, 1e-7)))
+    assert not y[0, 0].any(), "padding_idx row is not zero"
+    cases += 1
+
+    for layer_type, params, reference in [
+        ('ReLUFunction', {}, lambda x: np.where(x > 0, x, 0)),
+        ('LeakyReLUFunction', {'alpha': 0.2}, lambda x: np.where(x > 0, x, 0.2 * x)),
+        ('TanhFunction', {}, np.tanh),
+        ('SoftMaxFunction', {}, lambda x: np.exp(x) / np.exp(x).sum(axis=-1, keepdims=True)),
+        ('FlatteningLayer', {}, lambda x: x.reshape(len(x), -1)),
+        ('DropoutLayer', {'probability': 0.5}, lambda x: x),
+    ]:
+        (x,), y, _ = run_single(layer_type, params, (3, 4, 5))
+        check(layer_type, y, reference(x))
+        cases += 1
+    return cases
+
+
+def resnet(blocks, size):
+    network = NeuralNetwork('resnet')
+    previous = add(network, 'ConvolutionalLayer', {'in_channels': 3, 'filters': 32, 'kernel_size': 3, 'padding': 1},
+                   add(network, 'ImageInputLayer', {'input_shape': [3, size, size]}))
+    for _ in range(blocks):
+        conv = add(network, 'ConvolutionalLayer', {'in_channels': 32, 'filters': 32}, previous)
+        norm = add(network, 'NormalizationLayer', {}, conv)
+        relu = add(network, 'ReLUFunction', {}, norm)
+        conv = add(network, 'ConvolutionalLayer', {'in_channels': 32, 'filters': 32, 'bias': False}, relu)
+        norm = add(network, 'NormalizationLayer', {}, conv, previous)
+        previous = add(network, 'ReLUFunction', {}, norm)
+    pool = add(network, 'PoolingLayer', {'kernel_size': 2}, previous)
+    flat = add(network, 'FlatteningLayer', {}, pool)
+    add(network, 'SoftMaxFunction', {}, add(network, 'DenseLayer', {'units': 10}, flat))
+    return network
+
+
+def transformer(blocks, length):
+    network = NeuralNetwork('transformer')
+    previous = add(network, 'EmbeddingLayer', {'num_embeddings': 1000, 'embedding_dim': 128},
+                   add(network, 'TextInputLayer', {'input_shape': [length]}))
+    for _ in range(blocks):
+        attention = add(network, 'AttentionLayer', {'embed_dim': 128, 'num_heads': 8}, previous)
+        norm = add(network, 'NormalizationLayer', {'normalization_type': 'LAYER_NORMALIZATION'},
+                   attention, previous)
+        dense = add(network, 'DenseLayer', {'units': 128}, norm)
+        previous = add(network, 'DropoutLayer', {'probability': 0.1}, dense)
+    return network
+
+
+def lstm_tagger(length):
+    network = NeuralNetwork('lstm')
+    embedded = add(network, 'EmbeddingLayer', {'num_embeddings': 5000, 'embedding_dim': 64},
+                   add(network, 'TextInputLayer', {'input_shape': [length]}))
+    lstm = add(network, 'RecurrentLayer', {'recurrent_type': 'LSTM', 'input_size': 64, 'hidden_size': 128,
+                                           'num_layers': 2, 'bidirectional': True}, embedded)
+    add(network, 'SoftMaxFunction', {}, add(network, 'DenseLayer', {'units': 20}, lstm))
+    return network
+
+
+def video(size):
+    network = NeuralNetwork('video')
+    previous = add(network, 'VideoInputLayer', {'input_shape': [3, 8, size, size]})
+    for in_channels, filters in ((3, 16), (16, 32)):
+        conv = add(network, 'ConvolutionalLayer', {'conv_type': 'CONV3D', 'in_channels': in_channels, 'filters': filters,
+                                                   'kernel_size': 3, 'padding': 1}, previous)
+        norm = add(network, 'NormalizationLayer', {'normalization_type': 'BATCH_NORMALIZATION3D'}, conv)
+        previous = add(network, 'PoolingLayer', {'pool_dimension': 'Pool3D', 'kernel_size': 2},
+                       add(network, 'LeakyReLUFunction', {'alpha': 0.1}, norm))
+    return network
+
+
+def benchmark(name, network, batches, repeat):
+    shapes = shape_inference_for(network).update()
+    executor = NumpyExecutor(network)
+    for step in executor.steps:
+        assert step.count_params() == shapes[step.layer_id].params, \
+            f"{name}: layer {step.layer_id} has {step.count_params()} weights, expected {shapes[step.layer_id].params}"
+    flops = sum(r.flops for r in shapes.values())
+    for batch in batches:
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = executor.run(batch_size=batch, seed=0)
+            runs.append((time.perf_counter() - start, result))
+        elapsed, result = min(runs, key=lambda run: run[0])
+        for layer_id, value in result.outputs.items():
+            assert value.shape == (batch,) + tuple(shapes[layer_id].output_shape), \
+                f"{name}: layer {layer_id} gave {value.shape}"
+            assert np.isfinite(value).all(), f"{name}: layer {layer_id} is not finite"
+        by_type = {}
+        for step in executor.steps:
+            by_type[step.type] = by_type.get(step.type, 0) + statistics.median(
+                run[1].timings[step.layer_id] for run in runs)
+        slowest = ', '.join(f"{t} {s * 1000:.1f}" for t, s in sorted(by_type.items(), key=lambda i: -i[1])[:3])
+        print(f"{name:<12} batch {batch:>3}: {elapsed * 1000:8.1f} ms, "
+              f"{batch / elapsed:8.1f} samples/s, {flops * batch / elapsed / 1e9:6.2f} GFLOP/s  ({slowest} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--blocks', type=int, default=4)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cases = check_kernels()
+    print(f"{cases} kernel cases match the naive references ({time.perf_counter() - start:.1f} s)")
+
+    for name, network in [('resnet', resnet(args.blocks, 32)), ('transformer', transformer(args.blocks, 64)),
+                          ('lstm', lstm_tagger(32)), ('video', video(32))]:
+        print(f"{name}: {len(network.layers)} layers")
+        benchmark(name, network, args.batch, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
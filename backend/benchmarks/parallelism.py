@@ -0,0 +1,163 @@
+"""Critical path, width and pipeline stages of an Inception-style network.
+
+Builds ``--blocks`` Inception blocks (four parallel branches of 1x1, 3x3
+and 5x5 convolutions and pooling, concatenated along channels) and times
+the analysis with a ``--devices`` pipeline partition. Checks that:
+
+* the critical path and its weight match an exhaustive search over all
+  input-to-output paths of small random DAGs;
+* the widest depth level is an antichain (no path between any two of its
+  layers), so it never exceeds the exhaustive maximum antichain;
+* the pipeline bottleneck matches trying every way of cutting small
+  sequences, and every stage only receives from earlier stages;
+* each Inception block reports a width of four.
+
+    python backend/benchmarks/parallelism.py --blocks 40 --devices 4
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LAYER_TYPES  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+from parallelism import ParallelismAnalysis, layer_weights, partition  # noqa: E402
+
+
+def add(network, layer_type, params, *inputs):
+    layer = LAYER_TYPES[layer_type].from_params(params)
+    network.add_layer(layer)
+    for source in inputs:
+        network.connect(source, layer)
+    return layer
+
+
+def conv(network, source, in_channels, filters, kernel):
+    return add(network, 'ConvolutionalLayer', {'in_channels': in_channels, 'filters': filters,
+                                               'kernel_size': kernel, 'padding': kernel // 2}, source)
+
+
+def inception(blocks, resolution=32):
+    network = NeuralNetwork('inception')
+    previous = conv(network, add(network, 'ImageInputLayer', {'input_shape': [3, resolution, resolution]}),
+                    3, 64, 3)
+    for _ in range(blocks):
+        branches = [
+            conv(network, previous, 64, 16, 1),
+            conv(network, conv(network, previous, 64, 24, 1), 24, 32, 3),
+            conv(network, conv(network, previous, 64, 8, 1), 8, 8, 5),
+            conv(network, add(network, 'PoolingLayer', {'kernel_size': 3, 'stride': 1, 'padding': 'SAME'}, previous),
+                 64, 8, 1),
+        ]
+        previous = add(network, 'ReLUFunction', {}, *branches)
+    flat = add(network, 'FlatteningLayer', {}, add(network, 'PoolingLayer', {'kernel_size': 2}, previous))
+    add(network, 'DenseLayer', {'units': 10}, flat)
+    return network
+
+
+def random_dag(rng, size):
+    network = NeuralNetwork('random')
+    layers = [add(network, 'ReLUFunction', {}) for _ in range(size)]
+    for target in range(1, size):
+        for source in rng.sample(range(target), rng.randint(0, min(3, target))):
+            network.connect(layers[source], layers[target])
+    weights = {layer.id: rng.randint(0, 20) for layer in layers}
+    return network, weights
+
+
+def paths(network, layer_id):
+    outgoing = [c.target.id for c in network.outgoing[layer_id].values()]
+    if not outgoing:
+        yield [layer_id]
+    for target in outgoing:
+        for rest in paths(network, target):
+            yield [layer_id] + rest
+
+
+def reachable(network):
+    closure = {}
+    for layer_id in reversed(list(network.layers)):
+        closure[layer_id] = set()
+        for connection in network.outgoing[layer_id].values():
+            closure[layer_id] |= {connection.target.id} | closure[connection.target.id]
+    return closure
+
+
+def check_random_dags(rng, count):
+    for _ in range(count):
+        network, weights = random_dag(rng, rng.randint(1, 11))
+        analysis = ParallelismAnalysis(network, weights)
+        sources = [i for i in network.layers if not network.incoming[i]]
+        best = max(sum(weights[i] for i in path) for s in sources for path in paths(network, s))
+        assert analysis.length == best, f"critical path {analysis.length} != {best}"
+        assert sum(weights[i] for i in analysis.critical_path) == best, "critical path layers do not add up"
+        for source, target in zip(analysis.critical_path, analysis.critical_path[1:]):
+            assert target in {c.target.id for c in network.outgoing[source].values()}, "path is not a chain"
+        assert all(analysis.slack[i] == 0 for i in analysis.critical_path), "critical layer has slack"
+
+        closure = reachable(network)
+        levels = analysis.widths()
+        widest = [i for i in analysis.order if analysis.depth[i] == max(levels, key=levels.get)]
+        assert not any(b in closure[a] for a in widest for b in widest), "widest level is not an antichain"
+        ids = list(network.layers)
+        antichain = max(size for size in range(1, len(ids) + 1) for group in itertools.combinations(ids, size)
+                        if not any(b in closure[a] for a in group for b in group))
+        assert max(levels.values()) <= antichain, "width exceeds the maximum antichain"
+
+
+def check_partitions(rng, count):
+    for _ in range(count):
+        weights = [rng.randint(0, 50) for _ in range(rng.randint(1, 9))]
+        devices = rng.randint(1, 5)
+        bounds = partition(weights, devices)
+        assert bounds[0][0] == 0 and bounds[-1][1] == len(weights), "stages do not cover the sequence"
+        assert all(a[1] == b[0] and a[0] < a[1] for a, b in zip(bounds, bounds[1:])), "stages overlap"
+        assert len(bounds) == min(devices, len(weights)), f"{len(bounds)} stages for {devices} devices"
+        best = min(
+            max(sum(weights[a:b]) for a, b in zip((0,) + cuts, cuts + (len(weights),)))
+            for stages in range(1, min(devices, len(weights)) + 1)
+            for cuts in itertools.combinations(range(1, len(weights)), stages - 1)
+        )
+        actual = max(sum(weights[a:b]) for a, b in bounds)
+        assert actual == best, f"bottleneck {actual} != {best} for {weights} on {devices} devices"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blocks', type=int, default=40)
+    parser.add_argument('--devices', type=int, default=4)
+    parser.add_argument('--checks', type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    check_random_dags(rng, args.checks)
+    check_partitions(rng, args.checks)
+    print(f"{args.checks} random DAGs and {args.checks} partitions match exhaustive search")
+
+    network = inception(args.blocks)
+    start = time.perf_counter()
+    weights = layer_weights(network)
+    analysis = ParallelismAnalysis(network, weights)
+    result = analysis.to_dict(args.devices)
+    elapsed = time.perf_counter() - start
+    print(f"{len(network.layers)} layers analyzed in {elapsed * 1000:.1f} ms")
+    print(f"critical path: {len(result['critical_path'])} layers, {result['critical_path_weight']:,} of "
+          f"{result['total_weight']:,} FLOPs (parallelism {result['parallelism']}), max width "
+          f"{result['max_width']}, {result['max_concurrent']} concurrent")
+    assert result['max_width'] == 4, f"an Inception block should be 4 wide, not {result['max_width']}"
+
+    stage_of = {i: stage['stage'] for stage in result['pipeline']['stages'] for i in stage['layers']}
+    for connection in network.connections.values():
+        assert stage_of[connection.source.id] <= stage_of[connection.target.id], "a stage sends backwards"
+    for stage in result['pipeline']['stages']:
+        print(f"stage {stage['stage']}: {len(stage['layers'])} layers, {stage['weight']:,} FLOPs, "
+              f"{stage['params']:,} params, receives {[r['layer'] for r in stage['receives']]}")
+    print(f"balance {result['pipeline']['balance']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Repeated-block detection and template reuse in shape inference.
+
+Builds transformer encoder stacks (attention, layer norm with a residual
+input, dense, dropout) and ResNet-style conv stages of ``--blocks`` blocks,
+then reports how long BlockIndex takes to find the templates, how many
+layers they cover, and the cold shape inference time with and without
+memoization of layer results, checking both give the same shapes.
+
+    python backend/benchmarks/repeated_blocks.py --blocks 100 500 2500
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LAYER_TYPES  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+from shape_inference import ShapeInference  # noqa: E402
+from structural_hash import BlockIndex  # noqa: E402
+
+
+def add(network, layer_type, params, *inputs):
+    layer = LAYER_TYPES[layer_type].from_params(params)
+    network.add_layer(layer)
+    for source in inputs:
+        network.connect(source, layer)
+    return layer
+
+
+def transformer(blocks):
+    network = NeuralNetwork('transformer')
+    previous = add(network, 'EmbeddingLayer', {'embedding_dim': 256},
+                   add(network, 'TextInputLayer', {}))
+    for _ in range(blocks):
+        attention = add(network, 'AttentionLayer', {'embed_dim': 256, 'num_heads': 8}, previous)
+        norm = add(network, 'NormalizationLayer',
+                   {'normalization_type': 'LAYER_NORMALIZATION', 'num_features': 256}, attention, previous)
+        dense = add(network, 'DenseLayer', {'in_features': 256, 'units': 256}, norm)
+        previous = add(network, 'DropoutLayer', {'probability': 0.1}, dense)
+    return network
+
+
+def resnet(blocks):
+    network = NeuralNetwork('resnet')
+    previous = add(network, 'ConvolutionalLayer', {'in_channels': 3, 'filters': 64, 'kernel_size': 7, 'padding': 3},
+                   add(network, 'ImageInputLayer', {}))
+    for _ in range(blocks):
+        conv = add(network, 'ConvolutionalLayer', {'in_channels': 64, 'filters': 64}, previous)
+        norm = add(network, 'NormalizationLayer', {'num_features': 64}, conv)
+        relu = add(network, 'ReLUFunction', {}, norm)
+        conv = add(network, 'ConvolutionalLayer', {'in_channels': 64, 'filters': 64, 'bias': False}, relu)
+        norm = add(network, 'NormalizationLayer', {'num_features': 64}, conv, previous)
+        previous = add(network, 'ReLUFunction', {}, norm)
+    return network
+
+
+class NoMemo(dict):
+    def get(self, key, default=None):
+        return default
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def shapes(network, memo):
+    engine = ShapeInference(network)
+    if not memo:
+        engine._memo = NoMemo()
+    start = time.perf_counter()
+    results = engine.update()
+    elapsed = time.perf_counter() - start
+    network.listeners.remove(engine)
+    return {i: (r.output_shape, r.params, r.flops, r.error) for i, r in results.items()}, engine.reused, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blocks', type=int, nargs='+', default=[100, 500, 2500])
+    args = parser.parse_args()
+
+    print(f"{'model':<12} {'layers':>7} {'detect ms':>10} {'templates':>10} {'covered':>8} "
+          f"{'shapes ms':>10} {'memo ms':>8} {'reused':>7}")
+    for blocks in args.blocks:
+        for build in (transformer, resnet):
+            network = build(blocks)
+            index = BlockIndex(network)
+            start = time.perf_counter()
+            templates = index.templates()
+            detect = time.perf_counter() - start
+            assert len(templates) == 1 and len(templates[0].instances) == blocks, \
+                f"expected one template with {blocks} instances"
+            covered = sum(len(t.instances) * len(t.instances[0]) for t in templates) / len(network.layers)
+
+            plain, _, plain_time = shapes(network, memo=False)
+            memoized, reused, memo_time = shapes(network, memo=True)
+            assert plain == memoized, "memoized shapes differ"
+            print(f"{build.__name__:<12} {len(network.layers):>7} {detect * 1000:>10.1f} {len(templates):>10} "
+                  f"{covered:>8.1%} {plain_time * 1000:>10.1f} {memo_time * 1000:>8.1f} {reused:>7}")
+    print("templates and shapes ok")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Snapshot size and speed against plain JSON and pickle.
+
+Builds a network of ``--layers`` layers (repeating conv blocks with skip
+connections), then reports the encoded size, encode and decode times for
+the binary snapshot format, its JSON fallback, ``json.dumps`` of the graph
+and pickle. Every decoded network is checked against the original (types,
+params, ids and edges), so the script doubles as a round-trip check.
+The blocks repeat, so most layers are stored as copies of a template
+layer; the count is printed with the network size. A network with a cycle
+through some of its blocks must round-trip as well.
+
+Truncated binary snapshots and JSON snapshots with missing keys, wrong
+types, edges to unknown layers or copies of unknown or copied layers must
+all fail with SnapshotError.
+
+It also writes ``--files`` snapshots to a temporary directory and times a
+cold and a warm ``SnapshotStore.list``, which only reads file headers.
+
+    python backend/benchmarks/snapshot_format.py --layers 5000 --files 500
+"""
+import argparse
+import json
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LAYER_TYPES  # noqa: E402
+from graph_optimizer import graph_to_dict  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+import snapshot  # noqa: E402
+
+BLOCK = [
+    ('ConvolutionalLayer', {'filters': 64, 'kernel_size': [3, 3], 'padding': 1}),
+    ('NormalizationLayer', {'num_features': 64}),
+    ('ReLUFunction', {}),
+    ('DropoutLayer', {'probability': 0.1}),
+]
+
+
+def build(layer_count):
+    network = NeuralNetwork('bench')
+    previous = network.layers[network.add_layer(LAYER_TYPES['ImageInputLayer'].from_params({}))]
+    block_start = previous
+    while len(network.layers) < layer_count:
+        for layer_type, params in BLOCK:
+            layer = LAYER_TYPES[layer_type].from_params(params)
+            network.add_layer(layer)
+            network.connect(previous, layer)
+            previous = layer
+        network.connect(block_start, previous)
+        block_start = previous
+    return network
+
+
+def assert_same(original, restored):
+    assert list(original.layers) == list(restored.layers), "layer ids differ"
+    for layer_id, layer in original.layers.items():
+        other = restored.layers[layer_id]
+        assert type(layer) is type(other), f"layer {layer_id} changed type"
+        assert layer.config_key() == other.config_key(), f"layer {layer_id} changed params"
+    edges = [(c.id, c.source.id, c.target.id) for c in original.connections.values()]
+    assert edges == [(c.id, c.source.id, c.target.id) for c in restored.connections.values()], "edges differ"
+    assert restored.next_layer_id >= original.next_layer_id
+    assert restored.next_connection_id >= original.next_connection_id
+
+
+def check_malformed(network):
+    document = snapshot.to_json(network)
+    edits = [
+        lambda d: d.pop('layers'),
+        lambda d: d.pop('metadata'),
+        lambda d: d['layers'].append(3),
+        lambda d: d['layers'][0].pop('type'),
+        lambda d: d['layers'][0].update(params=[1]),
+        lambda d: d['layers'].append(d['layers'][0]),
+        lambda d: d['connections'][0].update(target=-1),
+        lambda d: d['connections'][0].pop('source'),
+        lambda d: d.update(version='1'),
+    ]
+    samples = []
+    for edit in edits:
+        broken = json.loads(json.dumps(document))
+        edit(broken)
+        samples.append(json.dumps(broken).encode())
+    for compress in (False, True):
+        data = snapshot.dumps(network, compress=compress)
+        samples += [data[:cut] for cut in range(snapshot.HEADER.size, len(data), max(1, len(data) // 50))]
+    # The copies array ends the body; point the last copy elsewhere.
+    data = snapshot.dumps(network, compress=False)
+    copies = snapshot.template_copies(network)
+    for source in (-5, next(iter(copies))):
+        samples.append(data[:-8] + struct.pack('<q', source))
+    for data in samples:
+        try:
+            snapshot.loads(data, LAYER_TYPES)
+        except snapshot.SnapshotError:
+            continue
+        raise AssertionError(f"malformed snapshot loaded: {data[:80]!r}")
+    return len(samples)
+
+
+def timed(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        best = min(best, time.perf_counter() - start)
+    return value, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--layers', type=int, default=5000)
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    network = build(args.layers)
+    copies = len(snapshot.template_copies(network))
+    print(f"{len(network.layers)} layers ({copies} stored as copies), {len(network.connections)} connections\n")
+
+    formats = [
+        ('snapshot binary', lambda: snapshot.dumps(network),
+         lambda data: snapshot.loads(data, LAYER_TYPES)),
+        ('snapshot binary, raw', lambda: snapshot.dumps(network, compress=False),
+         lambda data: snapshot.loads(data, LAYER_TYPES)),
+        ('snapshot json', lambda: json.dumps(snapshot.to_json(network)).encode(),
+         lambda data: snapshot.loads(data, LAYER_TYPES)),
+        ('json.dumps graph', lambda: json.dumps(graph_to_dict(network)).encode(), json.loads),
+        ('pickle', lambda: pickle.dumps(network, pickle.HIGHEST_PROTOCOL), pickle.loads),
+    ]
+    print(f"{'format':<22} {'bytes':>10} {'encode ms':>10} {'decode ms':>10}")
+    for label, encode, decode in formats:
+        data, encode_time = timed(encode, args.repeat)
+        restored, decode_time = timed(lambda: decode(data), args.repeat)
+        if isinstance(restored, NeuralNetwork):
+            assert_same(network, restored)
+        print(f"{label:<22} {len(data):>10} {encode_time * 1000:>10.2f} {decode_time * 1000:>10.2f}")
+
+    cyclic = build(200)
+    layers = list(cyclic.layers.values())
+    cyclic.connect(layers[-1], layers[len(layers) // 2])
+    assert snapshot.template_copies(cyclic), "no copies in the cyclic network"
+    for compress in (False, True):
+        assert_same(cyclic, snapshot.loads(snapshot.dumps(cyclic, compress=compress), LAYER_TYPES))
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = snapshot.SnapshotStore(directory)
+        small = build(200)
+        for index in range(args.files):
+            store.save(small, f"snapshot {index}", 'json' if index % 10 == 0 else 'binary')
+        listing, cold = timed(lambda: snapshot.SnapshotStore(directory).list(), 1)
+        _, warm = timed(store.list, args.repeat)
+        assert len(listing) == args.files
+        assert_same(small, store.load(listing[0]['id'], LAYER_TYPES))
+        print(f"\nlist {args.files} snapshots: cold {cold * 1000:.1f} ms, warm {warm * 1000:.1f} ms")
+
+    print(f"{check_malformed(build(50))} malformed snapshots rejected")
+    print("round trips ok")
+
+
+if __name__ == '__main__':
+    main()
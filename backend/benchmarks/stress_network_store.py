@@ -0,0 +1,164 @@
+"""Concurrency stress test for the network store.
+
+Hammers create_network, add_layer and connect_layers through the Flask test
+client from many threads (in-memory store), or from several worker
+processes sharing one SQLite file, then checks that no ids collided, that
+every request succeeded and that every acknowledged write is present in the
+store. Connections only join layers in id order that are not connected yet,
+so none of them can be refused as a cycle or a duplicate.
+
+    python backend/benchmarks/stress_network_store.py --threads 16
+    python backend/benchmarks/stress_network_store.py --processes 4 --sqlite /tmp/networks.db
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def hammer(client, shared_ids, rounds, seed):
+    """Run one worker's share of requests.
+
+    Returns every id the API handed out and a description of every request
+    that failed.
+    """
+    rng = random.Random(seed)
+    created, layers, connections = [], defaultdict(list), defaultdict(list)
+    connected = defaultdict(set)
+    failures = []
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        if response.status_code != 200:
+            failures.append(f"POST {path} {body}: {response.status_code} {response.get_json()}")
+            return None
+        return response.get_json()['id']
+
+    for _ in range(rounds):
+        network_id = post('/api/networks', {})
+        if network_id is None:
+            continue
+        created.append(network_id)
+        targets = [network_id] + rng.sample(shared_ids, min(2, len(shared_ids)))
+        for target in targets:
+            for _ in range(3):
+                layer_id = post(f'/api/networks/{target}/layers', {'type': 'DenseLayer', 'params': {}})
+                if layer_id is not None:
+                    layers[target].append(layer_id)
+            # Every worker only joins its own layers, in id order, so
+            # these edges never close a cycle or repeat another one.
+            pairs = [(a, b) for a in layers[target] for b in layers[target]
+                     if a < b and (a, b) not in connected[target]]
+            if pairs:
+                source, dest = rng.choice(pairs)
+                connection_id = post(f'/api/networks/{target}/connections', {'source': source, 'target': dest})
+                if connection_id is not None:
+                    connected[target].add((source, dest))
+                    connections[target].append(connection_id)
+    return created, dict(layers), dict(connections), failures
+
+
+def merge(results):
+    created, layers, connections, failures = [], defaultdict(list), defaultdict(list), []
+    for c, l, k, f in results:
+        created.extend(c)
+        failures.extend(f)
+        for network_id, ids in l.items():
+            layers[network_id].extend(ids)
+        for network_id, ids in k.items():
+            connections[network_id].extend(ids)
+    return created, layers, connections, failures
+
+
+def check(store, created, layers, connections, failures):
+    errors = [f"request failed: {failure}" for failure in failures]
+    if len(created) != len(set(created)):
+        errors.append(f"network ids collided: {len(created) - len(set(created))} duplicates")
+    for kind, issued in (('layer', layers), ('connection', connections)):
+        for network_id, ids in issued.items():
+            if len(ids) != len(set(ids)):
+                errors.append(f"{kind} ids collided in network {network_id}")
+    for network_id, ids in layers.items():
+        network = store.get_network(network_id)
+        if network is None:
+            errors.append(f"network {network_id} lost")
+            continue
+        if set(network.layers) != set(ids):
+            errors.append(f"network {network_id}: stored layers {len(network.layers)} != issued {len(ids)}")
+        if set(network.connections) != set(connections.get(network_id, [])):
+            errors.append(f"network {network_id}: stored connections differ from issued ids")
+    return errors
+
+
+def _seed_networks(client, count):
+    return [client.post('/api/networks', json={}).get_json()['id'] for _ in range(count)]
+
+
+def run_threads(workers, rounds):
+    import app
+
+    client = app.app.test_client()
+    shared = _seed_networks(client, 4)
+    results = [None] * workers
+
+    def target(index):
+        results[index] = hammer(app.app.test_client(), shared, rounds, index)
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return app.networks, merge(results)
+
+
+def _process_worker(args):
+    shared, rounds, seed = args
+    import app
+    return hammer(app.app.test_client(), shared, rounds, seed)
+
+
+def run_processes(workers, rounds, path):
+    os.environ['NETWORK_STORE_PATH'] = path
+    import app
+
+    shared = _seed_networks(app.app.test_client(), 4)
+    with multiprocessing.get_context('spawn').Pool(workers) as pool:
+        results = pool.map(_process_worker, [(shared, rounds, i) for i in range(workers)])
+    return app.networks, merge(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=0,
+                        help='use N worker processes sharing a SQLite store')
+    parser.add_argument('--sqlite', help='SQLite file for --processes (default: temp file)')
+    parser.add_argument('--rounds', type=int, default=25)
+    args = parser.parse_args()
+
+    if args.processes:
+        path = args.sqlite or os.path.join(tempfile.mkdtemp(), 'networks.db')
+        store, issued = run_processes(args.processes, args.rounds, path)
+        mode = f"{args.processes} processes on {path}"
+    else:
+        store, issued = run_threads(args.threads, args.rounds)
+        mode = f"{args.threads} threads in memory"
+
+    errors = check(store, *issued)
+    created, layers, connections, _ = issued
+    print(f"{mode}: {len(created)} networks, {sum(map(len, layers.values()))} layers, "
+          f"{sum(map(len, connections.values()))} connections")
+    for error in errors:
+        print(f"FAIL: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
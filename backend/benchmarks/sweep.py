@@ -0,0 +1,114 @@
+"""Batch x resolution sweeps of a ~300-layer CNN.
+
+Builds a ResNet-style network of ``--blocks`` blocks with pooling
+stages (so small resolutions fail shape inference at the deepest stage)
+and sweeps ``--batches`` x ``--resolutions`` points, first in process and
+then on a pool of ``--workers`` processes. Reports the time per sweep and
+per point, and checks that:
+
+* both runs give identical tables;
+* every point matches a from-scratch cost estimate and memory plan of a
+  freshly built network at that resolution (on a sample of points);
+* resolutions too small for the network report an error instead of rows.
+
+    python backend/benchmarks/sweep.py --batches 40 --resolutions 25 --workers 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import LAYER_TYPES  # noqa: E402
+from cost_model import CostModel  # noqa: E402
+from memory_planner import MemoryPlan  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+from sweep import Sweep, COLUMNS  # noqa: E402
+
+
+def add(network, layer_type, params, *inputs):
+    layer = LAYER_TYPES[layer_type].from_params(params)
+    network.add_layer(layer)
+    for source in inputs:
+        network.connect(source, layer)
+    return layer
+
+
+def resnet(blocks, resolution):
+    network = NeuralNetwork('resnet')
+    previous = add(network, 'ConvolutionalLayer', {'in_channels': 3, 'filters': 32},
+                   add(network, 'ImageInputLayer', {'input_shape': [3, resolution, resolution]}))
+    for index in range(blocks):
+        if index and index % (blocks // 4 or 1) == 0:
+            previous = add(network, 'PoolingLayer', {'kernel_size': 2}, previous)
+        conv = add(network, 'ConvolutionalLayer', {'in_channels': 32, 'filters': 32}, previous)
+        relu = add(network, 'ReLUFunction', {}, add(network, 'NormalizationLayer', {}, conv))
+        conv = add(network, 'ConvolutionalLayer', {'in_channels': 32, 'filters': 32, 'bias': False}, relu)
+        previous = add(network, 'ReLUFunction', {}, add(network, 'NormalizationLayer', {}, conv, previous))
+    flat = add(network, 'FlatteningLayer', {}, add(network, 'PoolingLayer', {'kernel_size': 2}, previous))
+    add(network, 'DenseLayer', {'units': 10}, flat)
+    return network
+
+
+def reference_row(blocks, batch, resolution):
+    """The same numbers the slow way, from a fresh network and cold caches."""
+    network = resnet(blocks, resolution)
+    estimate = CostModel().estimate(network, batch)
+    totals = estimate['totals']
+    if any(layer['error'] for layer in estimate['layers']):
+        return None
+    return {
+        'params': totals['params'],
+        'gradient_bytes': totals['gradient_bytes'],
+        'activation_bytes': totals['activation_bytes'],
+        'arena_bytes': MemoryPlan(network, batch, alignment=1).arena_bytes,
+        'forward_flops': totals['forward_flops'],
+        'backward_flops': totals['backward_flops'],
+    }
+
+
+def timed(workers, sweep, payload):
+    os.environ['SWEEP_WORKERS'] = str(workers)
+    start = time.perf_counter()
+    table = sweep.run(payload)
+    return table, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blocks', type=int, default=50)
+    parser.add_argument('--batches', type=int, default=40, help="batch sizes 1..512, evenly spaced")
+    parser.add_argument('--resolutions', type=int, default=25, help="resolutions 32..1024, evenly spaced")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--samples', type=int, default=10)
+    args = parser.parse_args()
+
+    network = resnet(args.blocks, 224)
+    batches = sorted({1 + i * 511 // max(1, args.batches - 1) for i in range(args.batches)})
+    resolutions = sorted({32 + i * 992 // max(1, args.resolutions - 1) for i in range(args.resolutions)})
+    resolutions[0] = 4  # too small for the pooling stages
+    sweep = Sweep(batches, resolutions)
+    payload = sweep.prepare(network)
+    print(f"{len(network.layers)} layers, {len(batches)} batch sizes x {len(resolutions)} resolutions")
+
+    inline, inline_time = timed(1, sweep, payload)
+    print(f"in process: {inline_time:.2f} s, {inline_time / inline['points'] * 1e6:.0f} us/point")
+    if args.workers > 1:
+        pooled, _ = timed(args.workers, sweep, payload)  # includes starting the workers
+        pooled, pooled_time = timed(args.workers, sweep, payload)
+        print(f"{pooled['workers']} workers: {pooled_time:.2f} s (warm pool)")
+        assert pooled['rows'] == inline['rows'], "pooled and in-process tables differ"
+
+    rows = [dict(zip(COLUMNS, row)) for row in inline['rows']]
+    assert all(row['error'] for row in rows if row['resolution'] == 4), "a too small input did not fail"
+    for row in random.Random(0).sample([r for r in rows if not r['error']], args.samples):
+        expected = reference_row(args.blocks, row['batch_size'], row['resolution'])
+        actual = {name: row[name] for name in expected}
+        assert actual == expected, f"batch {row['batch_size']} at {row['resolution']}: {actual} != {expected}"
+    print(f"tables agree; {args.samples} sampled points match fresh estimates")
+
+
+if __name__ == '__main__':
+    main()
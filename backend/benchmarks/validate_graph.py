@@ -0,0 +1,155 @@
+"""Timing of graph validation on large networks.
+
+Builds a ``--layers`` deep residual-style network (a dense chain with a skip
+connection every few layers), then reports:
+
+- the cost of checking a new edge for cycles, for forward edges (which
+  agree with the maintained order) and for edges pointing backwards,
+- the time of a full /validate pass, cold and with shapes already inferred.
+
+It also makes random connects and disconnects, cycles included, on a
+small network and checks after each one that the maintained back edges
+are exactly right: every other edge follows the order, and each back edge
+closes a cycle. It checks that incremental shapes match a fresh inference.
+Random batches of edits must be rejected at exactly the connect that single
+checked connections, applied one by one, would reject.
+
+    python backend/benchmarks/validate_graph.py --layers 5000
+"""
+import argparse
+import os
+import pickle
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import BatchError, BatchPlan  # noqa: E402
+from graph_validator import graph_validator_for  # noqa: E402
+from shape_inference import ShapeInference, shape_inference_for  # noqa: E402
+from layers.misc_layers.dense_layer import DenseLayer  # noqa: E402
+from layers.misc_layers.input_layer import TabularInputLayer  # noqa: E402
+from neural_network import NeuralNetwork  # noqa: E402
+
+
+def build(count, skip=4):
+    network = NeuralNetwork(0)
+    layers = [TabularInputLayer(input_shape=[64])]
+    network.add_layer(layers[0])
+    for index in range(1, count):
+        layer = DenseLayer(in_features=64, units=64)
+        network.add_layer(layer)
+        network.connect(layers[-1], layer)
+        if index > skip and index % skip == 0:
+            network.connect(layers[index - skip], layer)
+        layers.append(layer)
+    return network
+
+
+def check_random_edits(rng, edits, size=8):
+    network = build(size, skip=3)
+    validator = graph_validator_for(network)
+    shapes = shape_inference_for(network)
+    layers = list(network.layers.values())
+    for step in range(edits):
+        if network.connections and rng.random() < 0.4:
+            network.remove_connection(rng.choice(list(network.connections)))
+        else:
+            source, target = rng.sample(layers[1:], 2)
+            network.connect(source, target)
+
+        for connection in network.connections.values():
+            source, target = connection.source.id, connection.target.id
+            if connection.id not in validator.back_edges:
+                assert validator.position[source] < validator.position[target], f"step {step}: edge out of order"
+            else:
+                assert validator._forward(target, len(network.layers) * 2, stop=source) is None, \
+                    f"step {step}: back edge {connection.id} closes no cycle"
+        fresh = ShapeInference(network)
+        network.listeners.remove(fresh)
+        expected = {i: (r.output_shape, r.error) for i, r in fresh.update().items()}
+        actual = {i: (r.output_shape, r.error) for i, r in shapes.update().items()}
+        assert actual == expected, f"step {step}: incremental shapes differ from a fresh run"
+
+
+def check_random_batches(rng, batches, size=8, length=6):
+    network = build(size, skip=3)
+    layer_types = {'DenseLayer': DenseLayer}
+    for step in range(batches):
+        reference = pickle.loads(pickle.dumps(network))
+        operations, expected = [], None
+        for index in range(length):
+            ids = list(reference.layers)
+            kind = rng.random()
+            if kind < 0.15:
+                operations.append({"op": "add_layer", "type": "DenseLayer", "params": {"units": 64}})
+                reference.add_layer(DenseLayer(units=64))
+            elif kind < 0.25 and len(ids) > 2:
+                layer_id = rng.choice(ids[1:])
+                operations.append({"op": "remove_layer", "id": layer_id})
+                reference.remove_layer(layer_id)
+            elif kind < 0.45 and reference.connections:
+                connection_id = rng.choice(list(reference.connections))
+                operations.append({"op": "remove_connection", "id": connection_id})
+                reference.remove_connection(connection_id)
+            else:
+                source, target = rng.choice(ids), rng.choice(ids)
+                operations.append({"op": "connect", "source": source, "target": target})
+                if graph_validator_for(reference).check_connection(source, target):
+                    expected = index
+                    break
+                reference.connect(reference.layers[source], reference.layers[target])
+        try:
+            BatchPlan(network, operations, layer_types).apply()
+            rejected = None
+        except BatchError as e:
+            rejected = e.index
+        assert rejected == expected, f"batch {step}: rejected at {rejected}, expected {expected}"
+        if rejected is None:
+            edges = [(c.source.id, c.target.id) for c in network.connections.values()]
+            assert edges == [(c.source.id, c.target.id) for c in reference.connections.values()], \
+                f"batch {step}: edges differ from single edits"
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--layers', type=int, default=5000)
+    parser.add_argument('--edges', type=int, default=2000)
+    parser.add_argument('--edits', type=int, default=2000)
+    args = parser.parse_args()
+
+    network = build(args.layers)
+    ids = list(network.layers)
+    build_time, validator = timed(lambda: graph_validator_for(network))
+    print(f"{args.layers} layers, {len(network.connections)} connections")
+    print(f"order built in          {build_time * 1e3:8.2f} ms")
+
+    rng = random.Random(0)
+    pairs = [tuple(sorted(rng.sample(ids, 2))) for _ in range(args.edges)]
+    forward, _ = timed(lambda: [validator.check_connection(a, b) for a, b in pairs])
+    backward, rejected = timed(lambda: [validator.check_connection(b, a) for a, b in pairs])
+    print(f"forward edge check      {forward / args.edges * 1e6:8.2f} us")
+    print(f"backward edge check     {backward / args.edges * 1e6:8.2f} us "
+          f"({sum(1 for r in rejected if r)} rejected)")
+
+    cold, report = timed(validator.validate)
+    warm, _ = timed(validator.validate, repeat=5)
+    print(f"full validate (cold)    {cold * 1e3:8.2f} ms, {report['errors']} errors, {report['warnings']} warnings")
+    print(f"full validate (warm)    {warm * 1e3:8.2f} ms")
+
+    check_random_edits(rng, args.edits)
+    print(f"{args.edits} random edits: back edges and shapes match a fresh analysis")
+    check_random_batches(rng, args.edits)
+    print(f"{args.edits} random batches: rejected exactly where single connections are")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class CachedBody:
+    """Immutable response body with its ETag and pre-compressed variants."""
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.encodings = {
+            'identity': self.body,
+            'gzip': gzip.compress(self.body, compresslevel=9),
+        }
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(self.body)
+
+    def body_for(self, encoding):
+        return self.encodings.get(encoding, self.body)
+
+
+class CatalogPayload(CachedBody):
+    """Serialized catalog body together with the fingerprint it was built from."""
+
+    def __init__(self, data, fingerprint):
+        self.data = data
+        self.fingerprint = fingerprint
+        super().__init__(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+
+class LayerCatalog:
+    """Builds the layer-types payload once and rebuilds it only when a layer
+    class source file or a watched asset file changes on disk."""
+
+    def __init__(self, builder, layer_classes, asset_dirs, check_interval=1.0):
+        self.builder = builder
+        self.layer_classes = list(layer_classes)
+        self.asset_dirs = list(asset_dirs)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._payload = None
+        self._last_check = 0.0
+
+    def _source_files(self):
+        files = set()
+        for cls in self.layer_classes:
+            for c in cls.__mro__:
+                if c is object:
+                    break
+                try:
+                    files.add(inspect.getsourcefile(c))
+                except TypeError:
+                    continue
+        files.discard(None)
+        return sorted(files)
+
+    def _asset_files(self):
+        files = []
+        for directory in self.asset_dirs:
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.svg'):
+                    files.append(os.path.join(directory, name))
+        return files
+
+    def fingerprint(self):
+        entries = [cls.__qualname__ for cls in self.layer_classes]
+        for path in self._source_files() + self._asset_files():
+            try:
+                entries.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                entries.append((path, None))
+        return tuple(entries)
+
+    def rebuild(self):
+        with self._lock:
+            fingerprint = self.fingerprint()
+            self._payload = CatalogPayload(self.builder(), fingerprint)
+            self._last_check = time.monotonic()
+            return self._payload
+
+    def get(self):
+        payload = self._payload
+        if payload is None:
+            return self.rebuild()
+
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return payload
+
+        self._last_check = now
+        if self.fingerprint() != payload.fingerprint:
+            return self.rebuild()
+        return payload
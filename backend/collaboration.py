@@ -0,0 +1,295 @@
+import asyncio
+import itertools
+import json
+import threading
+from collections import OrderedDict, deque
+from urllib.parse import parse_qs
+
+from graph_optimizer import graph_to_dict
+from layers.layer import jsonable
+
+# Frames kept per network for clients that reconnect with ``since``.
+BACKLOG = 1024
+# Frames queued for one subscriber before it is dropped as lagging.
+QUEUE_LIMIT = 256
+# Close codes sent to clients.
+NOT_FOUND = 4404
+LAGGING = 4008
+
+_LAGGING = object()
+_REMOVED = object()
+
+
+def encode(message):
+    return json.dumps(message, separators=(',', ':'))
+
+
+class Subscriber:
+    """One WebSocket connection's outgoing queue, fed on the event loop."""
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.queue = asyncio.Queue()
+        self.lagging = False
+
+    def deliver(self, frame):
+        if self.lagging:
+            return
+        if self.queue.qsize() >= QUEUE_LIMIT:
+            # Dropped rather than buffered without bound; the client
+            # reconnects with its last seq and catches up from the backlog.
+            self.lagging = True
+            self.queue.put_nowait(_LAGGING)
+            return
+        self.queue.put_nowait(frame)
+
+
+class Channel:
+    """Operation deltas of one network, batched into numbered frames.
+
+    ``publish`` may be called from any thread. Ops wait up to ``interval``
+    so bursts share a frame, and ops with the same coalescing key (the
+    moves of one dragged layer, repeated param edits) keep only the last.
+    Each frame gets the next ``seq`` and is encoded once; every subscriber
+    is handed the same string.
+    """
+
+    def __init__(self, network_id, loop, interval):
+        self.network_id = network_id
+        self.loop = loop
+        self.interval = interval
+        self.seq = 0
+        self.backlog = deque(maxlen=BACKLOG)
+        self.subscribers = set()
+        self._pending = OrderedDict()
+        self._unique = itertools.count()
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    def publish(self, op, key=None):
+        with self._lock:
+            if key is None:
+                key = next(self._unique)
+            else:
+                self._pending.pop(key, None)
+            if op['op'] == 'remove_layer':
+                # Drags and edits of a removed layer are moot.
+                self._pending.pop(('move', op['id']), None)
+                self._pending.pop(('params', op['id']), None)
+            self._pending[key] = op
+            if self._scheduled:
+                return
+            self._scheduled = True
+            self.loop.call_soon_threadsafe(self.loop.call_later, self.interval, self.flush)
+
+    def flush(self):
+        """Send pending ops as one frame now; safe from any thread."""
+        with self._lock:
+            self._scheduled = False
+            if not self._pending:
+                return
+            self.seq += 1
+            frame = encode({"type": "ops", "seq": self.seq, "ops": list(self._pending.values())})
+            self._pending.clear()
+            self.backlog.append((self.seq, frame))
+            if self.subscribers:
+                # Scheduled under the lock so frames reach the loop in seq order.
+                self.loop.call_soon_threadsafe(self._fan_out, frame, tuple(self.subscribers))
+
+    @staticmethod
+    def _fan_out(frame, subscribers):
+        for subscriber in subscribers:
+            subscriber.deliver(frame)
+
+    def frames_since(self, seq):
+        """Backlog frames after ``seq``, or None when the backlog no longer reaches back."""
+        with self._lock:
+            if seq > self.seq:
+                return None
+            if seq < self.seq and (not self.backlog or self.backlog[0][0] > seq + 1):
+                return None
+            return [frame for number, frame in self.backlog if number > seq]
+
+
+class NetworkBroadcaster:
+    """NeuralNetwork listener turning graph events into channel ops.
+
+    Not persistent: it is attached again whenever the store hands the
+    network out, so REST edits reach live clients too.
+    """
+
+    def __init__(self, network, hub):
+        self.hub = hub
+        network.listeners.append(self)
+
+    def _publish(self, network, op, key=None):
+        channel = self.hub.channels.get(network.id)
+        if channel is not None:
+            channel.publish(op, key)
+
+    def layer_added(self, network, layer):
+        self._publish(network, {"op": "add_layer", "id": layer.id, "type": type(layer).__name__,
+                                "params": jsonable(layer.get_config())})
+
+    def layer_removed(self, network, layer):
+        self._publish(network, {"op": "remove_layer", "id": layer.id})
+
+    def layer_changed(self, network, layer):
+        self._publish(network, {"op": "params", "id": layer.id, "params": jsonable(layer.get_config())},
+                      ('params', layer.id))
+
+    def connection_added(self, network, connection):
+        self._publish(network, {"op": "connect", "id": connection.id,
+                                "source": connection.source.id, "target": connection.target.id})
+
+    def connection_removed(self, network, connection):
+        self._publish(network, {"op": "disconnect", "id": connection.id})
+
+
+class CollaborationHub:
+    """WebSocket fan-out of live edits, one channel per network.
+
+    Clients connect to ``/api/networks/<id>/live`` (optionally with
+    ``?since=<seq>``) and get either the missed frames or the whole graph
+    with the current seq, then every later frame. They send
+    ``{"type": "move", "id", "x", "y"}`` for layer positions, which are
+    only relayed, and ``{"type": "ops", "operations", "ref"}`` with batch
+    operations, which are applied like POST .../batch and acknowledged.
+    Channels live in this process, so with several workers every editor
+    of a network has to reach the same one. A channel is dropped, backlog
+    and all, when its last subscriber leaves or its network is removed.
+    """
+
+    def __init__(self, store, apply_batch, interval=0.03):
+        self.store = store
+        self.apply_batch = apply_batch
+        self.interval = interval
+        self.channels = {}
+        self._lock = threading.Lock()
+        self._client_ids = itertools.count(1)
+
+    def attach(self, network):
+        """Store hook: make sure ``network`` reports its edits to the hub."""
+        for listener in network.listeners:
+            if isinstance(listener, NetworkBroadcaster):
+                return
+        NetworkBroadcaster(network, self)
+
+    def network_removed(self, network_id):
+        """Store removal hook: drop the network's channel and close its sessions."""
+        with self._lock:
+            channel = self.channels.pop(network_id, None)
+        if channel is None:
+            return
+        with channel._lock:
+            subscribers = tuple(channel.subscribers)
+            channel.subscribers.clear()
+        for subscriber in subscribers:
+            channel.loop.call_soon_threadsafe(subscriber.queue.put_nowait, _REMOVED)
+
+    def _leave(self, channel, subscriber):
+        with self._lock:
+            with channel._lock:
+                channel.subscribers.discard(subscriber)
+                empty = not channel.subscribers
+            if empty and self.channels.get(channel.network_id) is channel:
+                del self.channels[channel.network_id]
+
+    def _join(self, network_id, subscriber, since, loop):
+        """Subscribe and build the catch-up frames; runs on a worker thread.
+
+        Holding the network while flushing and subscribing makes the graph
+        or backlog sent to the client line up exactly with the next seq.
+        Subscribing under the hub lock keeps a leaving last subscriber from
+        dropping the channel in between.
+        """
+        with self.store.read(network_id) as network:
+            if not network:
+                return None
+            self.attach(network)
+            with self._lock:
+                channel = self.channels.get(network.id)
+                if channel is None:
+                    channel = self.channels[network.id] = Channel(network.id, loop, self.interval)
+                channel.flush()
+                frames = channel.frames_since(since) if since is not None else None
+                with channel._lock:
+                    channel.subscribers.add(subscriber)
+                    seq = channel.seq
+            if frames is None:
+                frames = [encode({"type": "state", "seq": seq, "graph": graph_to_dict(network)})]
+            return channel, frames
+
+    def _apply(self, network_id, operations):
+        payload, status = self.apply_batch(network_id, {"operations": operations})
+        channel = self.channels.get(network_id)
+        if channel is not None:
+            # The resulting ops reach every client before this client's ack.
+            channel.flush()
+        return payload, status
+
+    async def serve(self, network_id, scope, receive, send, executor=None):
+        """Run one WebSocket session (an ASGI ``websocket`` scope)."""
+        loop = asyncio.get_running_loop()
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        try:
+            since = int(query['since'][0]) if 'since' in query else None
+        except ValueError:
+            since = None
+
+        subscriber = Subscriber(next(self._client_ids))
+        joined = await loop.run_in_executor(executor, self._join, network_id, subscriber, since, loop)
+        if joined is None:
+            await send({'type': 'websocket.close', 'code': NOT_FOUND})
+            return
+        channel, frames = joined
+        await send({'type': 'websocket.accept'})
+        await send({'type': 'websocket.send', 'text': encode({"type": "hello", "client": subscriber.client_id})})
+        for frame in frames:
+            await send({'type': 'websocket.send', 'text': frame})
+
+        writer = asyncio.ensure_future(self._write(subscriber, send))
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                reply = await self._handle(network_id, channel, subscriber, message, loop, executor)
+                if reply is not None:
+                    subscriber.queue.put_nowait(encode(reply))
+        finally:
+            self._leave(channel, subscriber)
+            writer.cancel()
+
+    async def _write(self, subscriber, send):
+        while True:
+            frame = await subscriber.queue.get()
+            if frame is _LAGGING or frame is _REMOVED:
+                await send({'type': 'websocket.close', 'code': LAGGING if frame is _LAGGING else NOT_FOUND})
+                return
+            await send({'type': 'websocket.send', 'text': frame})
+
+    async def _handle(self, network_id, channel, subscriber, message, loop, executor):
+        try:
+            data = json.loads(message.get('text') or message.get('bytes') or b'')
+        except ValueError:
+            return {"type": "error", "error": "Messages must be JSON"}
+        if not isinstance(data, dict):
+            return {"type": "error", "error": "Messages must be JSON objects"}
+
+        kind = data.get('type')
+        if kind == 'move':
+            layer_id, x, y = data.get('id'), data.get('x'), data.get('y')
+            if not isinstance(layer_id, int) or not all(isinstance(v, (int, float)) for v in (x, y)):
+                return {"type": "error", "error": "move needs an integer id and numeric x and y"}
+            channel.publish({"op": "move", "id": layer_id, "x": x, "y": y, "by": subscriber.client_id},
+                            ('move', layer_id))
+            return None
+        if kind == 'ops':
+            payload, status = await loop.run_in_executor(
+                executor, self._apply, network_id, data.get('operations', []))
+            return dict(payload, type="ack" if status == 200 else "error", ref=data.get('ref'), status=status)
+        return {"type": "error", "error": f"Unknown message type: {kind}"}
@@ -1,4 +1,7 @@
 class Connection:
+    __slots__ = ('id', 'source', 'target')
+
     def __init__(self, source, target):
+        self.id = None
         self.source = source
         self.target = target
\ No newline at end of file
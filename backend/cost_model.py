@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+
+from shape_inference import shape_inference_for
+
+DTYPE_BYTES = {
+    'float64': 8,
+    'float32': 4,
+    'float16': 2,
+    'bfloat16': 2,
+    'int8': 1,
+}
+
+
+class LayerCost:
+    """Costs of one layer for a given batch size and dtype."""
+
+    __slots__ = ('params', 'param_bytes', 'gradient_bytes', 'activation_bytes',
+                 'activation_bytes_per_sample', 'forward_flops', 'backward_flops')
+
+    def __init__(self, params, param_bytes, gradient_bytes, activation_bytes,
+                 activation_bytes_per_sample, forward_flops, backward_flops):
+        self.params = params
+        self.param_bytes = param_bytes
+        self.gradient_bytes = gradient_bytes
+        self.activation_bytes = activation_bytes
+        self.activation_bytes_per_sample = activation_bytes_per_sample
+        self.forward_flops = forward_flops
+        self.backward_flops = backward_flops
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def estimate_layer_cost(layer, input_shapes, output_shape, batch_size, dtype_bytes):
+    params = layer.count_params(input_shapes)
+    activation_per_sample = layer.count_activation_elements(input_shapes, output_shape) * dtype_bytes
+    return LayerCost(
+        params=params,
+        param_bytes=params * dtype_bytes,
+        gradient_bytes=layer.count_gradient_params(input_shapes, batch_size) * dtype_bytes,
+        activation_bytes=activation_per_sample * batch_size,
+        activation_bytes_per_sample=activation_per_sample,
+        forward_flops=layer.count_flops(input_shapes, output_shape) * batch_size,
+        backward_flops=layer.count_backward_flops(input_shapes, output_shape) * batch_size,
+    )
+
+
+class CostModel:
+    """Per-layer parameter, memory and FLOP estimates for a network.
+
+    Results are cached on the layer's config key together with its input
+    shapes, batch size and dtype, so identical layers (every instance of a
+    repeated block), and unchanged layers across requests, are only costed
+    once.
+    """
+
+    def __init__(self, max_entries=65536):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def layer_cost(self, layer, input_shapes, output_shape, batch_size, dtype_bytes, config_key=None):
+        key = (config_key or layer.config_key(), tuple(input_shapes), batch_size, dtype_bytes)
+        with self._lock:
+            cost = self._cache.get(key)
+            if cost is not None:
+                self._cache.move_to_end(key)
+                return cost
+        cost = estimate_layer_cost(layer, input_shapes, output_shape, batch_size, dtype_bytes)
+        with self._lock:
+            self._cache[key] = cost
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return cost
+
+    def estimate(self, network, batch_size=1, dtype='float32'):
+        if dtype not in DTYPE_BYTES:
+            raise ValueError(f"Unknown dtype: {dtype}")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        dtype_bytes = DTYPE_BYTES[dtype]
+        engine = shape_inference_for(network)
+        shapes = engine.update()
+
+        layers = []
+        totals = dict.fromkeys(LayerCost.__slots__, 0)
+        for layer_id in engine.order():
+            shape = shapes[layer_id]
+            layer = network.layers[layer_id]
+            entry = {
+                "id": layer_id,
+                "type": type(layer).__name__,
+                "output_shape": list(shape.output_shape) if shape.output_shape is not None else None,
+                "error": shape.error,
+            }
+            if shape.error is None:
+                cost = self.layer_cost(layer, shape.input_shapes, shape.output_shape, batch_size, dtype_bytes,
+                                       engine.config_key(layer_id))
+                entry.update(cost.to_dict())
+                for name in LayerCost.__slots__:
+                    totals[name] += getattr(cost, name)
+            layers.append(entry)
+
+        totals["training_memory_bytes"] = (
+            totals["param_bytes"] + totals["gradient_bytes"] + totals["activation_bytes"]
+        )
+        return {
+            "batch_size": batch_size,
+            "dtype": dtype,
+            "layers": layers,
+            "totals": totals,
+        }
+
+
+cost_model = CostModel()
@@ -0,0 +1,233 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+
+class EventLogFull(Exception):
+    """The write queue stayed full for the whole put timeout."""
+
+
+class EventLog:
+    """Append-only, size-rotated JSONL log of frontend tracker events.
+
+    ``append`` only enqueues onto a bounded queue. A background thread
+    drains it in groups, writes each group with a single flush/fsync and
+    rotates ``user_logs.jsonl`` to ``user_logs.jsonl.1`` ... once it passes
+    ``max_bytes``. When the queue is full, ``append`` waits up to
+    ``put_timeout`` and then raises EventLogFull. Memory use is therefore
+    bounded by ``queue_size`` whatever the traffic. A group that cannot be
+    written is logged and counted as failed, and the next group goes to a
+    reopened file; the writer keeps draining either way.
+    """
+
+    FILE_NAME = 'user_logs.jsonl'
+
+    def __init__(self, directory, max_bytes=16 * 1024 * 1024, backup_count=10,
+                 queue_size=10000, group_size=512, flush_interval=0.2,
+                 put_timeout=0.5, fsync=True):
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILE_NAME)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.group_size = group_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._file_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        self._counts_lock = threading.Lock()
+        self.appended = 0
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name='event-log-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def append(self, events):
+        """Queue one event or a list of events for writing."""
+        if not isinstance(events, list):
+            events = [events]
+        lines = ''.join(json.dumps(e, separators=(',', ':')) + '\n' for e in events)
+        if not lines:
+            return 0
+        # Counted before the put so the writer can never get ahead of it.
+        with self._counts_lock:
+            self.appended += len(events)
+        try:
+            self._queue.put(lines, timeout=self.put_timeout)
+        except queue.Full:
+            with self._counts_lock:
+                self.appended -= len(events)
+            raise EventLogFull()
+        return len(events)
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been written."""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stats(self):
+        """Events accepted, written to disk, lost to write errors, and still queued in memory."""
+        with self._counts_lock:
+            return {"appended": self.appended, "written": self.written, "failed": self.failed,
+                    "pending": self.appended - self.written - self.failed}
+
+    def close(self):
+        if self._thread is None or self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            group, waiters, stop = [], [], False
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    group.append(item)
+                if stop or len(group) >= self.group_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if group:
+                data = ''.join(group)
+                written = self._write_or_reopen(data)
+                with self._counts_lock:
+                    if written:
+                        self.written += data.count('\n')
+                    else:
+                        self.failed += data.count('\n')
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write_or_reopen(self, data):
+        """Write a group; on failure log it and drop the file so the next group reopens it.
+
+        A failed group is not retried: part of it may be on disk already,
+        and a retry would duplicate those events.
+        """
+        try:
+            self._write(data)
+            return True
+        except Exception:
+            logger.exception("Writing %d events to %s failed", data.count('\n'), self.path)
+            self._discard_file()
+            return False
+
+    def _discard_file(self):
+        with self._file_lock:
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+                self._file = None
+
+    def _write(self, data):
+        with self._file_lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            if self._file.tell() >= self.max_bytes:
+                try:
+                    self._rotate()
+                except OSError:
+                    # The group is on disk already; rotation is retried
+                    # after the next write.
+                    logger.exception("Rotating %s failed", self.path)
+                    self._file = None
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+    def _files(self):
+        """Log files from oldest to newest."""
+        files = [f'{self.path}.{index}' for index in range(self.backup_count, 0, -1)]
+        files.append(self.path)
+        return [path for path in files if os.path.exists(path)]
+
+    def read(self, since=None, until=None, user=None, network_id=None):
+        """Yield logged events one at a time, oldest first, matching the filters.
+
+        ``since`` and ``until`` bound the event ``timestamp`` (ms since the
+        epoch, as sent by the tracker), inclusive.
+        """
+        with self._file_lock:
+            files = self._files()
+        for path in files:
+            try:
+                log_file = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with log_file:
+                for line in log_file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(event, dict):
+                        if since is None and until is None and user is None and network_id is None:
+                            yield event
+                        continue
+                    timestamp = event.get('timestamp')
+                    if since is not None and (timestamp is None or timestamp < since):
+                        continue
+                    if until is not None and (timestamp is None or timestamp > until):
+                        continue
+                    if user is not None and event.get('user') != user:
+                        continue
+                    if network_id is not None and str(event.get('networkId')) != network_id:
+                        continue
+                    yield event
+
+
+def create_event_log():
+    directory = os.getenv('USER_LOG_DIR') or os.path.join(PROJECT_ROOT, 'logs')
+    return EventLog(directory).start()
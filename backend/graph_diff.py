@@ -0,0 +1,277 @@
+import copy
+from collections import Counter, defaultdict, deque
+
+from shape_inference import topological_order
+from structural_hash import upstream_signatures
+from layers.layer import freeze, jsonable
+from graph_optimizer import copy_network, graph_to_dict
+from graph_validator import graph_validator_for
+
+MATCH_MODES = ('id', 'structure')
+
+
+class LayerMatcher:
+    """Pairs the layers of two networks, in linear time up to hashing.
+
+    Passes, each over the layers still unpaired:
+
+    1. same id and type (``match='id'`` only; ids are stable across copies,
+       snapshots and history versions of a network);
+    2. same upstream signature, pairing equal buckets in topological order;
+    3. propagation from paired layers to their unpaired neighbours of the
+       same type, in input/output order, which catches edited layers;
+    4. same type and params anywhere in the graph (moved layers).
+    """
+
+    def __init__(self, base, other, match='id'):
+        if match not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {match}")
+        self.base = base
+        self.other = other
+        self.match = match
+        self.pairs = {}
+        self.base_keys = {layer_id: layer.config_key() for layer_id, layer in base.layers.items()}
+        self.other_keys = {layer_id: layer.config_key() for layer_id, layer in other.layers.items()}
+        self._paired = set()
+        self._queue = deque()
+
+    def _pair(self, base_id, other_id):
+        self.pairs[base_id] = other_id
+        self._paired.add(other_id)
+        self._queue.append((base_id, other_id))
+
+    def _pair_buckets(self, base_ids, other_ids, base_keys, other_keys):
+        buckets = defaultdict(deque)
+        for other_id in other_ids:
+            if other_id not in self._paired:
+                buckets[other_keys[other_id]].append(other_id)
+        for base_id in base_ids:
+            if base_id in self.pairs:
+                continue
+            bucket = buckets.get(base_keys[base_id])
+            if bucket:
+                self._pair(base_id, bucket.popleft())
+
+    def _propagate(self):
+        base, other = self.base, self.other
+        while self._queue:
+            base_id, other_id = self._queue.popleft()
+            for edges, end in (('incoming', 'source'), ('outgoing', 'target')):
+                candidates = defaultdict(deque)
+                for connection in getattr(other, edges)[other_id].values():
+                    neighbour = getattr(connection, end)
+                    if neighbour.id not in self._paired:
+                        candidates[type(neighbour)].append(neighbour.id)
+                if not candidates:
+                    continue
+                for connection in getattr(base, edges)[base_id].values():
+                    neighbour = getattr(connection, end)
+                    if neighbour.id in self.pairs:
+                        continue
+                    bucket = candidates.get(type(neighbour))
+                    if bucket:
+                        self._pair(neighbour.id, bucket.popleft())
+
+    def run(self):
+        base, other = self.base, self.other
+        if self.match == 'id':
+            for layer_id, layer in base.layers.items():
+                match = other.layers.get(layer_id)
+                if match is not None and type(match) is type(layer):
+                    self._pair(layer_id, layer_id)
+
+        base_order, _ = topological_order(base)
+        other_order, _ = topological_order(other)
+        self._pair_buckets(base_order, other_order,
+                           upstream_signatures(base, base_order, self.base_keys),
+                           upstream_signatures(other, other_order, self.other_keys))
+        self._propagate()
+        self._pair_buckets(base_order, other_order, self.base_keys, self.other_keys)
+        self._propagate()
+        return self.pairs
+
+
+def param_changes(before, after):
+    """``{"param", "before", "after"}`` for every param that differs."""
+    before, after = before.get_config(), after.get_config()
+    return [
+        {"param": name, "before": jsonable(before.get(name)), "after": jsonable(after.get(name))}
+        for name in list(before) + [name for name in after if name not in before]
+        if freeze(before.get(name)) != freeze(after.get(name))
+    ]
+
+
+class GraphDiff:
+    """Differences from ``base`` to ``other``.
+
+    Layers are reported by id on their own side; edges are compared as
+    (source, target) pairs after translating base ids through the matching,
+    with multiplicity.
+    """
+
+    def __init__(self, base, other, match='id'):
+        self.base = base
+        self.other = other
+        matcher = LayerMatcher(base, other, match)
+        self.pairs = matcher.run()
+        matched = set(self.pairs.values())
+
+        self.removed_layers = [i for i in base.layers if i not in self.pairs]
+        self.added_layers = [i for i in other.layers if i not in matched]
+        self.modified_layers = {}
+        for base_id, other_id in self.pairs.items():
+            if matcher.base_keys[base_id] != matcher.other_keys[other_id]:
+                self.modified_layers[base_id] = param_changes(base.layers[base_id], other.layers[other_id])
+
+        available = Counter((c.source.id, c.target.id) for c in other.connections.values())
+        self.removed_connections = []
+        for connection in base.connections.values():
+            edge = (self.pairs.get(connection.source.id), self.pairs.get(connection.target.id))
+            if available[edge] > 0:
+                available[edge] -= 1
+            else:
+                self.removed_connections.append(connection)
+        self.added_connections = []
+        for connection in other.connections.values():
+            edge = (connection.source.id, connection.target.id)
+            if available[edge] > 0:
+                available[edge] -= 1
+                self.added_connections.append(connection)
+
+    def is_empty(self):
+        return not (self.removed_layers or self.added_layers or self.modified_layers
+                    or self.removed_connections or self.added_connections)
+
+    def to_dict(self):
+        base, other = self.base, self.other
+        return {
+            "identical": self.is_empty(),
+            "matched": len(self.pairs),
+            "layers": {
+                "added": [{"id": i, "type": type(other.layers[i]).__name__} for i in self.added_layers],
+                "removed": [{"id": i, "type": type(base.layers[i]).__name__} for i in self.removed_layers],
+                "modified": [
+                    {"base": base_id, "other": self.pairs[base_id],
+                     "type": type(base.layers[base_id]).__name__, "changes": changes}
+                    for base_id, changes in self.modified_layers.items()
+                ],
+                "renumbered": [
+                    {"base": base_id, "other": other_id}
+                    for base_id, other_id in self.pairs.items() if base_id != other_id
+                ],
+            },
+            "connections": {
+                "added": [{"id": c.id, "source": c.source.id, "target": c.target.id}
+                          for c in self.added_connections],
+                "removed": [{"id": c.id, "source": c.source.id, "target": c.target.id}
+                            for c in self.removed_connections],
+            },
+        }
+
+
+class MergeResult:
+    def __init__(self, network):
+        self.network = network
+        self.conflicts = []
+        self.applied = Counter()
+
+    def conflict(self, kind, message, **details):
+        self.conflicts.append(dict(details, kind=kind, message=message))
+
+    def to_dict(self):
+        return {
+            "clean": not self.conflicts,
+            "conflicts": self.conflicts,
+            "applied": dict(self.applied),
+            "graph": graph_to_dict(self.network),
+        }
+
+
+def merge(base, ours, theirs, match='id', in_place=False):
+    """Three-way merge: apply the changes from ``base`` to ``theirs`` onto ``ours``.
+
+    Works on a copy of ``ours`` unless ``in_place``; either way the result
+    keeps ``ours``' ids. Changes that contradict ours (the same param set
+    to different values, an edit to a layer the other side removed, an
+    edge to a removed layer or one that would close a cycle) are not
+    applied and are reported as conflicts, so ours wins them.
+    """
+    mine = GraphDiff(base, ours, match)
+    yours = GraphDiff(base, theirs, match)
+    network = ours if in_place else copy_network(ours)
+    result = MergeResult(network)
+    to_ours = mine.pairs
+    from_theirs = {theirs_id: base_id for base_id, theirs_id in yours.pairs.items()}
+
+    for base_id in yours.removed_layers:
+        if base_id not in to_ours:
+            continue
+        if base_id in mine.modified_layers:
+            result.conflict('delete_modify', f"Theirs removed layer {base_id}, which ours edited",
+                            base=base_id, ours=to_ours[base_id])
+            continue
+        network.remove_layer(to_ours[base_id])
+        result.applied['removed_layers'] += 1
+
+    for base_id, changes in yours.modified_layers.items():
+        if base_id not in to_ours:
+            result.conflict('modify_delete', f"Theirs edited layer {base_id}, which ours removed",
+                            base=base_id, theirs=yours.pairs[base_id])
+            continue
+        layer_id = to_ours[base_id]
+        ours_values = {change["param"]: change["after"] for change in mine.modified_layers.get(base_id, ())}
+        source = theirs.layers[yours.pairs[base_id]]
+        edited = copy.copy(network.layers[layer_id])
+        applied = False
+        for change in changes:
+            name = change["param"]
+            if name in ours_values and ours_values[name] != change["after"]:
+                result.conflict('param', f"Both sides changed {name} of layer {base_id}",
+                                base=base_id, ours=layer_id, param=name,
+                                ours_value=ours_values[name], theirs_value=change["after"])
+                continue
+            setattr(edited, name, getattr(source, name))
+            applied = True
+        if applied and edited.config_key() != network.layers[layer_id].config_key():
+            network.replace_layer(layer_id, edited)
+            result.applied['modified_layers'] += 1
+
+    added = {}
+    for theirs_id in yours.added_layers:
+        added[theirs_id] = network.add_layer(copy.copy(theirs.layers[theirs_id]))
+        result.applied['added_layers'] += 1
+
+    for connection in yours.removed_connections:
+        source_id, target_id = to_ours.get(connection.source.id), to_ours.get(connection.target.id)
+        if source_id is None or target_id is None or source_id not in network.layers:
+            continue
+        for candidate in network.outgoing[source_id].values():
+            if candidate.target.id == target_id:
+                network.remove_connection(candidate.id)
+                result.applied['removed_connections'] += 1
+                break
+
+    def to_result(theirs_id):
+        if theirs_id in added:
+            return added[theirs_id]
+        layer_id = to_ours.get(from_theirs.get(theirs_id))
+        return layer_id if layer_id in network.layers else None
+
+    validator = graph_validator_for(network)
+    for connection in yours.added_connections:
+        source_id, target_id = to_result(connection.source.id), to_result(connection.target.id)
+        if source_id is None or target_id is None:
+            result.conflict('edge_to_deleted',
+                            f"Theirs connected {connection.source.id} to {connection.target.id}, "
+                            f"but ours removed one of them",
+                            theirs_source=connection.source.id, theirs_target=connection.target.id)
+            continue
+        if any(c.target.id == target_id for c in network.outgoing[source_id].values()):
+            continue
+        problem = validator.check_connection(source_id, target_id)
+        if problem:
+            result.conflict('invalid_edge', problem, source=source_id, target=target_id)
+            continue
+        network.connect(network.layers[source_id], network.layers[target_id])
+        result.applied['added_connections'] += 1
+    return result
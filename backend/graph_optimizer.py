@@ -0,0 +1,317 @@
+import copy
+import pickle
+from collections import Counter, deque
+
+from neural_network import NeuralNetwork
+from shape_inference import shape_inference_for, topological_order
+from layers.layer import jsonable
+from layers.misc_layers.input_layer import BaseInputLayer
+from layers.misc_layers.dropout_layer import DropoutLayer
+from layers.misc_layers.flattening_layer import FlatteningLayer
+from layers.misc_layers.dense_layer import DenseLayer
+from layers.misc_layers.normalization_layer import NormalizationLayer
+from layers.activation_function_layers.convolutional_layer import ConvolutionalLayer
+from activation_functions.activation_function import ReLUFunction, LeakyReLUFunction, TanhFunction
+
+
+def copy_network(network):
+    """Deep copy of a network's layers and connections that keeps every id.
+
+    Only the graph is copied; the history and other listeners stay behind.
+    """
+    edges = [(c.id, c.source.id, c.target.id) for c in network.connections.values()]
+    layers, edges = pickle.loads(pickle.dumps((list(network.layers.values()), edges)))
+    result = NeuralNetwork(network.id)
+    result.restore(layers, edges, network.next_layer_id, network.next_connection_id)
+    return result
+
+
+def graph_to_dict(network):
+    """The network in the ``graph`` format accepted by the batch endpoint."""
+    return {
+        "layers": [
+            {"ref": layer_id, "type": type(layer).__name__, "params": jsonable(layer.get_config())}
+            for layer_id, layer in network.layers.items()
+        ],
+        "connections": [
+            {"source": c.source.id, "target": c.target.id}
+            for c in network.connections.values()
+        ],
+    }
+
+
+def single_input(network, layer_id):
+    incoming = network.incoming[layer_id]
+    if len(incoming) != 1:
+        return None
+    return next(iter(incoming.values())).source
+
+
+def single_consumer(network, layer_id):
+    outgoing = network.outgoing[layer_id]
+    if len(outgoing) != 1:
+        return None
+    return next(iter(outgoing.values())).target
+
+
+def bypass(network, layer_id):
+    """Remove a single-input layer, feeding its input straight to its consumers."""
+    source = single_input(network, layer_id)
+    for connection_id in list(network.outgoing[layer_id]):
+        network.reroute(connection_id, source)
+    network.remove_layer(layer_id)
+
+
+class OptimizationPass:
+    """A rewrite over a network copy.
+
+    ``run`` edits ``result.network`` in place and returns a list of change
+    records (plain dicts) describing what it did.
+    """
+
+    name = None
+
+    def run(self, result):
+        raise NotImplementedError
+
+
+class RemoveIdentityLayers(OptimizationPass):
+    """Drop layers that pass their input through unchanged.
+
+    Covers dropout with probability 0 and flattens whose input is already
+    flat, such as the second of two back-to-back FlatteningLayers.
+    """
+
+    name = 'remove_identity'
+
+    def run(self, result):
+        network = result.network
+        shapes = shape_inference_for(network).update()
+        changes = []
+        for layer_id in list(network.layers):
+            layer = network.layers[layer_id]
+            source = single_input(network, layer_id)
+            if source is None:
+                continue
+            if isinstance(layer, DropoutLayer):
+                identity = layer.probability == 0
+            elif isinstance(layer, FlatteningLayer):
+                shape = shapes.get(layer_id)
+                identity = (shape is not None and shape.error is None
+                            and shape.output_shape == shape.input_shapes[0])
+            else:
+                identity = False
+            if identity:
+                bypass(network, layer_id)
+                changes.append({"pass": self.name, "removed": layer_id, "type": type(layer).__name__})
+        return changes
+
+
+class MergeDropouts(OptimizationPass):
+    """Collapse chains of dropout layers into one.
+
+    Two dropouts keep an element with probability (1 - p1)(1 - p2), so a
+    single dropout with p = 1 - (1 - p1)(1 - p2) behaves the same.
+    """
+
+    name = 'merge_dropouts'
+
+    def run(self, result):
+        network = result.network
+        changes = []
+        for layer_id in list(network.layers):
+            layer = network.layers.get(layer_id)
+            if not isinstance(layer, DropoutLayer):
+                continue
+            while True:
+                successor = single_consumer(network, layer_id)
+                if not isinstance(successor, DropoutLayer) or len(network.incoming[successor.id]) != 1:
+                    break
+                merged = copy.copy(layer)
+                merged.probability = 1 - (1 - layer.probability) * (1 - successor.probability)
+                network.replace_layer(layer_id, merged)
+                bypass(network, successor.id)
+                changes.append({"pass": self.name, "kept": layer_id, "removed": successor.id,
+                                "probability": merged.probability})
+                layer = merged
+        return changes
+
+
+class MarkBatchNormFolds(OptimizationPass):
+    """Mark batch norms that can be folded into the convolution feeding them.
+
+    At inference a batch norm is a per-channel affine transform that can be
+    baked into the convolution's weights and bias, but only once trained
+    statistics exist. A design has none, so the graph is left as it is and
+    ``result.folds`` records the pairs for an inference export to fold.
+    """
+
+    name = 'fold_batchnorm'
+
+    def run(self, result):
+        network = result.network
+        changes = []
+        for layer_id, norm in network.layers.items():
+            if not isinstance(norm, NormalizationLayer):
+                continue
+            conv = single_input(network, layer_id)
+            if (not isinstance(conv, ConvolutionalLayer)
+                    or single_consumer(network, conv.id) is not norm
+                    or norm.normalization_type.name != f"BATCH_NORMALIZATION{conv.ndim}D"):
+                continue
+            result.folds[layer_id] = conv.id
+            changes.append({"pass": self.name, "layer": layer_id, "into": conv.id})
+        return changes
+
+
+class MarkActivationFusions(OptimizationPass):
+    """Mark linear layers whose only consumer is an element-wise activation.
+
+    The graph is left as it is; the markers in ``result.fusions`` tell a
+    code generator or runtime it can apply the activation in place or as
+    part of the producing kernel.
+    """
+
+    name = 'fuse_activations'
+    PRODUCERS = (ConvolutionalLayer, DenseLayer, NormalizationLayer)
+    ACTIVATIONS = (ReLUFunction, LeakyReLUFunction, TanhFunction)
+
+    def run(self, result):
+        network = result.network
+        changes = []
+        for layer_id, layer in network.layers.items():
+            if not isinstance(layer, self.PRODUCERS):
+                continue
+            activation = single_consumer(network, layer_id)
+            if isinstance(activation, self.ACTIVATIONS) and len(network.incoming[activation.id]) == 1:
+                result.fusions[layer_id] = activation.id
+                changes.append({"pass": self.name, "layer": layer_id, "activation": activation.id,
+                                "type": type(activation).__name__})
+        return changes
+
+
+class PruneDeadLayers(OptimizationPass):
+    """Remove layers that are not on a path from an input to an output.
+
+    Outputs are ``result.outputs`` when given, otherwise every sink reachable
+    from an input layer. Networks without input layers or outputs are left
+    alone.
+    """
+
+    name = 'prune_dead'
+
+    def run(self, result):
+        network = result.network
+        inputs = [i for i, layer in network.layers.items() if isinstance(layer, BaseInputLayer)]
+        if not inputs:
+            return []
+        forward = self._reachable(inputs, lambda i: (c.target.id for c in network.outgoing[i].values()))
+        if result.outputs is not None:
+            outputs = [i for i in result.outputs if i in network.layers]
+        else:
+            outputs = [i for i in forward if not network.outgoing[i]]
+        if not outputs:
+            return []
+        backward = self._reachable(outputs, lambda i: (c.source.id for c in network.incoming[i].values()))
+        changes = []
+        for layer_id in list(network.layers):
+            if layer_id not in forward or layer_id not in backward:
+                layer = network.remove_layer(layer_id)
+                changes.append({"pass": self.name, "removed": layer_id, "type": type(layer).__name__})
+        return changes
+
+    @staticmethod
+    def _reachable(start, neighbours):
+        seen = set(start)
+        queue = deque(start)
+        while queue:
+            for next_id in neighbours(queue.popleft()):
+                if next_id not in seen:
+                    seen.add(next_id)
+                    queue.append(next_id)
+        return seen
+
+
+PASSES = {
+    cls.name: cls
+    for cls in (RemoveIdentityLayers, MergeDropouts, MarkBatchNormFolds, MarkActivationFusions, PruneDeadLayers)
+}
+
+# Marker passes run last so they only name layers that are kept.
+DEFAULT_PASSES = ['remove_identity', 'merge_dropouts', 'prune_dead', 'fold_batchnorm', 'fuse_activations']
+
+
+class OptimizationResult:
+    """Optimized copy of a network together with what changed."""
+
+    def __init__(self, original, network, outputs=None):
+        self.original = original
+        self.network = network
+        self.outputs = outputs
+        self.changes = []
+        self.fusions = {}
+        self.folds = {}
+
+    def diff(self):
+        """Layer and edge differences between the original and the copy.
+
+        Ids are preserved by the copy, so layers are compared by id and edges
+        by their (source, target) pair.
+        """
+        before, after = self.original, self.network
+        removed = [i for i in before.layers if i not in after.layers]
+        changed = [
+            {"id": i, "before": jsonable(before.layers[i].get_config()),
+             "after": jsonable(after.layers[i].get_config())}
+            for i in after.layers
+            if before.layers[i].config_key() != after.layers[i].config_key()
+        ]
+        old_edges = Counter((c.source.id, c.target.id) for c in before.connections.values())
+        new_edges = Counter((c.source.id, c.target.id) for c in after.connections.values())
+        return {
+            "removed_layers": removed,
+            "changed_layers": changed,
+            "removed_connections": [list(e) for e in (old_edges - new_edges).elements()],
+            "added_connections": [list(e) for e in (new_edges - old_edges).elements()],
+        }
+
+    def to_dict(self):
+        return {
+            "graph": graph_to_dict(self.network),
+            "diff": self.diff(),
+            "changes": self.changes,
+            "fusions": [{"layer": layer, "activation": activation}
+                        for layer, activation in self.fusions.items()],
+            "folds": [{"layer": layer, "into": conv} for layer, conv in self.folds.items()],
+        }
+
+
+class GraphOptimizer:
+    """Runs a sequence of named passes over a copy of a network.
+
+    Cyclic networks are rejected with ValueError. Markers naming layers
+    that a later pass removed are dropped.
+    """
+
+    def __init__(self, passes=None):
+        names = DEFAULT_PASSES if passes is None else passes
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ValueError("passes must be a list of pass names")
+        unknown = [name for name in names if name not in PASSES]
+        if unknown:
+            raise ValueError(f"Unknown optimization passes: {', '.join(map(str, unknown))}")
+        self.passes = [PASSES[name]() for name in names]
+
+    def optimize(self, network, outputs=None):
+        _, cyclic = topological_order(network)
+        if cyclic:
+            raise ValueError(f"Network has a cycle through layers {sorted(cyclic)}")
+        result = OptimizationResult(network, copy_network(network), outputs)
+        for optimization_pass in self.passes:
+            result.changes.extend(optimization_pass.run(result))
+        layers = result.network.layers
+        for markers in (result.fusions, result.folds):
+            for layer_id, other in list(markers.items()):
+                if layer_id not in layers or other not in layers:
+                    del markers[layer_id]
+        return result
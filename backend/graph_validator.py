@@ -0,0 +1,286 @@
+from collections import defaultdict
+
+from shape_inference import topological_order, shape_inference_for
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# Shape errors that are consequences of a problem reported elsewhere.
+ECHOED_ERRORS = ("Upstream layer", "Layer is part of, or fed by, a cycle")
+
+
+class Diagnostic:
+    __slots__ = ('severity', 'code', 'message', 'layer', 'connection')
+
+    def __init__(self, severity, code, message, layer=None, connection=None):
+        self.severity = severity
+        self.code = code
+        self.message = message
+        self.layer = layer
+        self.connection = connection
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class TopologicalOrder:
+    """A topological order of layers kept up to date as edges are added.
+
+    Uses the Pearce-Kelly algorithm: an edge that already agrees with the
+    order costs O(1), and otherwise only the layers between its endpoints
+    in the order are visited and shuffled. That makes the cycle check for a
+    new edge cheap without re-sorting the whole graph. Subclasses provide
+    ``position`` and the ordered edges through ``_successors`` and
+    ``_predecessors``.
+    """
+
+    position = None
+
+    def _successors(self, layer_id):
+        raise NotImplementedError
+
+    def _predecessors(self, layer_id):
+        raise NotImplementedError
+
+    def _forward(self, start, upper, stop=None):
+        """Layers reachable from ``start`` whose position is at most ``upper``.
+
+        Returns None as soon as ``stop`` is reached (the edge would close a cycle).
+        """
+        position = self.position
+        seen = {start}
+        stack = [start]
+        while stack:
+            for next_id in self._successors(stack.pop()):
+                if next_id == stop:
+                    return None
+                if next_id not in seen and position[next_id] <= upper:
+                    seen.add(next_id)
+                    stack.append(next_id)
+        return seen
+
+    def _backward(self, start, lower):
+        position = self.position
+        seen = {start}
+        stack = [start]
+        while stack:
+            for next_id in self._predecessors(stack.pop()):
+                if next_id not in seen and position[next_id] >= lower:
+                    seen.add(next_id)
+                    stack.append(next_id)
+        return seen
+
+    def would_create_cycle(self, source_id, target_id):
+        if source_id == target_id:
+            return True
+        upper = self.position[source_id]
+        if self.position[target_id] > upper:
+            return False
+        return self._forward(target_id, upper, stop=source_id) is None
+
+    def _insert(self, source_id, target_id):
+        """Account for a new edge; False if it closes a cycle."""
+        position = self.position
+        lower, upper = position[target_id], position[source_id]
+        if source_id == target_id:
+            return False
+        if lower > upper:
+            return True
+        forward = self._forward(target_id, upper, stop=source_id)
+        if forward is None:
+            return False
+        backward = self._backward(source_id, lower)
+        # Everything that reaches the source moves ahead of everything the
+        # target reaches, reusing the same set of positions.
+        moved = sorted(backward, key=position.get) + sorted(forward, key=position.get)
+        slots = sorted(position[layer_id] for layer_id in moved)
+        for layer_id, slot in zip(moved, slots):
+            position[layer_id] = slot
+        return True
+
+
+class GraphValidator(TopologicalOrder):
+    """Structural and compatibility checks for a network.
+
+    Keeps a topological order of the layers up to date as the network
+    changes (see ``TopologicalOrder``). Edges that cannot be ordered
+    because they close a cycle (in networks restored from snapshots or
+    saved before connections were checked) are kept in ``back_edges`` and
+    reported.
+    """
+
+    def __init__(self, network):
+        self.network = network
+        self.position = {}
+        self.back_edges = set()
+        self._next_position = 0
+        self._build()
+        network.listeners.append(self)
+
+    def _build(self):
+        network = self.network
+        order, _ = topological_order(network)
+        self.position = {layer_id: index for index, layer_id in enumerate(order)}
+        self._next_position = len(order)
+        self.back_edges = {
+            connection.id for connection in network.connections.values()
+            if self.position[connection.source.id] >= self.position[connection.target.id]
+        }
+
+    # NeuralNetwork listener interface
+
+    def layer_added(self, network, layer):
+        self.position[layer.id] = self._next_position
+        self._next_position += 1
+
+    def layer_removed(self, network, layer):
+        self.position.pop(layer.id, None)
+
+    def layer_changed(self, network, layer):
+        pass
+
+    def connection_added(self, network, connection):
+        if not self._insert(connection.source.id, connection.target.id):
+            self.back_edges.add(connection.id)
+
+    def connection_removed(self, network, connection):
+        self.back_edges.discard(connection.id)
+        # Removing any edge of a cycle may let its back edge be ordered now.
+        for connection_id in list(self.back_edges):
+            other = network.connections.get(connection_id)
+            if other is None or self._insert(other.source.id, other.target.id):
+                self.back_edges.discard(connection_id)
+
+    def _successors(self, layer_id):
+        return (c.target.id for c in self.network.outgoing[layer_id].values() if c.id not in self.back_edges)
+
+    def _predecessors(self, layer_id):
+        return (c.source.id for c in self.network.incoming[layer_id].values() if c.id not in self.back_edges)
+
+    # Checks
+
+    def check_connection(self, source_id, target_id):
+        """Why a new edge from ``source_id`` to ``target_id`` is rejected, or None."""
+        network = self.network
+        if source_id == target_id:
+            return "A layer cannot be connected to itself"
+        if any(c.target.id == target_id for c in network.outgoing[source_id].values()):
+            return f"Layers {source_id} and {target_id} are already connected"
+        if self.would_create_cycle(source_id, target_id):
+            return f"Connecting {source_id} to {target_id} would create a cycle"
+        return None
+
+    def validate(self):
+        network = self.network
+        shapes = shape_inference_for(network).update()
+        diagnostics = []
+        flagged = set()
+
+        seen_edges = set()
+        for connection in network.connections.values():
+            source, target = connection.source, connection.target
+            edge = (source.id, target.id)
+            if source.id == target.id:
+                diagnostics.append(Diagnostic(ERROR, 'self_loop', f"Layer {source.id} is connected to itself",
+                                              target.id, connection.id))
+            elif connection.id in self.back_edges:
+                diagnostics.append(Diagnostic(ERROR, 'cycle', f"Connection {source.id} -> {target.id} closes a cycle",
+                                              target.id, connection.id))
+            if edge in seen_edges:
+                diagnostics.append(Diagnostic(WARNING, 'duplicate_edge',
+                                              f"Layers {source.id} and {target.id} are connected more than once",
+                                              target.id, connection.id))
+            seen_edges.add(edge)
+
+            upstream = shapes.get(source.id)
+            input_shape = upstream.output_shape if upstream is not None else None
+            for severity, message in target.check_input(source, input_shape):
+                diagnostics.append(Diagnostic(severity, 'incompatible', message, target.id, connection.id))
+                if severity == ERROR:
+                    flagged.add(target.id)
+
+        for layer_id, result in shapes.items():
+            # Skip errors that only echo an upstream failure or an edge
+            # already reported above.
+            if result.error and layer_id not in flagged and not result.error.startswith(ECHOED_ERRORS):
+                diagnostics.append(Diagnostic(ERROR, 'shape', result.error, layer_id))
+
+        errors = sum(1 for d in diagnostics if d.severity == ERROR)
+        return {
+            "valid": errors == 0,
+            "errors": errors,
+            "warnings": len(diagnostics) - errors,
+            "diagnostics": [d.to_dict() for d in diagnostics],
+        }
+
+
+class PlannedEdges(TopologicalOrder):
+    """Edge checks against the network a batch being planned will leave.
+
+    Starts from a copy of the validator's order and follows the batch's
+    layer and edge additions and removals without touching the network, so
+    each new edge is checked against the earlier operations of the batch
+    as well as the network.
+    """
+
+    def __init__(self, validator):
+        self.network = validator.network
+        self.position = dict(validator.position)
+        self._next_position = validator._next_position
+        # Network edges that are not followed: back edges and removed ones.
+        self.skipped = set(validator.back_edges)
+        # Planned edges: connection id -> target, and -> source.
+        self.outgoing = defaultdict(dict)
+        self.incoming = defaultdict(dict)
+        self.planned = {}
+
+    def _successors(self, layer_id):
+        for connection in self.network.outgoing.get(layer_id, {}).values():
+            if connection.id not in self.skipped:
+                yield connection.target.id
+        yield from self.outgoing[layer_id].values()
+
+    def _predecessors(self, layer_id):
+        for connection in self.network.incoming.get(layer_id, {}).values():
+            if connection.id not in self.skipped:
+                yield connection.source.id
+        yield from self.incoming[layer_id].values()
+
+    def add_layer(self, layer_id):
+        self.position[layer_id] = self._next_position
+        self._next_position += 1
+
+    def remove_layer(self, layer_id):
+        self.position.pop(layer_id, None)
+        for edges in (self.network.outgoing.get(layer_id, {}), self.network.incoming.get(layer_id, {})):
+            self.skipped.update(edges)
+        for connection_id in list(self.outgoing[layer_id]) + list(self.incoming[layer_id]):
+            self.remove_connection(connection_id)
+
+    def remove_connection(self, connection_id):
+        self.skipped.add(connection_id)
+        edge = self.planned.pop(connection_id, None)
+        if edge is not None:
+            source_id, target_id = edge
+            del self.outgoing[source_id][connection_id]
+            del self.incoming[target_id][connection_id]
+
+    def connect(self, connection_id, source_id, target_id):
+        """Add a planned edge, or return why it is rejected."""
+        if source_id == target_id:
+            return "A layer cannot be connected to itself"
+        if target_id in self.outgoing[source_id].values() or any(
+                c.target.id == target_id and c.id not in self.skipped
+                for c in self.network.outgoing.get(source_id, {}).values()):
+            return f"Layers {source_id} and {target_id} are already connected"
+        if not self._insert(source_id, target_id):
+            return f"Connecting {source_id} to {target_id} would create a cycle"
+        self.planned[connection_id] = (source_id, target_id)
+        self.outgoing[source_id][connection_id] = target_id
+        self.incoming[target_id][connection_id] = source_id
+        return None
+
+
+def graph_validator_for(network) -> GraphValidator:
+    """The validator attached to ``network``, created on first use."""
+    return network.listener(GraphValidator)
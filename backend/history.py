@@ -0,0 +1,334 @@
+import time
+from bisect import bisect_left
+from operator import attrgetter
+
+from persistent import PersistentMap, MISSING
+from layers.layer import jsonable
+
+
+class Version:
+    """One immutable state of a network.
+
+    ``layers`` maps layer id to layer object and ``edges`` maps connection
+    id to ``(source_id, target_id)``. Both are persistent maps shared with
+    the neighbouring versions, so a version costs only what changed.
+    Versions of a ``StoredHistory`` start with both maps None (and their
+    counts given) until they are rebuilt.
+    """
+
+    __slots__ = ('number', 'label', 'created_at', 'layers', 'edges', 'layer_count', 'connection_count')
+
+    def __init__(self, number, label, layers, edges, created_at=None, counts=None):
+        self.number = number
+        self.label = label
+        self.created_at = int(time.time() * 1000) if created_at is None else created_at
+        self.layers = layers
+        self.edges = edges
+        self.layer_count, self.connection_count = (len(layers), len(edges)) if counts is None else counts
+
+    def to_dict(self):
+        return {
+            "number": self.number,
+            "label": self.label,
+            "created_at": self.created_at,
+            "layer_count": self.layer_count,
+            "connection_count": self.connection_count,
+        }
+
+    def graph(self):
+        """The version in the ``graph`` format accepted by the batch endpoint."""
+        return {
+            "layers": [
+                {"ref": layer_id, "type": type(layer).__name__, "params": jsonable(layer.get_config())}
+                for layer_id, layer in sorted(self.layers.items(), key=lambda item: item[0])
+            ],
+            "connections": [
+                {"source": source_id, "target": target_id}
+                for _, (source_id, target_id) in sorted(self.edges.items(), key=lambda item: item[0])
+            ],
+        }
+
+
+class NetworkHistory:
+    """Undo/redo history of a network built from persistent maps.
+
+    As a listener it mirrors every change into two persistent maps (layers
+    and edges), each update costing O(log n) new nodes. ``commit`` freezes
+    the current maps into a Version in O(1); nothing is copied. Moving to
+    another version diffs its maps against the current ones, which skips
+    every shared subtree, and applies just the difference to the network,
+    so the other listeners see ordinary change events.
+
+    Layer objects are never edited in place once added (edits go through
+    ``replace_layer``), which is what lets versions share them.
+
+    The history is pickled along with its network (``persistent``), so it
+    survives stores that keep networks serialized between requests; stores
+    that would rather not rewrite it on every change keep it as deltas
+    instead (see ``StoredHistory``).
+    """
+
+    persistent = True
+    MAX_VERSIONS = 1000
+
+    def __init__(self, network, max_versions=MAX_VERSIONS):
+        self.network = network
+        self.max_versions = max_versions
+        self.layers = PersistentMap(network.layers)
+        self.edges = _edge_map(network)
+        self.versions = []
+        self.current = -1
+        self.next_number = 0
+        self._applying = False
+        self.commit("Initial state")
+        network.listeners.append(self)
+
+    # NeuralNetwork listener interface
+
+    def layer_added(self, network, layer):
+        if not self._applying:
+            self.layers = self.layers.set(layer.id, layer)
+
+    def layer_removed(self, network, layer):
+        if not self._applying:
+            self.layers = self.layers.delete(layer.id)
+
+    def layer_changed(self, network, layer):
+        if not self._applying:
+            self.layers = self.layers.set(layer.id, layer)
+
+    def connection_added(self, network, connection):
+        if not self._applying:
+            self.edges = self.edges.set(connection.id, (connection.source.id, connection.target.id))
+
+    def connection_removed(self, network, connection):
+        if not self._applying:
+            self.edges = self.edges.delete(connection.id)
+
+    # Versions
+
+    @property
+    def head(self):
+        return self.versions[self.current]
+
+    def has_changes(self):
+        return not self.versions or self.head.layers is not self.layers or self.head.edges is not self.edges
+
+    def commit(self, label):
+        """Record the current state as a new version; None if nothing changed.
+
+        Versions after the current one (undone changes) are dropped, and the
+        oldest versions beyond ``max_versions`` are forgotten.
+        """
+        if not self.has_changes():
+            return None
+        del self.versions[self.current + 1:]
+        version = Version(self.next_number, label, self.layers, self.edges)
+        self.next_number += 1
+        self.versions.append(version)
+        overflow = len(self.versions) - self.max_versions
+        if overflow > 0:
+            del self.versions[:overflow]
+        self.current = len(self.versions) - 1
+        return version
+
+    def _index(self, number):
+        # Numbers are never reused, so dropping undone versions leaves gaps.
+        index = bisect_left(self.versions, number, key=attrgetter('number'))
+        if index < len(self.versions) and self.versions[index].number == number:
+            return index
+        return None
+
+    def version(self, number):
+        index = self._index(number)
+        return self.versions[index] if index is not None else None
+
+    def can_undo(self):
+        return self.current > 0 or self.has_changes()
+
+    def can_redo(self):
+        return self.current < len(self.versions) - 1 and not self.has_changes()
+
+    def undo(self):
+        """Go back one version; uncommitted changes are committed first so they can be redone."""
+        self.commit("Uncommitted changes")
+        if self.current == 0:
+            return None
+        return self.checkout(self.versions[self.current - 1].number)
+
+    def redo(self):
+        if not self.can_redo():
+            return None
+        return self.checkout(self.versions[self.current + 1].number)
+
+    def checkout(self, number):
+        """Make the network match version ``number``; None if it is unknown."""
+        self.commit("Uncommitted changes")
+        target = self.version(number)
+        if target is None:
+            return None
+        network = self.network
+        edge_changes = list(self.edges.diff(target.edges))
+        layer_changes = list(self.layers.diff(target.layers))
+        self._applying = True
+        try:
+            for connection_id, old, new in edge_changes:
+                if old is not MISSING:
+                    network.remove_connection(connection_id)
+            added = []
+            for layer_id, old, new in layer_changes:
+                if new is MISSING:
+                    network.remove_layer(layer_id)
+                elif old is MISSING:
+                    added.append(new)
+                else:
+                    network.replace_layer(layer_id, new)
+            network.restore(added, [
+                (connection_id, *new) for connection_id, old, new in edge_changes if new is not MISSING
+            ])
+        finally:
+            self._applying = False
+        self.layers, self.edges = target.layers, target.edges
+        self.current = self._index(target.number)
+        # Moving between versions is a change even when the graphs match,
+        # and stores persist a network only when its revision moves.
+        network.revision += 1
+        return target
+
+    def to_dict(self):
+        return {
+            "current": self.head.number,
+            "can_undo": self.can_undo(),
+            "can_redo": self.can_redo(),
+            "versions": [version.to_dict() for version in self.versions],
+        }
+
+    # Storage as deltas (see StoredHistory)
+
+    def _state(self):
+        head = self.head
+        uncommitted = (list(head.layers.diff(self.layers)), list(head.edges.diff(self.edges)))
+        versions = [(version.number, version.label, version.created_at,
+                     (version.layer_count, version.connection_count)) for version in self.versions]
+        return head.number, self.next_number, versions, uncommitted
+
+    def stored_changes(self):
+        """``(dropped, added, state)`` for a store that keeps versions as deltas.
+
+        ``added`` holds ``(number, delta)`` for each version the store lacks,
+        ``dropped`` the numbers it should delete (None for all it has), and
+        ``state`` is what ``StoredHistory`` loads from. A history that was
+        not loaded from the store is written whole.
+        """
+        empty = Version(None, None, PersistentMap(), PersistentMap())
+        added = [
+            (version.number, _delta(self.versions[index - 1] if index else empty, version))
+            for index, version in enumerate(self.versions)
+        ]
+        return None, added, self._state()
+
+
+class StoredHistory(NetworkHistory):
+    """A NetworkHistory a store keeps beside its network, one delta per version.
+
+    ``load_state()`` returns the last ``stored_changes`` state: the current
+    and next version numbers, the label, time and counts of each version,
+    and the uncommitted change on top of the head. Only the head is rebuilt, by
+    undoing that change on maps of the network itself, and only once the
+    history is first used, so reading a network does not pay for it. Other
+    versions are rebuilt on demand by replaying deltas from the nearest
+    rebuilt one, each read with ``load_delta(number)`` (None if the store
+    no longer has it). Committing records the new version's delta, so
+    saving costs the size of the change, not of the history.
+    """
+
+    persistent = False
+
+    def __init__(self, network, load_state, load_delta, max_versions=NetworkHistory.MAX_VERSIONS):
+        self.network = network
+        self.max_versions = max_versions
+        self._pending = (load_state, load_delta)
+        network.listeners.append(self)
+
+    def __getattr__(self, name):
+        # Attributes are only missing until the history is loaded.
+        if '_pending' not in self.__dict__:
+            raise AttributeError(name)
+        self.load()
+        return getattr(self, name)
+
+    def load(self):
+        """Rebuild the head now; stores call it before the network changes."""
+        if '_pending' not in self.__dict__:
+            return
+        load_state, self._load_delta = self.__dict__.pop('_pending')
+        current, self.next_number, versions, uncommitted = load_state()
+        self.layers = PersistentMap(self.network.layers)
+        self.edges = _edge_map(self.network)
+        self.versions = [Version(number, label, None, None, created_at, counts)
+                         for number, label, created_at, counts in versions]
+        self.current = self._index(current)
+        self._saved = {version.number for version in self.versions}
+        self._deltas = {}
+        self._applying = False
+        head = self.head
+        head.layers = _replay(self.layers, uncommitted[0], forward=False)
+        head.edges = _replay(self.edges, uncommitted[1], forward=False)
+
+    def commit(self, label):
+        previous = self.head
+        version = super().commit(label)
+        if version is not None:
+            self._deltas[version.number] = _delta(previous, version)
+        return version
+
+    def version(self, number):
+        index = self._index(number)
+        if index is None or (self.versions[index].layers is None and not self._rebuild(index)):
+            return None
+        return self.versions[index]
+
+    def _rebuild(self, index):
+        versions = self.versions
+        # The head is always rebuilt, so walking towards it finds a start.
+        step = 1 if index > self.current else -1
+        start = index
+        while versions[start].layers is None:
+            start -= step
+        for position in range(start + step, index + step, step):
+            # Each delta leads from the version before it to its own.
+            newer = versions[max(position, position - step)]
+            delta = self._deltas.get(newer.number) or self._load_delta(newer.number)
+            if delta is None:
+                return False
+            source = versions[position - step]
+            version = versions[position]
+            version.layers = _replay(source.layers, delta[0], forward=step > 0)
+            version.edges = _replay(source.edges, delta[1], forward=step > 0)
+        return True
+
+    def stored_changes(self):
+        numbers = {version.number for version in self.versions}
+        added = [(number, delta) for number, delta in self._deltas.items() if number in numbers]
+        return sorted(self._saved - numbers), added, self._state()
+
+
+def _edge_map(network):
+    return PersistentMap((c.id, (c.source.id, c.target.id)) for c in network.connections.values())
+
+
+def _delta(before, after):
+    """Layer and edge changes from one version to the next, as ``(key, old, new)``."""
+    return list(before.layers.diff(after.layers)), list(before.edges.diff(after.edges))
+
+
+def _replay(items, changes, forward):
+    for key, old, new in changes:
+        value = new if forward else old
+        items = items.delete(key) if value is MISSING else items.set(key, value)
+    return items
+
+
+def history_for(network) -> NetworkHistory:
+    """The history attached to ``network``, started on first use."""
+    return network.listener(NetworkHistory)
@@ -1,5 +1,7 @@
 from enum import Enum
-from layers.layer import Layer
+from math import prod
+from layers.layer import Layer, ShapeError, check_positive, expand_tuple, merge_input_shapes
+from layers.schema import IntOrTuple
 import os
 
 class ConvolutionType(Enum):
@@ -22,10 +24,10 @@ class ConvolutionalLayer(Layer):
     
     DEFAULT_CONV_TYPE = ConvolutionType.CONV2D
     DEFAULT_FILTERS = 32
-    DEFAULT_STRIDES = 1
+    DEFAULT_STRIDE = 1
     DEFAULT_KERNEL_SIZE = 3
     DEFAULT_PADDING = 1
-    DEFAULT_DILATION_RATE = 1
+    DEFAULT_DILATION = 1
     DEFAULT_PADDING_MODE = PaddingMode.ZEROS
     
 
@@ -34,10 +36,10 @@ class ConvolutionalLayer(Layer):
         conv_type: ConvolutionType = ConvolutionType.CONV2D,
         in_channels=32,
         filters=32,
-        kernel_size=3,
-        stride=1,
-        padding = 0,
-        dilation=1,
+        kernel_size: IntOrTuple = 3,
+        stride: IntOrTuple = 1,
+        padding: IntOrTuple = 0,
+        dilation: IntOrTuple = 1,
         groups=1,
         bias=True,
         padding_mode:PaddingMode=DEFAULT_PADDING_MODE,
@@ -47,45 +49,69 @@ class ConvolutionalLayer(Layer):
         self.conv_type = conv_type
         self.in_channels = in_channels
         self.filters = filters
+        self.kernel_size = kernel_size
         self.stride = stride
         self.padding = padding
         self.dilation= dilation
         self.groups = groups
         self.bias = bias
-        self.padding_mode = padding
- 
+        self.padding_mode = padding_mode
 
     @classmethod
-    def from_params(cls, params):
-        conv_type_str = params.get('conv_type', 'CONV2D') 
-        conv_type = ConvolutionType[conv_type_str]
-        ndim = {"Conv1D": 1, "Conv2D": 2, "Conv3D": 3}[conv_type.value]
+    def check_params(cls, values):
+        ndim = {"Conv1D": 1, "Conv2D": 2, "Conv3D": 3}[values['conv_type'].value]
+        for name in ('kernel_size', 'stride', 'padding', 'dilation'):
+            value = values[name]
+            if isinstance(value, tuple) and len(value) != ndim:
+                yield name, f"expects 1 or {ndim} values for {values['conv_type'].value}, got {len(value)}"
+        yield from check_positive(values, 'in_channels', 'filters', 'kernel_size', 'stride', 'dilation')
+        yield from check_positive(values, 'padding', minimum=0)
+        filters, groups = values['filters'], values['groups']
+        if not (isinstance(filters, int) and isinstance(groups, int)) or groups < 1 or filters % groups:
+            yield 'groups', f"must be a positive divisor of filters ({filters})"
 
-        def parse_tuple(val, ndim):
-            if isinstance(val, (list, tuple)):
-                if len(val) == ndim:
-                    return tuple(val)
-                elif len(val) == 1:
-                    return tuple(val * ndim)
-            return tuple([val] * ndim)
+    @property
+    def ndim(self):
+        return {"Conv1D": 1, "Conv2D": 2, "Conv3D": 3}[self.conv_type.value]
 
-        kernel_size = parse_tuple(params.get('kernel_size', 3), ndim)
-        stride = parse_tuple(params.get('stride', 2), ndim)
-        dilation = parse_tuple(params.get('dilation', 1), ndim)
-        return cls(
-            conv_type=conv_type,
-            in_channels=params.get('in_channels', 32),
-            filters=params.get('filters', 32),
-            kernel_size=kernel_size,
-            stride=stride,
-            padding=params.get('padding', 1),
-            dilation=dilation,
-            groups=params.get('groups', 1),
-            bias=params.get('bias', True),
-            padding_mode=params.get('padding_mode', 'zeroes'),
-           
+    def check_input(self, source, input_shape):
+        if input_shape is None:
+            return
+        if len(input_shape) != self.ndim + 1:
+            yield 'error', (f"{self.conv_type.value} expects (channels, {self.ndim} spatial dims) but "
+                            f"{type(source).__name__} {source.id} produces {list(input_shape)}")
+        elif input_shape[0] != self.in_channels:
+            yield 'warning', (f"in_channels={self.in_channels} but {type(source).__name__} {source.id} "
+                              f"produces {input_shape[0]} channels; the inferred size is used")
+
+    def compute_output_shape(self, input_shapes):
+        shape = merge_input_shapes(input_shapes)
+        ndim = self.ndim
+        if len(shape) != ndim + 1:
+            raise ShapeError(f"{self.conv_type.value} expects (channels, {ndim} spatial dims), got {shape}")
+        if shape[0] % self.groups or self.filters % self.groups:
+            raise ShapeError(f"Channels {shape[0]} -> {self.filters} not divisible by groups={self.groups}")
+        kernel = expand_tuple(self.kernel_size, ndim)
+        stride = expand_tuple(self.stride, ndim)
+        padding = expand_tuple(self.padding, ndim)
+        dilation = expand_tuple(self.dilation, ndim)
+        spatial = tuple(
+            (size + 2 * p - d * (k - 1) - 1) // s + 1
+            for size, k, s, p, d in zip(shape[1:], kernel, stride, padding, dilation)
         )
-    
+        if any(size <= 0 for size in spatial):
+            raise ShapeError(f"Kernel {kernel} does not fit input {shape}")
+        return (self.filters,) + spatial
+
+    def count_params(self, input_shapes):
+        in_channels = merge_input_shapes(input_shapes)[0]
+        weights = self.filters * (in_channels // self.groups) * prod(expand_tuple(self.kernel_size, self.ndim))
+        return weights + (self.filters if self.bias else 0)
+
+    def count_flops(self, input_shapes, output_shape):
+        in_channels = merge_input_shapes(input_shapes)[0]
+        per_output = 2 * (in_channels // self.groups) * prod(expand_tuple(self.kernel_size, self.ndim))
+        return prod(output_shape) * (per_output + (1 if self.bias else 0))
 
     def set_filters(size):
         pass
\ No newline at end of file
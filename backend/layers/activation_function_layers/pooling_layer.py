@@ -1,5 +1,7 @@
 from enum import Enum
-from layers.layer import Layer
+from math import ceil, floor, prod
+from layers.layer import Layer, ShapeError, check_positive, expand_tuple, merge_input_shapes
+from layers.schema import IntOrTuple
 import os
 
 class PoolingType(Enum):
@@ -27,52 +29,61 @@ class PoolingLayer(Layer):
         self,
         pooling_type: PoolingType = DEFAULT_POOL_TYPE,
         pool_dimension: PoolingDimension = DEFAULT_POOL_DIM,
-        kernel_size = 32,
-        stride = 1,
+        kernel_size: IntOrTuple = 32,
+        stride: IntOrTuple = None,
         padding: PaddingType = DEFAULT_PADDING,
-        dilation = 1,
+        dilation: IntOrTuple = 1,
         return_indices = False,
         ceil_mode = False
     ):
-        ndim = {"Pool1D": 1, "Pool2D": 2, "Pool3D": 3}[pool_dimension.value]
-        
-            
         super().__init__()
         self.pooling_type = pooling_type
         self.pool_dimension = pool_dimension
         self.kernel_size = kernel_size
-        self.stride = stride
+        # As in PyTorch, the stride defaults to the kernel size.
+        self.stride = kernel_size if stride is None else stride
         self.padding = padding
         self.dilation = dilation
         self.return_indices = return_indices
         self.ceil_mode = ceil_mode
 
     @classmethod
-    def from_params(cls, params):
-        pool_dim_str = params.get('pool_dimension', 'POOL2D')
-        pool_dimension = PoolingDimension[pool_dim_str]
-        ndim = {"Pool1D": 1, "Pool2D": 2, "Pool3D": 3}[pool_dimension.value]
-        
-        def parse_tuple(val, ndim):
-            if isinstance(val, (list, tuple)):
-                if len(val) == ndim:
-                    return tuple(val)
-                elif len(val) == 1:
-                    return tuple(val * ndim)
-            return tuple([val] * ndim)
-            
-        kernel_size = parse_tuple(params.get('kernel_size', cls.DEFAULT_KERNEL_SIZE), ndim)
-        stride = parse_tuple(params.get('stride', kernel_size), ndim)
-        
-        return cls(
-            pooling_type=PoolingType(params.get('pooling_type', cls.DEFAULT_POOL_TYPE.value)),
-            pool_dimension=pool_dimension,  
-            kernel_size=kernel_size,
-            stride=stride,
-            padding=PaddingType(params.get('padding', cls.DEFAULT_PADDING.value)),
-            dilation=params.get('dilation', 1),
-            return_indices=params.get('return_indices', False),
-            ceil_mode=params.get('ceil_mode', False)
-        )
-    
-   
+    def check_params(cls, values):
+        ndim = {"Pool1D": 1, "Pool2D": 2, "Pool3D": 3}[values['pool_dimension'].value]
+        for name in ('kernel_size', 'stride', 'dilation'):
+            value = values[name]
+            if isinstance(value, tuple) and len(value) != ndim:
+                yield name, f"expects 1 or {ndim} values for {values['pool_dimension'].value}, got {len(value)}"
+        yield from check_positive(values, 'kernel_size', 'stride', 'dilation')
+
+    @property
+    def ndim(self):
+        return {"Pool1D": 1, "Pool2D": 2, "Pool3D": 3}[self.pool_dimension.value]
+
+    def check_input(self, source, input_shape):
+        if input_shape is not None and len(input_shape) != self.ndim + 1:
+            yield 'error', (f"{self.pool_dimension.value} expects (channels, {self.ndim} spatial dims) but "
+                            f"{type(source).__name__} {source.id} produces {list(input_shape)}")
+
+    def compute_output_shape(self, input_shapes):
+        shape = merge_input_shapes(input_shapes)
+        ndim = self.ndim
+        if len(shape) != ndim + 1:
+            raise ShapeError(f"{self.pool_dimension.value} expects (channels, {ndim} spatial dims), got {shape}")
+        kernel = expand_tuple(self.kernel_size, ndim)
+        stride = expand_tuple(self.stride, ndim)
+        dilation = expand_tuple(self.dilation, ndim)
+        if self.padding == PaddingType.SAME:
+            spatial = tuple(ceil(size / s) for size, s in zip(shape[1:], stride))
+        else:
+            rounding = ceil if self.ceil_mode else floor
+            spatial = tuple(
+                rounding((size - d * (k - 1) - 1) / s) + 1
+                for size, k, s, d in zip(shape[1:], kernel, stride, dilation)
+            )
+        if any(size <= 0 for size in spatial):
+            raise ShapeError(f"Pool size {kernel} does not fit input {shape}")
+        return (shape[0],) + spatial
+
+    def count_flops(self, input_shapes, output_shape):
+        return prod(output_shape) * prod(expand_tuple(self.kernel_size, self.ndim))
@@ -1,27 +1,172 @@
-class Layer:
+from enum import Enum
+from math import prod
+
+from asset_store import asset_store
+from layers.schema import LayerMeta, LayerSchema, ParamError
+
+
+class ShapeError(ValueError):
+    """A layer cannot produce an output for the shapes it receives."""
+
+
+def expand_tuple(value, ndim):
+    """Expand an int, or a 1-element sequence, to an ndim-tuple."""
+    if isinstance(value, (list, tuple)):
+        if len(value) == ndim:
+            return tuple(value)
+        if len(value) == 1:
+            return tuple(value) * ndim
+        raise ShapeError(f"Expected {ndim} values, got {len(value)}")
+    return (value,) * ndim
+
+
+def check_positive(values, *names, minimum=1):
+    """``(param, message)`` for each int or per-dimension param below ``minimum``; None is skipped."""
+    for name in names:
+        value = values.get(name)
+        if value is None:
+            continue
+        if any(v < minimum for v in (value if isinstance(value, (list, tuple)) else (value,))):
+            yield name, "must be positive" if minimum == 1 else f"must be at least {minimum}"
+
+
+def merge_input_shapes(input_shapes):
+    """Shape seen by a layer with several inputs.
+
+    Equal shapes are merged element-wise (residual add). Shapes that only
+    differ in the channel dimension are concatenated along it.
+    """
+    if not input_shapes:
+        raise ShapeError("Layer has no input")
+    first = input_shapes[0]
+    if all(shape == first for shape in input_shapes):
+        return first
+    if all(len(shape) == len(first) and shape[1:] == first[1:] for shape in input_shapes):
+        return (sum(shape[0] for shape in input_shapes),) + tuple(first[1:])
+    raise ShapeError(f"Cannot merge input shapes {list(input_shapes)}")
+
+
+def freeze(value):
+    """Hashable, order-stable form of a config value."""
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    return value
+
+
+def jsonable(value):
+    """JSON-friendly form of a config value (enums by name)."""
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return [jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {k: jsonable(v) for k, v in value.items()}
+    return value
+
+
+class Layer(metaclass=LayerMeta):
+    """Base class of all layers.
+
+    Instances are slotted (see ``LayerMeta``) and hold only their id and
+    constructor parameters; connections live in the NeuralNetwork.
+    """
+
+    __slots__ = ('id',)
+
+    # Forward FLOPs per output element for layers whose cost is element-wise.
+    FLOPS_PER_ELEMENT = 0
+
     def __init__(self):
-        self.connections = []
         self.id = None
 
-    def connect_to(self, layer):
-        self.connections.append(layer)
-        
     @classmethod
     def from_params(cls, params):
-        """Create a layer instance from parameters. Must be implemented by subclasses."""
-        return cls()
+        """Create a layer from request params, validated against its schema.
+
+        Raises ParamError listing every invalid field.
+        """
+        return cls(**cls.schema().validate(params))
+
+    @classmethod
+    def check_params(cls, values):
+        """Cross-field checks on coerced params; yields ``(param, message)``."""
+        return ()
+
+    @classmethod
+    def schema(cls) -> LayerSchema:
+        """Parameter schema of this class, built once per class."""
+        schema = cls.__dict__.get('_schema')
+        if schema is None:
+            schema = cls._schema = LayerSchema(cls)
+        return schema
+
+    @classmethod
+    def config_names(cls):
+        """Constructor parameter names across the class hierarchy."""
+        return cls.schema().names
+
+    def get_config(self):
+        """Constructor arguments of this layer, read back from its attributes."""
+        return {name: getattr(self, name) for name in self.config_names() if hasattr(self, name)}
+
+    def config_key(self):
+        """Hashable key identifying the layer type and its configuration."""
+        return (type(self).__name__, freeze(self.get_config()))
+
+    def check_input(self, source, input_shape):
+        """Compatibility rules for an edge from ``source`` into this layer.
+
+        ``input_shape`` is the output shape of ``source``, or None when it
+        is unknown. Yields ``(severity, message)`` with severity 'error' or
+        'warning'.
+        """
+        return ()
+
+    def compute_output_shape(self, input_shapes):
+        """Output shape for one sample (batch dimension excluded).
+
+        ``input_shapes`` holds the output shape of every upstream layer.
+        Raises ShapeError when the inputs cannot be consumed.
+        """
+        return merge_input_shapes(input_shapes)
+
+    def count_params(self, input_shapes):
+        """Trainable parameters, sized against the inferred input shapes."""
+        return 0
+
+    def count_flops(self, input_shapes, output_shape):
+        """Forward FLOPs for one sample (a multiply-add counts as 2)."""
+        return self.FLOPS_PER_ELEMENT * prod(output_shape)
+
+    def count_backward_flops(self, input_shapes, output_shape):
+        """Backward FLOPs for one sample.
+
+        The gradient w.r.t. the input costs about one forward pass, and the
+        gradient w.r.t. the weights, when there are any, another one.
+        """
+        forward = self.count_flops(input_shapes, output_shape)
+        return 2 * forward if self.count_params(input_shapes) else forward
+
+    def count_gradient_params(self, input_shapes, batch_size):
+        """Parameter-gradient elements materialized for a batch."""
+        return self.count_params(input_shapes)
+
+    def count_activation_elements(self, input_shapes, output_shape):
+        """Elements kept alive for backward for one sample (the output by default)."""
+        return prod(output_shape)
 
     @classmethod
     def load_svg(cls):
-        if cls.path is None:
+        if getattr(cls, 'path', None) is None:
             raise NotImplementedError("Subclasses must define 'path' attribute")
-        with open(cls.path, 'r') as svg_file:
-            return svg_file.read()
-        
+        return asset_store.content_for(cls.path)
+
     @classmethod
     def get_svg_representation(cls):
         return {
-            "svg_content": cls.load_svg()
+            "svg_hash": asset_store.hash_for(cls.path)
         }
-        
-        
\ No newline at end of file
@@ -1,4 +1,4 @@
-from layers.layer import Layer
+from layers.layer import Layer, ShapeError, check_positive
 import os
 
 
@@ -37,22 +37,12 @@ class AttentionLayer(Layer):
         self.kdim = kdim
         self.vdim = vdim
         self.batch_first = batch_first
-        self.input_shape = None
-        self.output_shape = None
 
     @classmethod
-    def from_params(cls, params):
-        return cls(
-            embed_dim=params.get('embed_dim', cls.DEFAULT_EMBED_DIM),
-            num_heads=params.get('num_heads', cls.DEFAULT_NUM_HEADS),
-            dropout=params.get('dropout', cls.DEFAULT_DROPOUT),
-            bias=params.get('bias', cls.DEFAULT_BIAS),
-            add_bias_kv=params.get('add_bias_kv', cls.DEFAULT_ADD_BIAS_KV),
-            add_zero_attn=params.get('add_zero_attn', cls.DEFAULT_ADD_ZERO_ATTN),
-            kdim=params.get('kdim', cls.DEFAULT_KDIM),
-            vdim=params.get('vdim', cls.DEFAULT_VDIM),
-            batch_first=params.get('batch_first', cls.DEFAULT_BATCH_FIRST)
-        )
+    def check_params(cls, values):
+        yield from check_positive(values, 'embed_dim', 'num_heads', 'kdim', 'vdim')
+        if not 0 <= values['dropout'] < 1:
+            yield 'dropout', "must be at least 0 and below 1"
 
     def get_config(self):
         return {
@@ -66,3 +56,64 @@ class AttentionLayer(Layer):
             'vdim': self.vdim,
             'batch_first': self.batch_first
         }
+
+    def _sequence_shapes(self, input_shapes):
+        """(query, key, value) shapes from 1 (self-attention), 2 or 3 inputs."""
+        if not input_shapes or len(input_shapes) > 3:
+            raise ShapeError(f"AttentionLayer takes 1 to 3 inputs, got {len(input_shapes)}")
+        for shape in input_shapes:
+            if len(shape) != 2:
+                raise ShapeError(f"AttentionLayer expects (sequence, features) inputs, got {shape}")
+        query = input_shapes[0]
+        key = input_shapes[1] if len(input_shapes) > 1 else query
+        value = input_shapes[2] if len(input_shapes) > 2 else key
+        if key[0] != value[0]:
+            raise ShapeError(f"Key length {key[0]} does not match value length {value[0]}")
+        return query, key, value
+
+    def check_input(self, source, input_shape):
+        if input_shape is None:
+            return
+        if len(input_shape) != 2:
+            yield 'error', (f"AttentionLayer expects (sequence, features) but "
+                            f"{type(source).__name__} {source.id} produces {list(input_shape)}")
+        elif input_shape[-1] not in (self.embed_dim, self.kdim, self.vdim):
+            yield 'error', (f"{type(source).__name__} {source.id} produces {input_shape[-1]} features, "
+                            f"which matches none of embed_dim/kdim/vdim")
+
+    def compute_output_shape(self, input_shapes):
+        query, _, _ = self._sequence_shapes(input_shapes)
+        if self.embed_dim % self.num_heads:
+            raise ShapeError(f"embed_dim {self.embed_dim} is not divisible by num_heads {self.num_heads}")
+        return (query[0], self.embed_dim)
+
+    def count_params(self, input_shapes):
+        embed_dim = self.embed_dim
+        kdim = self.kdim or embed_dim
+        vdim = self.vdim or embed_dim
+        params = embed_dim * (embed_dim + kdim + vdim) + embed_dim * embed_dim
+        if self.bias:
+            params += 4 * embed_dim
+        if self.add_bias_kv:
+            params += 2 * embed_dim
+        return params
+
+    def count_flops(self, input_shapes, output_shape):
+        query, key, _ = self._sequence_shapes(input_shapes)
+        embed_dim = self.embed_dim
+        kdim = self.kdim or embed_dim
+        vdim = self.vdim or embed_dim
+        target_len = query[0]
+        source_len = key[0] + (1 if self.add_bias_kv else 0) + (1 if self.add_zero_attn else 0)
+        projections = 2 * (target_len * embed_dim * embed_dim + key[0] * embed_dim * (kdim + vdim))
+        attention = 2 * 2 * target_len * source_len * embed_dim
+        softmax = 3 * self.num_heads * target_len * source_len
+        output = 2 * target_len * embed_dim * embed_dim
+        return projections + attention + softmax + output
+
+    def count_activation_elements(self, input_shapes, output_shape):
+        query, key, _ = self._sequence_shapes(input_shapes)
+        # Projected q/k/v and the attention weights are saved for backward.
+        projections = query[0] * self.embed_dim + 2 * key[0] * self.embed_dim
+        weights = self.num_heads * query[0] * key[0]
+        return output_shape[0] * output_shape[1] + projections + weights
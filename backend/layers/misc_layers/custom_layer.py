@@ -8,11 +8,6 @@ class CustomLayer(Layer):
 
     def __init__(self):
         super().__init__()
-       
-    
-    @classmethod
-    def from_params(cls, params):
-        return cls()
     
 
     
\ No newline at end of file
@@ -1,4 +1,5 @@
-from layers.layer import Layer
+from math import prod
+from layers.layer import Layer, ShapeError, check_positive, merge_input_shapes
 import os
 
 
@@ -14,14 +15,26 @@ class DenseLayer(Layer):
         self.in_features = in_features
         self.units = units
         self.bias = bias
-    
+
     @classmethod
-    def from_params(cls, params):
-        return cls(
-            in_features=params.get('in_features', cls.DEFAULT_IN_FEATURES),
-            units=params.get('units', cls.DEFAULT_UNITS),
-            bias=params.get('bias', cls.DEFAULT_BIAS)
-        )
-    
-
-    
\ No newline at end of file
+    def check_params(cls, values):
+        return check_positive(values, 'in_features', 'units')
+
+    def check_input(self, source, input_shape):
+        if input_shape and input_shape[-1] != self.in_features:
+            yield 'warning', (f"in_features={self.in_features} but {type(source).__name__} {source.id} "
+                              f"produces {input_shape[-1]} features; the inferred size is used")
+
+    def compute_output_shape(self, input_shapes):
+        shape = merge_input_shapes(input_shapes)
+        if not shape:
+            raise ShapeError("DenseLayer needs at least one input dimension")
+        return tuple(shape[:-1]) + (self.units,)
+
+    def count_params(self, input_shapes):
+        in_features = merge_input_shapes(input_shapes)[-1]
+        return in_features * self.units + (self.units if self.bias else 0)
+
+    def count_flops(self, input_shapes, output_shape):
+        in_features = merge_input_shapes(input_shapes)[-1]
+        return prod(output_shape) * (2 * in_features + (1 if self.bias else 0))
@@ -4,16 +4,15 @@ import os
 
 class DropoutLayer(Layer):
     path = os.path.join('.', 'assets', 'dropout_layer.svg')
+    FLOPS_PER_ELEMENT = 1
     
     def __init__(self, probability=0.5, inplace=False):
         super().__init__()
         self.probability = probability
         self.inplace = inplace
-    
+
     @classmethod
-    def from_params(cls, params):
-        return cls(
-            probability=params.get('probability', 0.5),
-            inplace=params.get('inplace', False)
-        )
+    def check_params(cls, values):
+        if not 0 <= values['probability'] <= 1:
+            yield 'probability', "must be between 0 and 1"
     
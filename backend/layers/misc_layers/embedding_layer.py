@@ -1,5 +1,6 @@
 from enum import Enum
-from layers.layer import Layer
+from math import prod
+from layers.layer import Layer, check_positive, merge_input_shapes
 import os
 
 class InitializerType(Enum):
@@ -51,21 +52,10 @@ class EmbeddingLayer(Layer):
         self.norm_type = norm_type
         self.scale_grad_by_freq = scale_grad_by_freq
         self.sparse = sparse
-        self.input_shape = None
-        self.output_shape = None
 
     @classmethod
-    def from_params(cls, params):
-        return cls(
-            num_embeddings=params.get('num_embeddings', cls.DEFAULT_NUM_EMBEDDINGS),
-            embedding_dim=params.get('embedding_dim', cls.DEFAULT_EMBEDDING_DIM),
-            padding_idx=params.get('padding_idx', cls.DEFAULT_PADDING_IDX),
-            max_norm=params.get('max_norm', cls.DEFAULT_MAX_NORM),
-            norm_type=params.get('norm_type', cls.DEFAULT_NORM_TYPE),
-            scale_grad_by_freq=params.get('scale_grad_by_freq', cls.DEFAULT_SCALE_GRAD_BY_FREQ),
-            sparse=params.get('sparse', cls.DEFAULT_SPARSE),
-      
-        )
+    def check_params(cls, values):
+        return check_positive(values, 'num_embeddings', 'embedding_dim')
 
     def get_config(self):
         return {
@@ -77,6 +67,26 @@ class EmbeddingLayer(Layer):
             'scale_grad_by_freq': self.scale_grad_by_freq,
             'sparse': self.sparse
         }
-    
 
-    
\ No newline at end of file
+    def compute_output_shape(self, input_shapes):
+        return tuple(merge_input_shapes(input_shapes)) + (self.embedding_dim,)
+
+    def count_params(self, input_shapes):
+        return self.num_embeddings * self.embedding_dim
+
+    def count_flops(self, input_shapes, output_shape):
+        # A table lookup; scaling by max_norm is the only arithmetic.
+        return prod(output_shape) * 3 if self.max_norm is not None else 0
+
+    def count_backward_flops(self, input_shapes, output_shape):
+        # Sparse gradients only touch the looked-up rows; dense ones also
+        # zero and accumulate into a full-size table gradient.
+        if self.sparse:
+            return 2 * prod(output_shape)
+        return prod(output_shape) + self.num_embeddings * self.embedding_dim
+
+    def count_gradient_params(self, input_shapes, batch_size):
+        if self.sparse:
+            lookups = batch_size * prod(merge_input_shapes(input_shapes))
+            return min(lookups, self.num_embeddings) * self.embedding_dim
+        return self.count_params(input_shapes)
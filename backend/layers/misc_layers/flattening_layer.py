@@ -1,4 +1,5 @@
-from layers.layer import Layer
+from math import prod
+from layers.layer import Layer, ShapeError, merge_input_shapes
 import os
 
 
@@ -10,12 +11,11 @@ class FlatteningLayer(Layer):
         self.start_dim = start_dim
         self.end_dim = end_dim
     
-    @classmethod
-    def from_params(cls, params):
-        return cls(
-            start_dim=params.get('start_dim', 1),
-            end_dim=params.get('end_dim', -1)
-        )
-    
- 
-    
\ No newline at end of file
+    def compute_output_shape(self, input_shapes):
+        # start_dim/end_dim count the batch dimension, as in torch.nn.Flatten.
+        shape = (1,) + tuple(merge_input_shapes(input_shapes))
+        start = self.start_dim % len(shape)
+        end = self.end_dim % len(shape)
+        if start == 0 or start > end:
+            raise ShapeError(f"Cannot flatten dims {self.start_dim}..{self.end_dim} of {shape[1:]}")
+        return shape[1:start] + (prod(shape[start:end + 1]),) + shape[end + 1:]
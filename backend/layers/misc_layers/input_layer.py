@@ -1,4 +1,5 @@
-from layers.layer import Layer
+from layers.layer import Layer, ShapeError, ParamError, check_positive
+from asset_store import asset_store
 import os
 from enum import Enum
 from typing import List, Tuple, Optional, Union, Dict, Any
@@ -16,30 +17,49 @@ class BaseInputLayer(Layer):
     """Base class for all input layers"""
     base_path = os.path.join('.', 'assets', 'input')
     
-    def __init__(self, input_type: InputType):
+    def __init__(self, input_type: InputType, input_shape: list = None):
         super().__init__()
         self.input_type = input_type
+        # Per-sample shape (batch dimension excluded)
+        self.input_shape = tuple(input_shape) if input_shape else None
     
     @classmethod
     def from_params(cls, params: Dict[str, Any]):
         """Factory method to create the appropriate input layer type"""
-        input_type_str = params.get('input_type', 'IMAGE')
-        try:
-            input_type = InputType[input_type_str]
-        except KeyError:
-            input_type = InputType.IMAGE
+        input_type_str = params.get('input_type')
+        if input_type_str is None and cls is not BaseInputLayer:
+            layer_class = cls
+        else:
+            try:
+                input_type = BaseInputLayer.schema().param('input_type').coerce(input_type_str or 'IMAGE')
+            except ValueError as e:
+                raise ParamError([{"param": "input_type", "message": str(e)}])
+            
+            # Create the appropriate input layer based on type
+            if input_type == InputType.IMAGE:
+                layer_class = ImageInputLayer
+            elif input_type == InputType.TEXT:
+                layer_class = TextInputLayer
+            elif input_type == InputType.TABULAR:
+                layer_class = TabularInputLayer
+            elif input_type == InputType.AUDIO:
+                layer_class = AudioInputLayer
+            elif input_type == InputType.VIDEO:
+                layer_class = VideoInputLayer
         
-        # Create the appropriate input layer based on type
-        if input_type == InputType.IMAGE:
-            return ImageInputLayer()
-        elif input_type == InputType.TEXT:
-            return TextInputLayer()
-        elif input_type == InputType.TABULAR:
-            return TabularInputLayer()
-        elif input_type == InputType.AUDIO:
-            return AudioInputLayer()
-        elif input_type == InputType.VIDEO:
-            return VideoInputLayer()
+        return layer_class(**layer_class.schema().validate(params))
+    
+    @classmethod
+    def check_params(cls, values):
+        return check_positive(values, 'input_shape')
+
+    def check_input(self, source, input_shape):
+        yield 'error', f"Input layers take no inputs, but {type(source).__name__} {source.id} is connected to one"
+
+    def compute_output_shape(self, input_shapes):
+        if not self.input_shape:
+            raise ShapeError("Input layer has no input_shape")
+        return self.input_shape
     
     @classmethod
     def get_svg_path(cls, input_type_name="IMAGE"):
@@ -51,47 +71,42 @@ class BaseInputLayer(Layer):
     
     @classmethod
     def load_svg(cls, input_type_name="IMAGE"):
-        svg_path = cls.get_svg_path(input_type_name)
+        return asset_store.get(cls.get_svg_hash(input_type_name)).content
+    
+    @classmethod
+    def get_svg_hash(cls, input_type_name="IMAGE"):
         try:
-            with open(svg_path, 'r') as svg_file:
-                return svg_file.read()
+            return asset_store.hash_for(cls.get_svg_path(input_type_name))
         except FileNotFoundError:
-            default_path = cls.get_svg_path("IMAGE")
-            with open(default_path, 'r') as svg_file:
-                return svg_file.read()
+            return asset_store.hash_for(cls.get_svg_path("IMAGE"))
     
     @staticmethod
     def get_svg_representation():
-        svg_representations = {}
-        
-        for input_type in InputType:
-            try:
-                svg_content = BaseInputLayer.load_svg(input_type.name)
-                svg_representations[input_type.name] = svg_content
-            except Exception as e:
-                print(f"Failed to load SVG for {input_type.name}: {e}")
-                if input_type.name != "IMAGE":
-                    svg_representations[input_type.name] = BaseInputLayer.load_svg("IMAGE")
+        svg_hashes = {
+            input_type.name: BaseInputLayer.get_svg_hash(input_type.name)
+            for input_type in InputType
+        }
         
         return {
-            "svg_content": BaseInputLayer.load_svg("IMAGE"),  # default representation
-            "all_representations": svg_representations
+            "svg_hash": svg_hashes["IMAGE"],  # default representation
+            "all_hashes": svg_hashes
         }
     
     def get_config(self):
         """Return base configuration that all input layers share"""
-        config = {'input_type': self.input_type.name}
+        config = {'input_type': self.input_type.name, 'input_shape': list(self.input_shape) if self.input_shape else None}
         return config
 
 
 class ImageInputLayer(BaseInputLayer):
     """Input layer for image data"""
+    DEFAULT_INPUT_SHAPE = [3, 224, 224]  # channels, height, width
     
-    def __init__(self):
+    def __init__(self, input_shape: list = DEFAULT_INPUT_SHAPE):
                 #  shape: Optional[List[int]] = None,
                 #  channels: int = 3, 
                 #  color_mode: str = "rgb"):
-        super().__init__(InputType.IMAGE)
+        super().__init__(InputType.IMAGE, input_shape)
         # self.shape = shape or [28, 28]  # Default to common image size
         # self.width = 28
         # self.height = 28
@@ -99,7 +114,7 @@ class ImageInputLayer(BaseInputLayer):
         # self.color_mode = color_mode
     
     def get_config(self):
-        # config = super().get_config()
+        config = super().get_config()
         # config.update({
         #     'shape': self.shape,
         #     'channels': self.channels,
@@ -110,13 +125,14 @@ class ImageInputLayer(BaseInputLayer):
 
 class TextInputLayer(BaseInputLayer):
     """Input layer for text data"""
+    DEFAULT_INPUT_SHAPE = [128]  # sequence length of token ids
     
-    def __init__(self): 
+    def __init__(self, input_shape: list = DEFAULT_INPUT_SHAPE): 
                 #  vocab_size: int = 10000,
                 #  sequence_length: int = 100, 
                 #  embedding_dim: int = 128, 
                 #  tokenizer: str = "word"):
-        super().__init__(InputType.TEXT)
+        super().__init__(InputType.TEXT, input_shape)
         # self.vocab_size = vocab_size
         # self.sequence_length = sequence_length
         # self.embedding_dim = embedding_dim
@@ -135,9 +151,10 @@ class TextInputLayer(BaseInputLayer):
 
 class TabularInputLayer(BaseInputLayer):
     """Input layer for tabular data"""
+    DEFAULT_INPUT_SHAPE = [10]  # features
     
-    def __init__(self): 
-        super().__init__(InputType.TABULAR)
+    def __init__(self, input_shape: list = DEFAULT_INPUT_SHAPE): 
+        super().__init__(InputType.TABULAR, input_shape)
    
     def get_config(self):
         config = super().get_config()
@@ -146,10 +163,11 @@ class TabularInputLayer(BaseInputLayer):
 
 class AudioInputLayer(BaseInputLayer):
     """Input layer for audio data"""
+    DEFAULT_INPUT_SHAPE = [1, 16000]  # channels, samples
     
-    def __init__(self):
+    def __init__(self, input_shape: list = DEFAULT_INPUT_SHAPE):
 
-        super().__init__(InputType.AUDIO)
+        super().__init__(InputType.AUDIO, input_shape)
       
     
     def get_config(self):
@@ -159,9 +177,10 @@ class AudioInputLayer(BaseInputLayer):
 
 class VideoInputLayer(BaseInputLayer):
     """Input layer for video data"""
+    DEFAULT_INPUT_SHAPE = [3, 16, 112, 112]  # channels, frames, height, width
     
-    def __init__(self):
-        super().__init__(InputType.VIDEO)
+    def __init__(self, input_shape: list = DEFAULT_INPUT_SHAPE):
+        super().__init__(InputType.VIDEO, input_shape)
 
     
     def get_config(self):
@@ -173,9 +192,12 @@ class VideoInputLayer(BaseInputLayer):
 # For backward compatibility with existing code
 class InputLayer(BaseInputLayer):
     """Legacy class for backward compatibility"""
-    
+
+    # Accepts arbitrary extra attributes, so it keeps a __dict__.
+    __slots__ = ('shape', '__dict__')
+
     def __init__(self, input_type: InputType, shape=None, **kwargs):
-        super().__init__(input_type)
+        super().__init__(input_type, shape)
         self.shape = shape
         self.__dict__.update(kwargs)
     
@@ -1,4 +1,4 @@
-from layers.layer import Layer
+from layers.layer import Layer, ShapeError, merge_input_shapes
 import os
 from enum import Enum
 #normalization types
@@ -18,16 +18,42 @@ class NormalizationLayer(Layer):
     path = os.path.join('.', 'assets', 'normalization_layer.svg')
 
     DEFAULT_NORMALIZATION_TYPE = NormalizationType.BATCH_NORMALIZATION2D
+    FLOPS_PER_ELEMENT = 5
+
+    # Accepted input ranks (batch excluded) per type; None accepts any rank.
+    INPUT_RANKS = {
+        NormalizationType.BATCH_NORMALIZATION1D: (1, 2),
+        NormalizationType.BATCH_NORMALIZATION2D: (3,),
+        NormalizationType.BATCH_NORMALIZATION3D: (4,),
+        NormalizationType.LAYER_NORMALIZATION: None,
+        NormalizationType.GROUP_NORMALIZATION: None,
+        NormalizationType.INSTANCE_NORMALIZATION1D: (2,),
+        NormalizationType.INSTANCE_NORMALIZATION2D: (3,),
+        NormalizationType.INSTANCE_NORMALIZATION3D: (4,),
+    }
 
     def __init__(self, normalization_type: NormalizationType = DEFAULT_NORMALIZATION_TYPE):
         super().__init__()
         self.normalization_type = normalization_type
          
     
-    @classmethod
-    def from_params(cls, params):
-        norm_type = params.get('normalization_type', cls.DEFAULT_NORMALIZATION_TYPE)
-        # Convert string to enum if needed
-        if isinstance(norm_type, str):
-            norm_type = NormalizationType[norm_type]
-        return cls(normalization_type=norm_type)
\ No newline at end of file
+    def check_input(self, source, input_shape):
+        ranks = self.INPUT_RANKS[self.normalization_type]
+        if input_shape is not None and ranks is not None and len(input_shape) not in ranks:
+            yield 'error', (f"{self.normalization_type.value} expects rank {' or '.join(map(str, ranks))} input but "
+                            f"{type(source).__name__} {source.id} produces {list(input_shape)}")
+
+    def compute_output_shape(self, input_shapes):
+        shape = merge_input_shapes(input_shapes)
+        ranks = self.INPUT_RANKS[self.normalization_type]
+        if ranks is not None and len(shape) not in ranks:
+            raise ShapeError(f"{self.normalization_type.value} expects rank {ranks} input, got {shape}")
+        return shape
+
+    def count_params(self, input_shapes):
+        shape = merge_input_shapes(input_shapes)
+        if self.normalization_type.name.startswith('INSTANCE'):
+            return 0  # affine=False by default
+        if self.normalization_type == NormalizationType.LAYER_NORMALIZATION:
+            return 2 * shape[-1]
+        return 2 * shape[0]
@@ -1,4 +1,4 @@
-from layers.layer import Layer
+from layers.layer import Layer, ShapeError, check_positive, merge_input_shapes
 import os
 from enum import Enum
 
@@ -9,6 +9,13 @@ class RecurrentType(Enum):
     RNN = "RNN"
 
 
+GATE_COUNT = {
+    RecurrentType.LSTM: 4,
+    RecurrentType.GRU: 3,
+    RecurrentType.RNN: 1,
+}
+
+
 class RecurrentLayer(Layer):
     path = os.path.join('.', 'assets', 'recurrent_layer.svg')
     #default values
@@ -32,16 +39,58 @@ class RecurrentLayer(Layer):
         self.dropout = dropout
         self.bidirectional = bidirectional
 
-
     @classmethod
-    def from_params(cls, params):
-        return cls(
-            recurrent_type=params.get('recurrent_type', cls.DEFAULT_RECURRENT_TYPE),
-            input_size=params.get('input_size', cls.DEFAULT_INPUT_SIZE),
-            hidden_size=params.get('hidden_size', cls.DEFAULT_HIDDEN_SIZE),
-            num_layers=params.get('num_layers', cls.DEFAULT_NUM_LAYERS),
-            bias=params.get('bias', cls.DEFAULT_BIAS),
-            batch_first=params.get('batch_first', cls.DEFAULT_BATCH_FIRST),
-            dropout=params.get('dropout', cls.DEFAULT_DROPOUT),
-            bidirectional=params.get('bidirectional', cls.DEFAULT_BIDIRECTIONAL)
-        )
+    def check_params(cls, values):
+        yield from check_positive(values, 'input_size', 'hidden_size', 'num_layers')
+        if not 0 <= values['dropout'] < 1:
+            yield 'dropout', "must be at least 0 and below 1"
+
+    @property
+    def num_directions(self):
+        return 2 if self.bidirectional else 1
+
+    def check_input(self, source, input_shape):
+        if input_shape is None:
+            return
+        if len(input_shape) != 2:
+            yield 'error', (f"{self.recurrent_type.value} expects (sequence, features) but "
+                            f"{type(source).__name__} {source.id} produces {list(input_shape)}")
+        elif input_shape[-1] != self.input_size:
+            yield 'warning', (f"input_size={self.input_size} but {type(source).__name__} {source.id} "
+                              f"produces {input_shape[-1]} features; the inferred size is used")
+
+    def compute_output_shape(self, input_shapes):
+        shape = merge_input_shapes(input_shapes)
+        if len(shape) != 2:
+            raise ShapeError(f"RecurrentLayer expects (sequence, features) input, got {shape}")
+        return (shape[0], self.hidden_size * self.num_directions)
+
+    def _layer_input_sizes(self, input_size):
+        return [input_size] + [self.hidden_size * self.num_directions] * (self.num_layers - 1)
+
+    def count_params(self, input_shapes):
+        input_size = merge_input_shapes(input_shapes)[-1]
+        gates = GATE_COUNT[self.recurrent_type] * self.hidden_size
+        params = 0
+        for layer_input in self._layer_input_sizes(input_size):
+            per_direction = gates * (layer_input + self.hidden_size)
+            if self.bias:
+                per_direction += 2 * gates
+            params += per_direction * self.num_directions
+        return params
+
+    def count_flops(self, input_shapes, output_shape):
+        sequence_length, input_size = merge_input_shapes(input_shapes)
+        gates = GATE_COUNT[self.recurrent_type] * self.hidden_size
+        per_step = 0
+        for layer_input in self._layer_input_sizes(input_size):
+            # Gate GEMVs plus the element-wise gate and state updates.
+            per_step += (2 * gates * (layer_input + self.hidden_size) + 4 * gates) * self.num_directions
+        return sequence_length * per_step
+
+    def count_activation_elements(self, input_shapes, output_shape):
+        # Gate activations and hidden states of every step, layer and direction.
+        sequence_length = output_shape[0]
+        gates = GATE_COUNT[self.recurrent_type] * self.hidden_size
+        per_step = (gates + self.hidden_size) * self.num_directions * self.num_layers
+        return sequence_length * per_step
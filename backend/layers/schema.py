@@ -0,0 +1,264 @@
+import inspect
+from enum import Enum
+
+EMPTY = inspect.Parameter.empty
+
+
+class ParamError(ValueError):
+    """Layer params failed validation.
+
+    ``errors`` holds one ``{"param", "message"}`` dict per problem, so a
+    client can point at every bad field at once.
+    """
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"{e['param']}: {e['message']}" for e in errors))
+        self.errors = errors
+
+
+class IntOrTuple:
+    """Annotation for an int or per-dimension ints (kernel sizes, strides, ...)."""
+
+
+class Param:
+    """One constructor parameter of a layer type."""
+
+    __slots__ = ('name', 'annotation', 'default', 'kind', 'enum', 'coerce')
+
+    def __init__(self, name, annotation=EMPTY, default=EMPTY):
+        self.name = name
+        self.annotation = annotation
+        self.default = default
+        self.kind = param_kind(annotation)
+        self.enum = annotation if inspect.isclass(annotation) and issubclass(annotation, Enum) else None
+        self.coerce = compile_coercer(annotation, default)
+
+    @property
+    def required(self):
+        return self.default is EMPTY
+
+    def __repr__(self):
+        return f"Param({self.name!r})"
+
+
+def init_params(init):
+    """Params declared by an ``__init__``, skipping self, *args and **kwargs."""
+    params = []
+    for name, parameter in inspect.signature(init).parameters.items():
+        if name == 'self' or parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        params.append(Param(name, parameter.annotation, parameter.default))
+    return params
+
+
+def param_kind(annotation):
+    """Catalog type of a param: enum, number, boolean, array, object or string."""
+    if inspect.isclass(annotation) and issubclass(annotation, Enum):
+        return "enum"
+    if annotation in (int, float):
+        return "number"
+    if annotation is bool:
+        return "boolean"
+    if annotation is list or str(annotation).startswith("typing.List"):
+        return "array"
+    if annotation is dict or str(annotation).startswith("typing.Dict"):
+        return "object"
+    return "string"
+
+
+# Coercers turn a JSON value into the constructor argument or raise
+# ValueError with a message meant for the client.
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise ValueError("must be an integer")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise ValueError("must be an integer")
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        raise ValueError("must be a number")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            pass
+    raise ValueError("must be a number")
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    raise ValueError("must be true or false")
+
+
+def _to_int_tuple(value):
+    """A list of ints, or a string such as "3, 224, 224" or "3x224x224"."""
+    if isinstance(value, str):
+        value = [v for v in value.replace('x', ',').replace('(', '').replace(')', '').split(',') if v.strip()]
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = [value]
+    if not isinstance(value, (list, tuple)):
+        raise ValueError("must be a list of integers")
+    try:
+        return tuple(_to_int(v) for v in value)
+    except ValueError:
+        raise ValueError("must be a list of integers") from None
+
+
+def _to_int_or_tuple(value):
+    """An int, or a per-dimension list of ints (kernel sizes, strides, ...)."""
+    if isinstance(value, (list, tuple)) or (isinstance(value, str) and (',' in value or 'x' in value)):
+        values = _to_int_tuple(value)
+        return values[0] if len(values) == 1 else values
+    return _to_int(value)
+
+
+def _enum_coercer(enum):
+    lookup = {}
+    for member in enum:
+        lookup[member.name] = member
+        lookup[member.name.lower()] = member
+        if isinstance(member.value, str):
+            lookup[member.value] = member
+            lookup[member.value.lower()] = member
+    names = ", ".join(member.name for member in enum)
+
+    def coerce(value):
+        if isinstance(value, enum):
+            return value
+        member = lookup.get(value) if isinstance(value, str) else None
+        if member is None and isinstance(value, str):
+            member = lookup.get(value.lower())
+        if member is None:
+            raise ValueError(f"must be one of {names}")
+        return member
+    return coerce
+
+
+def _any(value):
+    return value
+
+
+def compile_coercer(annotation, default):
+    """Pick a coercer from the annotation, or from the default when unannotated."""
+    if inspect.isclass(annotation) and issubclass(annotation, Enum):
+        coerce = _enum_coercer(annotation)
+    elif annotation is bool or (annotation is EMPTY and isinstance(default, bool)):
+        coerce = _to_bool
+    elif annotation is int or (annotation is EMPTY and isinstance(default, int)):
+        coerce = _to_int
+    elif annotation is float or (annotation is EMPTY and isinstance(default, float)):
+        coerce = _to_float
+    elif annotation is list or str(annotation).startswith("typing.List"):
+        coerce = _to_int_tuple
+    elif annotation is IntOrTuple:
+        coerce = _to_int_or_tuple
+    else:
+        return _any
+    if default is None:
+        return lambda value: None if value is None else coerce(value)
+    return coerce
+
+
+class LayerSchema:
+    """Parameters of a layer class and a validator compiled from them.
+
+    ``params`` covers every constructor parameter across the class hierarchy
+    and backs ``get_config`` and the layer catalog. ``validate`` only
+    handles the parameters the class's own constructor accepts. Defaults
+    come from ``DEFAULT_<NAME>`` class attributes when present, as the
+    catalog advertises them, and otherwise from the signature.
+    """
+
+    def __init__(self, cls):
+        self.cls = cls
+        params, seen = [], set()
+        for c in cls.__mro__:
+            if c is object:
+                break
+            if '__init__' not in c.__dict__:
+                continue
+            for param in init_params(c.__init__):
+                if param.name in seen:
+                    continue
+                seen.add(param.name)
+                default = getattr(cls, f"DEFAULT_{param.name.upper()}", param.default)
+                if default is not param.default:
+                    param = Param(param.name, param.annotation, default)
+                params.append(param)
+        self.params = tuple(params)
+        self.names = tuple(param.name for param in params)
+
+        accepted = {param.name for param in init_params(cls.__init__)}
+        self._fields = tuple(
+            (param.name, param.default, param.coerce)
+            for param in params if param.name in accepted
+        )
+
+    def param(self, name):
+        return self.params[self.names.index(name)]
+
+    def validate(self, params):
+        """Coerced constructor kwargs for ``params``; raises ParamError.
+
+        Missing, null (for non-nullable params) and empty-string values fall
+        back to the default. Unknown keys are ignored.
+        """
+        if not isinstance(params, dict):
+            raise ParamError([{"param": None, "message": "params must be an object"}])
+        values, errors = {}, []
+        for name, default, coerce in self._fields:
+            value = params.get(name, EMPTY)
+            if value is EMPTY or value == "" or (value is None and default is not None):
+                if default is EMPTY:
+                    errors.append({"param": name, "message": "is required"})
+                    continue
+                values[name] = default
+                continue
+            try:
+                values[name] = coerce(value)
+            except ValueError as e:
+                errors.append({"param": name, "message": str(e)})
+        if not errors:
+            errors = [{"param": name, "message": message}
+                      for name, message in self.cls.check_params(values)]
+        if errors:
+            raise ParamError(errors)
+        return values
+
+
+class LayerMeta(type):
+    """Gives every layer class ``__slots__`` derived from its ``__init__``.
+
+    A layer's configuration is exactly its constructor parameters, so each
+    class gets one slot per parameter its own ``__init__`` introduces and
+    instances carry no ``__dict__``. Classes that need free-form attributes
+    can still declare ``__slots__`` themselves (e.g. with ``'__dict__'``).
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        if '__slots__' not in namespace:
+            inherited = {
+                slot
+                for base in bases
+                for c in base.__mro__
+                for slot in c.__dict__.get('__slots__', ())
+            }
+            init = namespace.get('__init__')
+            params = init_params(init) if init is not None else []
+            namespace['__slots__'] = tuple(p.name for p in params if p.name not in inherited)
+        return super().__new__(mcs, name, bases, namespace)
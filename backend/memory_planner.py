@@ -0,0 +1,184 @@
+from itertools import accumulate
+from math import prod
+
+from cost_model import DTYPE_BYTES
+from shape_inference import shape_inference_for, topological_order
+from layers.misc_layers.dropout_layer import DropoutLayer
+
+
+class Tensor:
+    """The activation a layer produces, with its lifetime and arena slot.
+
+    ``start`` and ``end`` are positions in the execution order: the step
+    that writes the tensor and the last step that reads it. A tensor that
+    ``shares`` another layer's buffer (an in-place layer) has no slot of
+    its own and extends the lifetime of that buffer instead.
+    """
+
+    __slots__ = ('layer_id', 'type', 'shape', 'nbytes', 'size', 'start', 'end', 'offset', 'shares')
+
+    def __init__(self, layer_id, type_name, shape, nbytes, size, start):
+        self.layer_id = layer_id
+        self.type = type_name
+        self.shape = shape
+        self.nbytes = nbytes
+        self.size = size
+        self.start = start
+        self.end = start
+        self.offset = None
+        self.shares = None
+
+    def to_dict(self):
+        return {
+            "id": self.layer_id,
+            "type": self.type,
+            "shape": list(self.shape),
+            "bytes": self.nbytes,
+            "offset": self.offset,
+            "start": self.start,
+            "end": self.end,
+            "shares": self.shares,
+        }
+
+
+def _align(nbytes, alignment):
+    return -(-nbytes // alignment) * alignment
+
+
+# Steps per bucket of the index of placed buffers.
+BUCKET_STEPS = 32
+
+
+def best_fit(buffers, steps):
+    """Greedy-by-size placement of ``buffers`` into one arena; returns its size.
+
+    Buffers are placed largest first. Each goes into the smallest gap left
+    between already placed buffers whose lifetimes overlap its own, or on
+    top of them when no gap is big enough. Placed buffers are indexed by
+    buckets of steps, so a lookup only scans buffers live near its own
+    lifetime, and a long-lived buffer (a skip connection) costs one entry
+    per bucket rather than per step.
+    """
+    buckets = [[] for _ in range(steps // BUCKET_STEPS + 1)]
+    arena = 0
+    for buffer in sorted(buffers, key=lambda b: (-b.size, b.start)):
+        start, end = buffer.start, buffer.end
+        touched = range(start // BUCKET_STEPS, end // BUCKET_STEPS + 1)
+        overlapping = {}
+        for bucket in touched:
+            for other in buckets[bucket]:
+                if other.start <= end and other.end >= start:
+                    overlapping[other.layer_id] = other
+        offset, best_gap, top = None, None, 0
+        for other in sorted(overlapping.values(), key=lambda b: b.offset):
+            gap = other.offset - top
+            if gap >= buffer.size and (best_gap is None or gap < best_gap):
+                offset, best_gap = top, gap
+            top = max(top, other.offset + other.size)
+        buffer.offset = top if offset is None else offset
+        arena = max(arena, buffer.offset + buffer.size)
+        for bucket in touched:
+            buckets[bucket].append(buffer)
+    return arena
+
+
+class MemoryPlan:
+    """Static placement of every activation of a forward pass in one arena.
+
+    Built from the execution order and the inferred shapes. A tensor lives
+    from the layer that writes it to the last layer that reads it; network
+    outputs live to the end. Tensors whose lifetimes do not overlap share
+    memory. A DropoutLayer with ``inplace`` writes into its input's buffer
+    when it is the last reader of that input, as PyTorch would. Scratch
+    space inside a layer (im2col columns, attention scores) is not planned.
+    """
+
+    def __init__(self, network, batch_size=1, dtype='float32', alignment=64, inplace=True):
+        if dtype not in DTYPE_BYTES:
+            raise ValueError(f"Unknown dtype: {dtype}")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if alignment < 1:
+            raise ValueError("alignment must be at least 1")
+        self.batch_size = batch_size
+        self.dtype = dtype
+        self.alignment = alignment
+        self.inplace = inplace
+
+        shapes = shape_inference_for(network).update()
+        self.order, _ = topological_order(network)
+        self.tensors = {}
+        self.skipped = []
+        self.inplace_layers = []
+        buffers = {}
+        for position, layer_id in enumerate(self.order):
+            shape = shapes[layer_id]
+            if shape.error is not None or shape.output_shape is None:
+                self.skipped.append(layer_id)
+                continue
+            nbytes = prod(shape.output_shape) * batch_size * DTYPE_BYTES[dtype]
+            tensor = Tensor(layer_id, type(network.layers[layer_id]).__name__, shape.output_shape,
+                            nbytes, _align(nbytes, alignment), position)
+            self.tensors[layer_id] = tensor
+            for connection in network.incoming[layer_id].values():
+                source = self.tensors.get(connection.source.id)
+                if source is not None:
+                    source.end = position
+            buffers[layer_id] = tensor
+
+        last = len(self.order) - 1
+        for layer_id, tensor in self.tensors.items():
+            if not network.outgoing[layer_id]:
+                tensor.end = last
+
+        if inplace:
+            for layer_id, tensor in self.tensors.items():
+                layer = network.layers[layer_id]
+                if not (isinstance(layer, DropoutLayer) and layer.inplace) or len(network.incoming[layer_id]) != 1:
+                    continue
+                source_id = next(iter(network.incoming[layer_id].values())).source.id
+                source = self.tensors.get(source_id)
+                # Overwriting the input is only safe once nobody else reads it.
+                if source is None or source.end != tensor.start or source.nbytes != tensor.nbytes:
+                    continue
+                owner = buffers[source.shares if source.shares is not None else source_id]
+                owner.end = max(owner.end, tensor.end)
+                tensor.shares = owner.layer_id
+                del buffers[layer_id]
+                self.inplace_layers.append(layer_id)
+
+        self.buffers = list(buffers.values())
+        self.arena_bytes = best_fit(self.buffers, len(self.order))
+        for tensor in self.tensors.values():
+            if tensor.shares is not None:
+                tensor.offset = buffers[tensor.shares].offset
+
+        # Bytes live at each step: the lower bound for any placement.
+        change = [0] * (len(self.order) + 1)
+        for buffer in self.buffers:
+            change[buffer.start] += buffer.size
+            change[buffer.end + 1] -= buffer.size
+        live = list(accumulate(change[:-1]))
+        self.peak_bytes = max(live, default=0)
+        self.peak_layer = self.order[live.index(self.peak_bytes)] if live else None
+
+    def to_dict(self):
+        total = sum(t.size for t in self.tensors.values())
+        no_reuse = sum(b.size for b in self.buffers)
+        return {
+            "batch_size": self.batch_size,
+            "dtype": self.dtype,
+            "alignment": self.alignment,
+            "tensors": [self.tensors[i].to_dict() for i in self.order if i in self.tensors],
+            "totals": {
+                "activation_bytes": total,
+                "no_reuse_bytes": no_reuse,
+                "arena_bytes": self.arena_bytes,
+                "peak_live_bytes": self.peak_bytes,
+                "inplace_saved_bytes": total - no_reuse,
+                "reuse_saved_bytes": no_reuse - self.arena_bytes,
+            },
+            "peak_layer": self.peak_layer,
+            "inplace_layers": self.inplace_layers,
+            "skipped": self.skipped,
+        }
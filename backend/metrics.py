@@ -0,0 +1,285 @@
+import cProfile
+import itertools
+import os
+import random
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+# Environ key the app sets to the matched URL rule, so labels stay bounded.
+ROUTE_KEY = 'metrics.route'
+UNMATCHED = 'unmatched'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Prometheus-style histogram: per-bucket counts, sum and count."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, label_names, label_values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{name}_bucket{_labels(label_names, label_values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(label_names, label_values)} {self.sum}")
+        lines.append(f"{name}_count{_labels(label_names, label_values)} {self.count}")
+        return lines
+
+
+class RequestMetrics:
+    """Per-route request latency, request/response sizes and status counts.
+
+    Series are keyed by method and URL rule (``/api/networks/<network_id>``),
+    never by the raw path, so ids cannot blow up the number of series.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.request_size = {}
+        self.response_size = {}
+        self.responses = Counter()
+
+    def observe(self, method, route, status, duration, received, sent):
+        key = (method, route)
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.request_size[key] = Histogram(SIZE_BUCKETS)
+                self.response_size[key] = Histogram(SIZE_BUCKETS)
+            self.latency[key].observe(duration)
+            self.request_size[key].observe(received)
+            self.response_size[key].observe(sent)
+            self.responses[(method, route, status)] += 1
+
+    def render(self, samples=()):
+        """Everything in the Prometheus text format.
+
+        ``samples`` are ``(name, type, help, value)`` taken at scrape time.
+        """
+        lines = []
+        with self._lock:
+            lines += ['# HELP http_requests_total Requests served, by route and status.',
+                      '# TYPE http_requests_total counter']
+            for labels, count in sorted(self.responses.items()):
+                lines.append(f"http_requests_total{_labels(('method', 'route', 'status'), labels)} {count}")
+            for name, help_text, series in (
+                ('http_request_duration_seconds', 'Time from request start to the last byte sent.', self.latency),
+                ('http_request_size_bytes', 'Request body size.', self.request_size),
+                ('http_response_size_bytes', 'Response body size.', self.response_size),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for labels, histogram in sorted(series.items()):
+                    lines += histogram.render(name, ('method', 'route'), labels)
+        for name, kind, help_text, value in samples:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+class _Body:
+    """Response iterable that counts bytes and reports when the server closes it."""
+
+    def __init__(self, iterable, finish):
+        self.iterable = iterable
+        self.finish = finish
+        self.sent = 0
+
+    def __iter__(self):
+        for chunk in self.iterable:
+            self.sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            self.finish(self.sent)
+
+
+class InstrumentedApp:
+    """WSGI middleware feeding RequestMetrics and, if given, a slow-request profiler.
+
+    A request ends when the server closes its response, so streamed bodies
+    count in full. Without a profiler the cost is a few attribute lookups
+    and one locked histogram update per request.
+    """
+
+    def __init__(self, wsgi_app, metrics, profiler=None):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        token = self.profiler.start() if self.profiler is not None else None
+        status = ['500']
+
+        def record_status(status_line, headers, exc_info=None):
+            status[0] = status_line.split(' ', 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        def finish(sent):
+            duration = time.perf_counter() - start
+            method = environ.get('REQUEST_METHOD', '')
+            route = environ.get(ROUTE_KEY) or UNMATCHED
+            try:
+                received = int(environ.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                received = 0
+            self.metrics.observe(method, route, status[0], duration, received, sent)
+            if self.profiler is not None:
+                self.profiler.finish(token, method, route, duration)
+
+        try:
+            iterable = self.wsgi_app(environ, record_status)
+        except BaseException:
+            finish(0)
+            raise
+        return _Body(iterable, finish)
+
+
+class _Profiler:
+    def __init__(self, directory, threshold):
+        self.directory = directory
+        self.threshold = threshold
+        self._sequence = itertools.count()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, method, route, duration, extension):
+        slug = re.sub(r'\W+', '_', route).strip('_') or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{duration * 1000:.0f}ms-{method}-{slug}-{next(self._sequence)}"
+        return os.path.join(self.directory, f"{name}.{extension}")
+
+
+class StackSampler(_Profiler):
+    """Samples the stacks of threads serving requests every ``interval`` seconds.
+
+    One daemon thread reads ``sys._current_frames()`` for the threads that
+    have a request in flight. Requests slower than ``threshold`` get their
+    samples written as collapsed stacks (``frame;frame;frame count``), the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, directory, threshold, interval=0.005):
+        super().__init__(directory, threshold)
+        self.interval = interval
+        self._active = {}
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def start(self):
+        ident = threading.get_ident()
+        samples = Counter()
+        self._active[ident] = samples
+        return ident, samples
+
+    def finish(self, token, method, route, duration):
+        ident, samples = token
+        if self._active.get(ident) is samples:
+            del self._active[ident]
+        if duration < self.threshold or not samples:
+            return
+        with open(self.path(method, route, duration, 'folded'), 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    @staticmethod
+    def _stack(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for ident, samples in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples[self._stack(frame)] += 1
+
+
+class CProfileRecorder(_Profiler):
+    """Runs cProfile over a ``sample_rate`` share of requests.
+
+    Profiles of requests slower than ``threshold`` are written as ``.prof``
+    files for pstats, snakeviz or flameprof. cProfile traces every call,
+    so keep the sample rate low in production.
+    """
+
+    def __init__(self, directory, threshold, sample_rate=1.0):
+        super().__init__(directory, threshold)
+        self.sample_rate = sample_rate
+
+    def start(self):
+        if random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active on this thread.
+            return None
+        return profile
+
+    def finish(self, profile, method, route, duration):
+        if profile is None:
+            return
+        profile.disable()
+        if duration >= self.threshold:
+            profile.dump_stats(self.path(method, route, duration, 'prof'))
+
+
+def create_profiler():
+    """The slow-request profiler configured in the environment, or None.
+
+    Profiling is off unless PROFILE_SLOW_MS sets the threshold. PROFILE_MODE
+    picks ``stacks`` (sampling, the default) or ``cprofile``; PROFILE_DIR,
+    PROFILE_INTERVAL_MS and PROFILE_SAMPLE_RATE tune them.
+    """
+    threshold = os.getenv('PROFILE_SLOW_MS')
+    if not threshold:
+        return None
+    threshold = float(threshold) / 1000
+    directory = os.getenv('PROFILE_DIR') or os.path.join(PROJECT_ROOT, 'profiles')
+    if os.getenv('PROFILE_MODE', 'stacks') == 'cprofile':
+        return CProfileRecorder(directory, threshold, float(os.getenv('PROFILE_SAMPLE_RATE', '1.0')))
+    return StackSampler(directory, threshold, float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000)
@@ -0,0 +1,365 @@
+import os
+import pickle
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from history import NetworkHistory, StoredHistory
+from neural_network import NeuralNetwork
+
+
+class NetworkStore:
+    """Storage for networks shared by every request handler.
+
+    ``mutate`` is the only way to change a network: it yields the network
+    (or None if the id is unknown) with exclusive access and persists it on
+    exit. ``read`` yields it for read-only use alongside other readers,
+    and ``get_network`` returns it without any lock. Every
+    callable in ``hooks`` is run on each network ``mutate`` hands out, to
+    attach listeners that are not persisted with it, and every callable in
+    ``removal_hooks`` with the id of each network ``remove_network`` deletes.
+    """
+
+    def create_network(self) -> str:
+        raise NotImplementedError
+
+    def get_network(self, network_id) -> NeuralNetwork:
+        raise NotImplementedError
+
+    def mutate(self, network_id):
+        raise NotImplementedError
+
+    def read(self, network_id):
+        """Yield the network (or None) for a consistent read-only view."""
+        raise NotImplementedError
+
+    def remove_network(self, network_id):
+        """Delete a network; returns it, or None if the id is unknown."""
+        raise NotImplementedError
+
+    def network_ids(self):
+        raise NotImplementedError
+
+    def stats(self):
+        """``{"networks", "layers", "connections"}`` totals over the store."""
+        raise NotImplementedError
+
+    def __len__(self):
+        return len(self.network_ids())
+
+
+class ReadWriteLock:
+    """Many readers or one writer.
+
+    Writers waiting for the lock hold off new readers, so a steady stream
+    of reads cannot starve them. Both sides are re-entrant per thread, and
+    the thread holding the write side may read too.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = {}
+        self._writer = None
+        self._writes = 0
+        self._waiting_writers = 0
+
+    @contextmanager
+    def shared(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers[me] -= 1
+                if not self._readers[me]:
+                    del self._readers[me]
+                    self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer != me:
+                self._waiting_writers += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._condition.wait()
+                finally:
+                    self._waiting_writers -= 1
+                self._writer = me
+            self._writes += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writes -= 1
+                if not self._writes:
+                    self._writer = None
+                    self._condition.notify_all()
+
+
+class InMemoryNetworkStore(NetworkStore):
+    """Process-local store with one read/write lock per network.
+
+    Allocation and lookup take a short store-wide lock; mutations only hold
+    the lock of the network they touch, so edits to different networks run
+    in parallel, and reads of one network share its lock.
+    """
+
+    def __init__(self):
+        self.hooks = []
+        self.removal_hooks = []
+        self._lock = threading.Lock()
+        self._networks = {}
+        self._network_locks = {}
+        self._next_id = 0
+
+    def create_network(self) -> str:
+        with self._lock:
+            network = NeuralNetwork(str(self._next_id))
+            self._next_id += 1
+            self._networks[network.id] = network
+            self._network_locks[network.id] = ReadWriteLock()
+        return network.id
+
+    def get_network(self, network_id) -> NeuralNetwork:
+        return self._networks.get(str(network_id))
+
+    def _held(self, network_id):
+        network_id = str(network_id)
+        with self._lock:
+            return self._networks.get(network_id), self._network_locks.get(network_id)
+
+    @contextmanager
+    def mutate(self, network_id):
+        network, lock = self._held(network_id)
+        if network is None:
+            yield None
+            return
+        with lock.exclusive():
+            for hook in self.hooks:
+                hook(network)
+            yield network
+
+    @contextmanager
+    def read(self, network_id):
+        network, lock = self._held(network_id)
+        if network is None:
+            yield None
+            return
+        with lock.shared():
+            yield network
+
+    def remove_network(self, network_id):
+        with self._lock:
+            self._network_locks.pop(str(network_id), None)
+            network = self._networks.pop(str(network_id), None)
+        if network is not None:
+            for hook in self.removal_hooks:
+                hook(network.id)
+        return network
+
+    def network_ids(self):
+        with self._lock:
+            return list(self._networks)
+
+    def stats(self):
+        with self._lock:
+            networks = list(self._networks.values())
+        return {
+            "networks": len(networks),
+            "layers": sum(len(network.layers) for network in networks),
+            "connections": sum(len(network.connections) for network in networks),
+        }
+
+
+class SQLiteNetworkStore(NetworkStore):
+    """Store shared by every worker process on one machine.
+
+    The database runs in WAL mode so readers never block the writer.
+    Network ids come from an AUTOINCREMENT key and are never reused, and
+    ``mutate`` runs inside ``BEGIN IMMEDIATE`` so concurrent writers, in any
+    process, apply their changes one after another. Each thread gets its
+    own connection.
+
+    The version history of a network is kept out of its row, as a
+    ``StoredHistory``: a small state row in ``histories`` and one delta per
+    version in ``versions``. Loading or saving a network therefore costs
+    its size plus the change, however long its history.
+    """
+
+    SCHEMA = (
+        '''
+        CREATE TABLE IF NOT EXISTS networks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            revision INTEGER NOT NULL DEFAULT 0,
+            data BLOB,
+            layer_count INTEGER NOT NULL DEFAULT 0,
+            connection_count INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS histories (
+            network_id INTEGER PRIMARY KEY,
+            state BLOB NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS versions (
+            network_id INTEGER NOT NULL,
+            number INTEGER NOT NULL,
+            delta BLOB NOT NULL,
+            PRIMARY KEY (network_id, number)
+        )
+        ''',
+    )
+    SELECT = ('SELECT n.data, h.state FROM networks n LEFT JOIN histories h ON h.network_id = n.id '
+              'WHERE n.id = ?')
+
+    def __init__(self, path, timeout=30.0):
+        self.hooks = []
+        self.removal_hooks = []
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        for statement in self.SCHEMA:
+            connection.execute(statement)
+        columns = {row[1] for row in connection.execute('PRAGMA table_info(networks)')}
+        for column in ('layer_count', 'connection_count'):
+            if column not in columns:
+                connection.execute(f'ALTER TABLE networks ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _load(self, network_id, data, state):
+        network = pickle.loads(data) if data is not None else NeuralNetwork(network_id)
+        if state is not None:
+            StoredHistory(network, lambda: pickle.loads(state),
+                          lambda number: self._load_delta(network_id, number))
+        return network
+
+    def _load_delta(self, network_id, number):
+        row = self._connection().execute(
+            'SELECT delta FROM versions WHERE network_id = ? AND number = ?', (network_id, number)
+        ).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    @staticmethod
+    def _save(connection, network_id, network):
+        # A history written here for the first time (new, or pickled with
+        # the network by earlier versions of this store) goes out whole.
+        histories = [listener for listener in network.listeners if isinstance(listener, NetworkHistory)]
+        for history in histories:
+            dropped, added, state = history.stored_changes()
+            if dropped is None:
+                connection.execute('DELETE FROM versions WHERE network_id = ?', (network_id,))
+            else:
+                connection.executemany('DELETE FROM versions WHERE network_id = ? AND number = ?',
+                                       [(network_id, number) for number in dropped])
+            connection.executemany(
+                'INSERT INTO versions (network_id, number, delta) VALUES (?, ?, ?)',
+                [(network_id, number, pickle.dumps(delta, pickle.HIGHEST_PROTOCOL)) for number, delta in added]
+            )
+            connection.execute('INSERT OR REPLACE INTO histories (network_id, state) VALUES (?, ?)',
+                               (network_id, pickle.dumps(state, pickle.HIGHEST_PROTOCOL)))
+        listeners = network.listeners
+        network.listeners = [listener for listener in listeners if listener not in histories]
+        try:
+            data = pickle.dumps(network, pickle.HIGHEST_PROTOCOL)
+        finally:
+            network.listeners = listeners
+        connection.execute(
+            'UPDATE networks SET data = ?, revision = ?, layer_count = ?, connection_count = ? WHERE id = ?',
+            (data, network.revision, len(network.layers), len(network.connections), network_id)
+        )
+
+    def create_network(self) -> str:
+        cursor = self._connection().execute('INSERT INTO networks (data) VALUES (NULL)')
+        return str(cursor.lastrowid)
+
+    def get_network(self, network_id) -> NeuralNetwork:
+        row = self._connection().execute(self.SELECT, (network_id,)).fetchone()
+        if row is None:
+            return None
+        return self._load(str(network_id), *row)
+
+    @contextmanager
+    def mutate(self, network_id):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(self.SELECT, (network_id,)).fetchone()
+            if row is None:
+                yield None
+            else:
+                network = self._load(str(network_id), *row)
+                for listener in network.listeners:
+                    if isinstance(listener, StoredHistory):
+                        # It must see the network as loaded, before any change.
+                        listener.load()
+                for hook in self.hooks:
+                    hook(network)
+                revision = network.revision
+                yield network
+                if network.revision != revision:
+                    self._save(connection, network_id, network)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    @contextmanager
+    def read(self, network_id):
+        yield self.get_network(network_id)
+
+    def remove_network(self, network_id):
+        network = self.get_network(network_id)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for table, column in (('versions', 'network_id'), ('histories', 'network_id'), ('networks', 'id')):
+                connection.execute(f'DELETE FROM {table} WHERE {column} = ?', (network_id,))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        if network is not None:
+            for hook in self.removal_hooks:
+                hook(network.id)
+        return network
+
+    def network_ids(self):
+        rows = self._connection().execute('SELECT id FROM networks ORDER BY id').fetchall()
+        return [str(row[0]) for row in rows]
+
+    def stats(self):
+        networks, layers, connections = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(layer_count), 0), COALESCE(SUM(connection_count), 0) FROM networks'
+        ).fetchone()
+        return {"networks": networks, "layers": layers, "connections": connections}
+
+
+def create_network_store():
+    """Pick the store from the environment.
+
+    Setting NETWORK_STORE_PATH to a file path shares networks between worker
+    processes through SQLite; otherwise networks live in this process.
+    """
+    path = os.getenv('NETWORK_STORE_PATH')
+    if path:
+        return SQLiteNetworkStore(path)
+    return InMemoryNetworkStore()
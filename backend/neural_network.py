@@ -1,19 +1,171 @@
+import threading
+
 from layers.layer import Layer
+from connection import Connection
 
 
 class NeuralNetwork:
+    """Layers and connections of one network, indexed by id.
+
+    Layer and connection ids come from per-network monotonic counters, so ids
+    are never reused after a removal. ``outgoing`` and ``incoming`` map a layer
+    id to ``{connection_id: Connection}`` for O(1) adjacency lookups in either
+    direction. ``revision`` is bumped by every mutation, and every object in
+    ``listeners`` is told about it through ``layer_added``, ``layer_removed``,
+    ``layer_changed``, ``connection_added`` and ``connection_removed``.
+    Derived state attaches itself through ``listener``, which is safe under
+    the shared lock stores hold for reads.
+    """
+
     def __init__(self, id):
         self.id = id
-        self.layers = []
-        self.connections = []        
-    
+        self.layers = {}
+        self.connections = {}
+        self.outgoing = {}
+        self.incoming = {}
+        self.next_layer_id = 0
+        self.next_connection_id = 0
+        self.revision = 0
+        self.listeners = []
+        self._listener_lock = threading.RLock()
+
+    def listener(self, cls):
+        """The attached listener of type ``cls``, created as ``cls(self)`` on first use."""
+        with self._listener_lock:
+            for listener in self.listeners:
+                if isinstance(listener, cls):
+                    return listener
+            return cls(self)
+
+    def _notify(self, event, item):
+        self.revision += 1
+        for listener in self.listeners:
+            getattr(listener, event)(self, item)
+
+    def _index_layer(self, layer):
+        self.layers[layer.id] = layer
+        self.outgoing[layer.id] = {}
+        self.incoming[layer.id] = {}
+
+    def _index_connection(self, connection):
+        self.connections[connection.id] = connection
+        self.outgoing[connection.source.id][connection.id] = connection
+        self.incoming[connection.target.id][connection.id] = connection
+
     def add_layer(self, layer):
-        self.layers.append(layer)
+        layer.id = self.next_layer_id
+        self.next_layer_id += 1
+        self._index_layer(layer)
+        self._notify('layer_added', layer)
+        return layer.id
 
     def add_connection(self, connection):
-        self.connections.append(connection)
-        
+        connection.id = self.next_connection_id
+        self.next_connection_id += 1
+        self._index_connection(connection)
+        self._notify('connection_added', connection)
+        return connection.id
+
+    def connect(self, source, target):
+        connection = Connection(source, target)
+        self.add_connection(connection)
+        return connection
+
+    def remove_connection(self, connection_id):
+        connection = self.connections.pop(connection_id, None)
+        if connection is None:
+            return None
+        self.outgoing[connection.source.id].pop(connection_id, None)
+        self.incoming[connection.target.id].pop(connection_id, None)
+        self._notify('connection_removed', connection)
+        return connection
+
+    def reroute(self, connection_id, source):
+        """Move the source end of a connection to another layer.
+
+        The connection keeps its id and its position among the target's
+        inputs, which matters for layers whose inputs are ordered.
+        """
+        connection = self.connections[connection_id]
+        old = connection.source
+        del self.outgoing[old.id][connection_id]
+        self._notify('connection_removed', connection)
+        connection.source = source
+        self.outgoing[source.id][connection_id] = connection
+        self._notify('connection_added', connection)
+        return connection
+
+    def remove_layer(self, layer_id):
+        layer = self.layers.get(layer_id)
+        if layer is None:
+            return None
+        for connection_id in list(self.outgoing[layer_id]) + list(self.incoming[layer_id]):
+            self.remove_connection(connection_id)
+        del self.layers[layer_id]
+        del self.outgoing[layer_id]
+        del self.incoming[layer_id]
+        self._notify('layer_removed', layer)
+        return layer
+
+    def replace_layer(self, layer_id, layer):
+        """Swap in a new layer object (e.g. with edited params), keeping id and edges."""
+        old = self.layers[layer_id]
+        layer.id = layer_id
+        for connection in self.outgoing[layer_id].values():
+            connection.source = layer
+        for connection in self.incoming[layer_id].values():
+            connection.target = layer
+        self.layers[layer_id] = layer
+        self._notify('layer_changed', layer)
+        return old
+
+    def restore(self, layers, edges, next_layer_id=0, next_connection_id=0):
+        """Add layers and ``(connection_id, source_id, target_id)`` edges, keeping their ids.
+
+        Layers must already carry their ``id``. The id counters move past
+        every restored id so later additions never collide with them.
+        """
+        for layer in layers:
+            self._index_layer(layer)
+            self._notify('layer_added', layer)
+        for connection_id, source_id, target_id in edges:
+            connection = Connection(self.layers[source_id], self.layers[target_id])
+            connection.id = connection_id
+            self._index_connection(connection)
+            self._notify('connection_added', connection)
+        self.next_layer_id = max(self.next_layer_id, next_layer_id, max(self.layers, default=-1) + 1)
+        self.next_connection_id = max(self.next_connection_id, next_connection_id,
+                                      max(self.connections, default=-1) + 1)
+
     def find_layer(self, id) -> Layer:
-        for l in self.layers:
-            if l.id == id:
-                return l
+        return self.layers.get(id)
+
+    def find_connection(self, id) -> Connection:
+        return self.connections.get(id)
+
+    def successors(self, layer_id):
+        return [c.target for c in self.outgoing.get(layer_id, {}).values()]
+
+    def predecessors(self, layer_id):
+        return [c.source for c in self.incoming.get(layer_id, {}).values()]
+
+    def __getstate__(self):
+        # Connections are stored as an id edge list and rebuilt against the
+        # unpickled layers. Listeners are derived state and rebuilt on
+        # demand, except those marked ``persistent`` (such as the history).
+        return {
+            'id': self.id,
+            'layers': list(self.layers.values()),
+            'connections': [(c.id, c.source.id, c.target.id) for c in self.connections.values()],
+            'next_layer_id': self.next_layer_id,
+            'next_connection_id': self.next_connection_id,
+            'revision': self.revision,
+            'listeners': [listener for listener in self.listeners if getattr(listener, 'persistent', False)],
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state['id'])
+        self.restore(state['layers'], state['connections'],
+                     state['next_layer_id'], state['next_connection_id'])
+        self.revision = state['revision']
+        self.listeners.extend(state.get('listeners', ()))
@@ -0,0 +1,583 @@
+import time
+from math import prod, sqrt
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # optional dependency, only needed to run networks
+    np = None
+
+from shape_inference import shape_inference_for, topological_order
+from layers.layer import expand_tuple, merge_input_shapes
+from layers.misc_layers.input_layer import BaseInputLayer
+from layers.misc_layers.normalization_layer import NormalizationType
+from layers.misc_layers.recurrent_layer import RecurrentType, GATE_COUNT
+from layers.activation_function_layers.pooling_layer import PaddingType, PoolingType
+from pytorch_export import _group_count
+
+EPSILON = 1e-5
+# Largest batch the API will run in one request.
+MAX_BATCH_SIZE = 1024
+PAD_MODES = {'zeros': 'constant', 'replicate': 'edge', 'reflect': 'reflect', 'circular': 'wrap'}
+
+
+class ExecutorError(ValueError):
+    """The network cannot be run, or the inputs given do not fit it."""
+
+
+def numpy_available():
+    return np is not None
+
+
+def _uniform(rng, bound, shape, dtype):
+    return rng.uniform(-bound, bound, shape).astype(dtype)
+
+
+def _windows(x, kernel, stride, dilation):
+    """Strided view of every (dilated) window over the trailing spatial axes.
+
+    ``x`` is ``(N, C, *spatial)``; the result is ``(N, C, *out, *kernel)``
+    and shares memory with ``x``.
+    """
+    ndim = len(kernel)
+    extent = tuple(d * (k - 1) + 1 for k, d in zip(kernel, dilation))
+    windows = sliding_window_view(x, extent, axis=tuple(range(2, 2 + ndim)))
+    index = ((slice(None), slice(None)) + tuple(slice(None, None, s) for s in stride)
+             + tuple(slice(None, None, d) for d in dilation))
+    return windows[index]
+
+
+def _softmax(x, axis=-1):
+    shifted = np.exp(x - x.max(axis=axis, keepdims=True))
+    return shifted / shifted.sum(axis=axis, keepdims=True)
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def build_convolution(layer, input_shapes, output_shape, rng, dtype, training):
+    """im2col + GEMM for 1D/2D/3D, one batched matmul over the groups."""
+    ndim = layer.ndim
+    channels = merge_input_shapes(input_shapes)[0]
+    groups = layer.groups
+    kernel = expand_tuple(layer.kernel_size, ndim)
+    stride = expand_tuple(layer.stride, ndim)
+    padding = expand_tuple(layer.padding, ndim)
+    dilation = expand_tuple(layer.dilation, ndim)
+    fan_in = channels // groups * prod(kernel)
+    bound = 1 / sqrt(fan_in)
+    # Laid out for the GEMM: (groups, Cg * prod(kernel), filters / groups).
+    weight = _uniform(rng, bound, (groups, fan_in, layer.filters // groups), dtype)
+    bias = _uniform(rng, bound, (1, layer.filters) + (1,) * ndim, dtype) if layer.bias else None
+    pad_mode = PAD_MODES[getattr(layer.padding_mode, 'value', layer.padding_mode)]
+    pad_width = ((0, 0), (0, 0)) + tuple((p, p) for p in padding)
+    out = tuple(output_shape[1:])
+    # (N, G, Cg, *out, *k) -> (G, N, *out, Cg, *k)
+    order = (1, 0) + tuple(range(3, 3 + ndim)) + (2,) + tuple(range(3 + ndim, 3 + 2 * ndim))
+    # (G, N, *out, F/G) -> (N, G, F/G, *out)
+    back = (1, 0, 2 + ndim) + tuple(range(2, 2 + ndim))
+
+    def convolution(x):
+        n = x.shape[0]
+        if any(padding):
+            x = np.pad(x, pad_width, mode=pad_mode)
+        windows = _windows(x, kernel, stride, dilation)
+        windows = windows.reshape((n, groups, channels // groups) + out + kernel)
+        columns = windows.transpose(order).reshape(groups, n * prod(out), fan_in)
+        y = np.matmul(columns, weight)
+        y = y.reshape((groups, n) + out + (layer.filters // groups,))
+        y = y.transpose(back).reshape((n, layer.filters) + out)
+        return y + bias if bias is not None else y
+
+    convolution.params = {'weight': weight, 'bias': bias}
+    return convolution
+
+
+def build_pooling(layer, input_shapes, output_shape, rng, dtype, training):
+    shape = merge_input_shapes(input_shapes)
+    ndim = layer.ndim
+    kernel = expand_tuple(layer.kernel_size, ndim)
+    stride = expand_tuple(layer.stride, ndim)
+    dilation = expand_tuple(layer.dilation, ndim)
+    pad_width = [(0, 0), (0, 0)]
+    for size, out, k, s, d in zip(shape[1:], output_shape[1:], kernel, stride, dilation):
+        # Whatever the windows reach past the input: SAME centres it, while
+        # ceil_mode only adds to the end.
+        total = max((out - 1) * s + d * (k - 1) + 1 - size, 0)
+        before = total // 2 if layer.padding == PaddingType.SAME else 0
+        pad_width.append((before, total - before))
+    padded = any(after for _, after in pad_width)
+    axes = tuple(range(-ndim, 0))
+
+    if layer.pooling_type == PoolingType.MAX:
+        def max_pool(x):
+            if padded:
+                x = np.pad(x, pad_width, constant_values=-np.inf)
+            return _windows(x, kernel, stride, dilation).max(axis=axes)
+        return max_pool
+
+    counts = None
+    if padded:
+        # Padding is left out of the average, so divide by the real elements.
+        ones = np.pad(np.ones((1, 1) + tuple(shape[1:]), dtype=dtype), pad_width)
+        counts = _windows(ones, kernel, stride, dilation).sum(axis=axes)
+    window = prod(kernel)
+
+    def average_pool(x):
+        if padded:
+            x = np.pad(x, pad_width)
+            return _windows(x, kernel, stride, dilation).sum(axis=axes) / counts
+        return _windows(x, kernel, stride, dilation).sum(axis=axes) / window
+
+    return average_pool
+
+
+def build_dense(layer, input_shapes, output_shape, rng, dtype, training):
+    in_features = merge_input_shapes(input_shapes)[-1]
+    bound = 1 / sqrt(in_features)
+    weight = _uniform(rng, bound, (in_features, layer.units), dtype)
+    bias = _uniform(rng, bound, (layer.units,), dtype) if layer.bias else None
+
+    def dense(x):
+        y = x @ weight
+        return y + bias if bias is not None else y
+
+    dense.params = {'weight': weight, 'bias': bias}
+    return dense
+
+
+def build_embedding(layer, input_shapes, output_shape, rng, dtype, training):
+    table = rng.standard_normal((layer.num_embeddings, layer.embedding_dim)).astype(dtype)
+    if layer.padding_idx is not None:
+        table[layer.padding_idx] = 0
+
+    def embedding(x):
+        ids = x.astype(np.int64)
+        if ids.size and (ids.min() < 0 or ids.max() >= layer.num_embeddings):
+            raise ExecutorError(f"EmbeddingLayer {layer.id} got ids outside 0..{layer.num_embeddings - 1}")
+        y = table[ids]
+        if layer.max_norm is not None:
+            norms = np.linalg.norm(y, ord=layer.norm_type, axis=-1, keepdims=True)
+            y = y * np.minimum(1, layer.max_norm / np.maximum(norms, 1e-7))
+        return y
+
+    embedding.params = {'table': table}
+    return embedding
+
+
+def build_attention(layer, input_shapes, output_shape, rng, dtype, training):
+    """Multi-head attention on ``(N, sequence, features)``; heads are one batched matmul."""
+    embed_dim, heads = layer.embed_dim, layer.num_heads
+    head_dim = embed_dim // heads
+    kdim = layer.kdim or embed_dim
+    vdim = layer.vdim or embed_dim
+
+    def xavier(fan_in, fan_out):
+        return _uniform(rng, sqrt(6 / (fan_in + fan_out)), (fan_in, fan_out), dtype)
+
+    params = {
+        'w_q': xavier(embed_dim, embed_dim),
+        'w_k': xavier(kdim, embed_dim),
+        'w_v': xavier(vdim, embed_dim),
+        'w_o': _uniform(rng, 1 / sqrt(embed_dim), (embed_dim, embed_dim), dtype),
+    }
+    if layer.bias:
+        # PyTorch starts the projection biases at zero.
+        for name in ('b_q', 'b_k', 'b_v', 'b_o'):
+            params[name] = np.zeros(embed_dim, dtype=dtype)
+    if layer.add_bias_kv:
+        std = sqrt(2 / (1 + embed_dim))
+        params['bias_k'] = (rng.standard_normal((1, 1, embed_dim)) * std).astype(dtype)
+        params['bias_v'] = (rng.standard_normal((1, 1, embed_dim)) * std).astype(dtype)
+    scale = 1 / sqrt(head_dim)
+
+    def project(x, name):
+        y = x @ params['w_' + name]
+        return y + params['b_' + name] if layer.bias else y
+
+    def split(x):
+        n, length, _ = x.shape
+        return x.reshape(n, length, heads, head_dim).transpose(0, 2, 1, 3)
+
+    def attention(inputs):
+        query = inputs[0]
+        key = inputs[1] if len(inputs) > 1 else query
+        value = inputs[2] if len(inputs) > 2 else key
+        n = query.shape[0]
+        q, k, v = split(project(query, 'q')), project(key, 'k'), project(value, 'v')
+        if layer.add_bias_kv:
+            k = np.concatenate([k, np.broadcast_to(params['bias_k'], (n, 1, embed_dim))], axis=1)
+            v = np.concatenate([v, np.broadcast_to(params['bias_v'], (n, 1, embed_dim))], axis=1)
+        k, v = split(k), split(v)
+        if layer.add_zero_attn:
+            pad = np.zeros((n, heads, 1, head_dim), dtype=k.dtype)
+            k, v = np.concatenate([k, pad], axis=2), np.concatenate([v, pad], axis=2)
+        weights = _softmax((q @ k.transpose(0, 1, 3, 2)) * scale)
+        if training and layer.dropout:
+            weights = weights * (rng.random(weights.shape) >= layer.dropout) / (1 - layer.dropout)
+        context = (weights @ v).transpose(0, 2, 1, 3).reshape(n, -1, embed_dim)
+        return project(context, 'o')
+
+    attention.takes_list = True
+    attention.params = params
+    return attention
+
+
+def build_normalization(layer, input_shapes, output_shape, rng, dtype, training):
+    """Normalization in PyTorch's eval mode unless ``training``.
+
+    Fresh running statistics are 0 and 1, so batch norm in eval mode only
+    rescales; with ``training`` it uses the statistics of the batch.
+    """
+    kind = layer.normalization_type
+    shape = merge_input_shapes(input_shapes)
+    rank = len(shape)
+    params = {}
+    if kind == NormalizationType.LAYER_NORMALIZATION:
+        affine_shape = (shape[-1],)
+    elif not kind.name.startswith('INSTANCE'):
+        affine_shape = (shape[0],) + (1,) * (rank - 1)
+    else:
+        affine_shape = None  # affine=False, as in PyTorch
+    if affine_shape is not None:
+        params['weight'] = np.ones(affine_shape, dtype=dtype)
+        params['bias'] = np.zeros(affine_shape, dtype=dtype)
+
+    def standardize(x, axes):
+        mean = x.mean(axis=axes, keepdims=True)
+        return (x - mean) / np.sqrt(x.var(axis=axes, keepdims=True) + EPSILON)
+
+    if kind == NormalizationType.LAYER_NORMALIZATION:
+        def normalize(x):
+            return standardize(x, -1)
+    elif kind == NormalizationType.GROUP_NORMALIZATION:
+        groups = _group_count(shape[0])
+
+        def normalize(x):
+            return standardize(x.reshape((x.shape[0], groups, -1)), -1).reshape(x.shape)
+    elif kind.name.startswith('INSTANCE'):
+        spatial = tuple(range(2, rank + 1))
+
+        def normalize(x):
+            return standardize(x, spatial)
+    else:
+        # Batch norm: per channel over the batch and spatial axes.
+        axes = (0,) + tuple(range(2, rank + 1))
+        eval_scale = dtype(1 / sqrt(1 + EPSILON))
+
+        def normalize(x):
+            return standardize(x, axes) if training else x * eval_scale
+
+    if affine_shape is None:
+        return normalize
+
+    def normalization(x):
+        return normalize(x) * params['weight'] + params['bias']
+
+    normalization.params = params
+    return normalization
+
+
+def build_recurrent(layer, input_shapes, output_shape, rng, dtype, training):
+    """Stacked, optionally bidirectional RNN/GRU/LSTM on ``(N, sequence, features)``.
+
+    The input projections of all time steps are one GEMM per layer and
+    direction; only the hidden-state recurrence is a Python loop.
+    """
+    hidden = layer.hidden_size
+    gates = GATE_COUNT[layer.recurrent_type] * hidden
+    bound = 1 / sqrt(hidden)
+    input_size = merge_input_shapes(input_shapes)[-1]
+    params = {}
+    cells = []
+    for index in range(layer.num_layers):
+        layer_input = input_size if index == 0 else hidden * layer.num_directions
+        directions = []
+        for direction in range(layer.num_directions):
+            # Named like PyTorch's parameters, but transposed for x @ w.
+            suffix = f"_l{index}" + ("_reverse" if direction else "")
+            params['weight_ih' + suffix] = _uniform(rng, bound, (layer_input, gates), dtype)
+            params['weight_hh' + suffix] = _uniform(rng, bound, (hidden, gates), dtype)
+            if layer.bias:
+                params['bias_ih' + suffix] = _uniform(rng, bound, (gates,), dtype)
+                params['bias_hh' + suffix] = _uniform(rng, bound, (gates,), dtype)
+            zeros = np.zeros(gates, dtype)
+            directions.append((params['weight_ih' + suffix], params['weight_hh' + suffix],
+                               params.get('bias_ih' + suffix, zeros), params.get('bias_hh' + suffix, zeros)))
+        cells.append(directions)
+    kind = layer.recurrent_type
+
+    def run_direction(x, w_ih, w_hh, b_ih, b_hh, reverse):
+        n, steps, _ = x.shape
+        projected = x @ w_ih + b_ih
+        h = np.zeros((n, hidden), dtype=x.dtype)
+        c = np.zeros((n, hidden), dtype=x.dtype)
+        outputs = np.empty((n, steps, hidden), dtype=x.dtype)
+        for step in (range(steps - 1, -1, -1) if reverse else range(steps)):
+            recurrent = h @ w_hh + b_hh
+            if kind == RecurrentType.LSTM:
+                z = projected[:, step] + recurrent
+                i, f = _sigmoid(z[:, :hidden]), _sigmoid(z[:, hidden:2 * hidden])
+                g, o = np.tanh(z[:, 2 * hidden:3 * hidden]), _sigmoid(z[:, 3 * hidden:])
+                c = f * c + i * g
+                h = o * np.tanh(c)
+            elif kind == RecurrentType.GRU:
+                x_t = projected[:, step]
+                r = _sigmoid(x_t[:, :hidden] + recurrent[:, :hidden])
+                u = _sigmoid(x_t[:, hidden:2 * hidden] + recurrent[:, hidden:2 * hidden])
+                candidate = np.tanh(x_t[:, 2 * hidden:] + r * recurrent[:, 2 * hidden:])
+                h = (1 - u) * candidate + u * h
+            else:
+                h = np.tanh(projected[:, step] + recurrent)
+            outputs[:, step] = h
+        return outputs
+
+    def recurrent(x):
+        for index, directions in enumerate(cells):
+            if index and training and layer.dropout:
+                x = x * (rng.random(x.shape) >= layer.dropout) / (1 - layer.dropout)
+            outputs = [run_direction(x, *weights, reverse=bool(d)) for d, weights in enumerate(directions)]
+            x = outputs[0] if len(outputs) == 1 else np.concatenate(outputs, axis=-1)
+        return x
+
+    recurrent.params = params
+    return recurrent
+
+
+def build_flattening(layer, input_shapes, output_shape, rng, dtype, training):
+    target = tuple(output_shape)
+    return lambda x: x.reshape((x.shape[0],) + target)
+
+
+def build_dropout(layer, input_shapes, output_shape, rng, dtype, training):
+    p = layer.probability
+    if not training or not p:
+        return lambda x: x
+    return lambda x: x * (rng.random(x.shape) >= p) / (1 - p)
+
+
+def build_leaky_relu(layer, input_shapes, output_shape, rng, dtype, training):
+    alpha = dtype(layer.alpha)
+    return lambda x: np.where(x > 0, x, alpha * x)
+
+
+KERNELS = {
+    'ConvolutionalLayer': build_convolution,
+    'PoolingLayer': build_pooling,
+    'DenseLayer': build_dense,
+    'EmbeddingLayer': build_embedding,
+    'AttentionLayer': build_attention,
+    'NormalizationLayer': build_normalization,
+    'RecurrentLayer': build_recurrent,
+    'FlatteningLayer': build_flattening,
+    'DropoutLayer': build_dropout,
+    'ReLUFunction': lambda *args: lambda x: np.maximum(x, 0),
+    'LeakyReLUFunction': build_leaky_relu,
+    'TanhFunction': lambda *args: np.tanh,
+    'SigmoidFunction': lambda *args: _sigmoid,
+    'IdentityFunction': lambda *args: lambda x: x,
+    'SoftMaxFunction': lambda *args: _softmax,
+    'CustomLayer': lambda *args: lambda x: x,
+}
+
+
+class Step:
+    __slots__ = ('layer_id', 'type', 'sources', 'merge', 'kernel', 'output_shape')
+
+    def __init__(self, layer_id, type_name, sources, merge, kernel, output_shape):
+        self.layer_id = layer_id
+        self.type = type_name
+        self.sources = sources
+        self.merge = merge
+        self.kernel = kernel
+        self.output_shape = output_shape
+
+    @property
+    def params(self):
+        """The kernel's weights by name; None marks a disabled bias."""
+        return getattr(self.kernel, 'params', {})
+
+    def count_params(self):
+        return sum(value.size for value in self.params.values() if value is not None)
+
+
+class ExecutionResult:
+    def __init__(self, outputs, timings, steps):
+        self.outputs = outputs
+        self.timings = timings
+        self.steps = steps
+
+    def to_dict(self, max_values=4096):
+        """Output statistics (and values when small) plus per-layer timings in ms."""
+        outputs = {}
+        for layer_id, value in self.outputs.items():
+            summary = {
+                "shape": list(value.shape),
+                "mean": float(value.mean()) if value.size else None,
+                "std": float(value.std()) if value.size else None,
+                "min": float(value.min()) if value.size else None,
+                "max": float(value.max()) if value.size else None,
+                "finite": bool(np.isfinite(value).all()),
+            }
+            if value.size <= max_values:
+                summary["values"] = value.tolist()
+            outputs[str(layer_id)] = summary
+        layers = [
+            {"id": step.layer_id, "type": step.type, "output_shape": list(step.output_shape),
+             "params": step.count_params(), "ms": round(self.timings[step.layer_id] * 1000, 4)}
+            for step in self.steps
+        ]
+        return {
+            "outputs": outputs,
+            "layers": layers,
+            "total_ms": round(sum(self.timings.values()) * 1000, 4),
+        }
+
+
+class NumpyExecutor:
+    """CPU forward pass of a network on NumPy kernels.
+
+    Kernels and their randomly initialised weights (PyTorch's default
+    schemes, drawn from ``seed``) are built once from the inferred shapes;
+    arrays are batch-first, ``(N,) + per-sample shape``. Attention and
+    recurrent layers take ``(N, sequence, features)`` whatever their
+    ``batch_first`` flag, as in the shape model. Runs in eval mode (no
+    dropout, running statistics) unless ``training``.
+    """
+
+    def __init__(self, network, seed=0, dtype='float32', training=False):
+        if np is None:
+            raise ExecutorError("NumPy is not installed")
+        self.dtype = np.dtype(dtype).type
+        self.training = training
+        self.rng = np.random.default_rng(seed)
+        shapes = shape_inference_for(network).update()
+        order, cyclic = topological_order(network)
+        if cyclic:
+            raise ExecutorError(f"Network has a cycle through layers {sorted(cyclic)}")
+        problems = [f"layer {i}: {shapes[i].error}" for i in order if shapes[i].error]
+        if problems:
+            raise ExecutorError("Cannot run a network with shape errors: " + "; ".join(problems))
+        self.order = order
+
+        self.inputs = {}
+        self.steps = []
+        for layer_id in order:
+            layer = network.layers[layer_id]
+            shape = shapes[layer_id]
+            if isinstance(layer, BaseInputLayer):
+                self.inputs[layer_id] = shape.output_shape
+                continue
+            build = KERNELS.get(type(layer).__name__)
+            if build is None:
+                raise ExecutorError(f"No NumPy kernel for {type(layer).__name__} (layer {layer_id})")
+            kernel = build(layer, shape.input_shapes, shape.output_shape, self.rng, self.dtype, training)
+            sources = [c.source.id for c in network.incoming[layer_id].values()]
+            if getattr(kernel, 'takes_list', False):
+                merge = 'list'
+            elif len(sources) == 1:
+                merge = 'single'
+            elif all(s == shape.input_shapes[0] for s in shape.input_shapes):
+                merge = 'sum'
+            else:
+                merge = 'concat'
+            self.steps.append(Step(layer_id, type(layer).__name__, sources, merge, kernel, shape.output_shape))
+
+        consumers = {}
+        for step in self.steps:
+            for source in step.sources:
+                consumers[source] = consumers.get(source, 0) + 1
+        self.consumers = consumers
+        self.output_ids = [step.layer_id for step in self.steps if step.layer_id not in consumers]
+        # Largest id each input layer may feed, for integer ids into embeddings.
+        self._vocab = {}
+        for layer_id in self.inputs:
+            for connection in network.outgoing[layer_id].values():
+                limit = getattr(connection.target, 'num_embeddings', None)
+                if limit is not None:
+                    self._vocab[layer_id] = min(limit, self._vocab.get(layer_id, limit))
+
+    def random_inputs(self, batch_size=1, seed=None):
+        rng = np.random.default_rng(seed)
+        inputs = {}
+        for layer_id, shape in self.inputs.items():
+            full = (batch_size,) + tuple(shape)
+            if layer_id in self._vocab:
+                inputs[layer_id] = rng.integers(0, self._vocab[layer_id], full).astype(self.dtype)
+            else:
+                inputs[layer_id] = rng.standard_normal(full).astype(self.dtype)
+        return inputs
+
+    def _check_inputs(self, inputs):
+        arrays = {}
+        batch = None
+        for layer_id, shape in self.inputs.items():
+            if layer_id not in inputs:
+                raise ExecutorError(f"Missing input for layer {layer_id}")
+            value = np.asarray(inputs[layer_id], dtype=self.dtype)
+            if value.shape[1:] != tuple(shape):
+                raise ExecutorError(f"Input for layer {layer_id} has shape {list(value.shape)}, "
+                                    f"expected [batch] + {list(shape)}")
+            if batch is not None and value.shape[0] != batch:
+                raise ExecutorError("Inputs disagree on the batch size")
+            batch = value.shape[0]
+            arrays[layer_id] = value
+        return arrays
+
+    def _arena(self, plan, batch_size):
+        """Function copying a layer's result into its slot of a fresh arena."""
+        if plan.order != self.order:
+            raise ExecutorError("The memory plan was made for a different network")
+        if plan.batch_size != batch_size or np.dtype(plan.dtype) != np.dtype(self.dtype):
+            raise ExecutorError(f"The memory plan is for batch {plan.batch_size} of {plan.dtype}, "
+                                f"not batch {batch_size} of {np.dtype(self.dtype).name}")
+        arena = np.empty(plan.arena_bytes, dtype=np.uint8)
+
+        def place(layer_id, value):
+            tensor = plan.tensors[layer_id]
+            slot = arena[tensor.offset:tensor.offset + tensor.nbytes].view(self.dtype).reshape(value.shape)
+            np.copyto(slot, value)
+            return slot
+
+        return place
+
+    def run(self, inputs=None, batch_size=1, seed=None, plan=None):
+        """Forward pass; ``inputs`` maps input layer ids to batch-first arrays.
+
+        With a ``memory_planner.MemoryPlan`` every activation is kept in its
+        planned slot of one preallocated arena, so the plan is exercised
+        for real: overlapping slots would corrupt the outputs.
+        """
+        values = self._check_inputs(inputs) if inputs is not None else self.random_inputs(batch_size, seed)
+        place = None
+        if plan is not None:
+            batch = next(iter(values.values())).shape[0] if values else batch_size
+            place = self._arena(plan, batch)
+            values = {layer_id: place(layer_id, value) for layer_id, value in values.items()}
+        remaining = dict(self.consumers)
+        timings = {}
+        outputs = {}
+        for step in self.steps:
+            start = time.perf_counter()
+            args = [values[source] for source in step.sources]
+            if step.merge == 'list':
+                y = step.kernel(args)
+            elif step.merge == 'single':
+                y = step.kernel(args[0])
+            elif step.merge == 'sum':
+                y = step.kernel(sum(args[1:], args[0]))
+            else:
+                y = step.kernel(np.concatenate(args, axis=1))
+            if place is not None:
+                y = place(step.layer_id, y)
+            timings[step.layer_id] = time.perf_counter() - start
+            values[step.layer_id] = y
+            for source in step.sources:
+                remaining[source] -= 1
+                if remaining[source] == 0:
+                    # Free intermediates as soon as their last consumer ran.
+                    del values[source]
+            if step.layer_id not in self.consumers:
+                outputs[step.layer_id] = y
+        return ExecutionResult(outputs, timings, self.steps)
@@ -0,0 +1,229 @@
+import statistics
+from collections import Counter
+from math import prod
+
+from cost_model import cost_model
+from shape_inference import shape_inference_for, topological_order
+
+WEIGHTS = ('flops', 'training_flops', 'latency')
+
+
+def layer_weights(network, kind='flops', latencies=None):
+    """Integer weight per layer: forward FLOPs, forward + backward FLOPs, or latency in ns.
+
+    ``latencies`` maps layer ids to milliseconds; layers it leaves out
+    weigh nothing.
+    """
+    if kind not in WEIGHTS:
+        raise ValueError(f"Unknown weight: {kind}; expected one of {', '.join(WEIGHTS)}")
+    engine = shape_inference_for(network)
+    shapes = engine.update()
+    problems = [f"layer {i}: {shapes[i].error}" for i in engine.order() if shapes[i].error]
+    if problems:
+        raise ValueError("Cannot analyze a network with shape errors: " + "; ".join(problems))
+    if kind == 'latency':
+        if any(ms < 0 for ms in (latencies or {}).values()):
+            raise ValueError("Latencies cannot be negative")
+        return {layer_id: round((latencies or {}).get(layer_id, 0) * 1e6) for layer_id in network.layers}
+    weights = {}
+    for layer_id, layer in network.layers.items():
+        shape = shapes[layer_id]
+        cost = cost_model.layer_cost(layer, shape.input_shapes, shape.output_shape, 1, 4,
+                                     engine.config_key(layer_id))
+        weights[layer_id] = cost.forward_flops + (cost.backward_flops if kind == 'training_flops' else 0)
+    return weights
+
+
+def measure_latencies(executor, batch_size=1, repeat=3):
+    """Median per-layer time in ms over ``repeat`` forward passes of a ``NumpyExecutor``."""
+    runs = [executor.run(batch_size=batch_size, seed=0).timings for _ in range(repeat)]
+    return {layer_id: statistics.median(run[layer_id] for run in runs) * 1000 for layer_id in runs[0]}
+
+
+def _stages_needed(weights, capacity):
+    stages, load = 1, 0
+    for weight in weights:
+        if load + weight > capacity:
+            stages, load = stages + 1, 0
+        load += weight
+    return stages
+
+
+def partition(weights, devices):
+    """Split the sequence ``weights`` into at most ``devices`` contiguous stages.
+
+    The largest stage is as small as possible: a binary search for the
+    least capacity that greedy filling fits into ``devices`` stages, which
+    is optimal for contiguous splits. Stages are then split further, at
+    their most even point, until every device has one. Returns the
+    ``(start, end)`` index range of each stage.
+    """
+    if not weights:
+        return []
+    low, high = max(weights), sum(weights)
+    while low < high:
+        middle = (low + high) // 2
+        if _stages_needed(weights, middle) <= devices:
+            high = middle
+        else:
+            low = middle + 1
+    bounds, start, load = [], 0, 0
+    for index, weight in enumerate(weights):
+        if load + weight > low:
+            bounds.append((start, index))
+            start, load = index, 0
+        load += weight
+    bounds.append((start, len(weights)))
+
+    while len(bounds) < devices:
+        splittable = [b for b in bounds if b[1] - b[0] > 1]
+        if not splittable:
+            break
+        start, end = max(splittable, key=lambda b: sum(weights[b[0]:b[1]]))
+        total, running, cut, best = sum(weights[start:end]), 0, start + 1, None
+        for index in range(start, end - 1):
+            running += weights[index]
+            imbalance = abs(total - 2 * running)
+            if best is None or imbalance < best:
+                cut, best = index + 1, imbalance
+        position = bounds.index((start, end))
+        bounds[position:position + 1] = [(start, cut), (cut, end)]
+    return bounds
+
+
+class ParallelismAnalysis:
+    """Critical path, concurrency and pipeline stages of a network's DAG.
+
+    With unlimited devices every layer starts as soon as its inputs are
+    done (an ASAP schedule). The critical path is the heaviest chain of
+    layers, the lower bound on the time of one pass. Total work over the
+    critical path bounds the speedup from branch parallelism. Layers at
+    the same depth have no path between them, so the widest depth level
+    is a set of layers that can all run at once.
+    """
+
+    def __init__(self, network, weights):
+        order, cyclic = topological_order(network)
+        if cyclic:
+            raise ValueError(f"Network has a cycle through layers {sorted(cyclic)}")
+        self.network = network
+        self.order = order
+        self.weights = weights
+        self.start = {}
+        self.finish = {}
+        self.depth = {}
+        parent = {}
+        for layer_id in order:
+            start, depth, best = 0, 0, None
+            for connection in network.incoming[layer_id].values():
+                source = connection.source.id
+                depth = max(depth, self.depth[source] + 1)
+                if best is None or self.finish[source] > start:
+                    start, best = self.finish[source], source
+            self.start[layer_id] = start
+            self.finish[layer_id] = start + weights[layer_id]
+            self.depth[layer_id] = depth
+            parent[layer_id] = best
+
+        self.critical_path = []
+        if order:
+            # Weights are never negative, so some output finishes last.
+            layer_id = max((i for i in order if not network.outgoing[i]), key=self.finish.get)
+            while layer_id is not None:
+                self.critical_path.append(layer_id)
+                layer_id = parent[layer_id]
+            self.critical_path.reverse()
+        self.length = max(self.finish.values(), default=0)
+        self.total = sum(weights[i] for i in order)
+
+        # How much later a layer could finish without delaying the pass.
+        tail = {}
+        self.slack = {}
+        for layer_id in reversed(order):
+            tail[layer_id] = max((tail[c.target.id] + weights[c.target.id]
+                                  for c in network.outgoing[layer_id].values()), default=0)
+            self.slack[layer_id] = self.length - self.finish[layer_id] - tail[layer_id]
+
+    def widths(self):
+        return Counter(self.depth.values())
+
+    def max_concurrent(self):
+        """Most layers running at once in the ASAP schedule (layers with weight only)."""
+        events = []
+        for layer_id in self.order:
+            if self.weights[layer_id] > 0:
+                events += [(self.start[layer_id], 1), (self.finish[layer_id], -1)]
+        running = peak = 0
+        for _, change in sorted(events):
+            running += change
+            peak = max(peak, running)
+        return peak
+
+    def stages(self, devices):
+        """Pipeline stages over the topological order, balanced by weight.
+
+        Contiguous runs of a topological order never send tensors
+        backwards, so every stage only receives from earlier stages.
+        """
+        shapes = shape_inference_for(self.network).update()
+        bounds = partition([self.weights[i] for i in self.order], devices)
+        stage_of = {}
+        for number, (start, end) in enumerate(bounds):
+            for layer_id in self.order[start:end]:
+                stage_of[layer_id] = number
+
+        stages = []
+        for number, (start, end) in enumerate(bounds):
+            layers = self.order[start:end]
+            received = {}
+            sent = set()
+            for layer_id in layers:
+                for connection in self.network.incoming[layer_id].values():
+                    source = connection.source.id
+                    if stage_of[source] != number:
+                        received[source] = stage_of[source]
+                for connection in self.network.outgoing[layer_id].values():
+                    if stage_of[connection.target.id] != number:
+                        sent.add(layer_id)
+            stages.append({
+                "stage": number,
+                "layers": layers,
+                "weight": sum(self.weights[i] for i in layers),
+                "params": sum(shapes[i].params for i in layers),
+                "receives": [
+                    {"layer": source, "from_stage": stage, "shape": list(shapes[source].output_shape),
+                     "elements": prod(shapes[source].output_shape)}
+                    for source, stage in sorted(received.items())
+                ],
+                "sends": sorted(sent),
+            })
+        return stages
+
+    def to_dict(self, devices=None):
+        widths = self.widths()
+        result = {
+            "critical_path": self.critical_path,
+            "critical_path_weight": self.length,
+            "total_weight": self.total,
+            "parallelism": round(self.total / self.length, 4) if self.length else None,
+            "max_width": max(widths.values(), default=0),
+            "widest_depth": max(widths, key=lambda depth: (widths[depth], -depth)) if widths else None,
+            "max_concurrent": self.max_concurrent(),
+            "layers": [
+                {"id": i, "weight": self.weights[i], "depth": self.depth[i], "start": self.start[i],
+                 "finish": self.finish[i], "slack": self.slack[i]}
+                for i in self.order
+            ],
+        }
+        if devices:
+            stages = self.stages(devices)
+            bottleneck = max((stage["weight"] for stage in stages), default=0)
+            result["pipeline"] = {
+                "devices": devices,
+                "stages": stages,
+                "bottleneck_weight": bottleneck,
+                # Share of device time spent computing once the pipeline is full.
+                "balance": round(self.total / (devices * bottleneck), 4) if bottleneck else None,
+            }
+        return result
+
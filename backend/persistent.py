@@ -0,0 +1,253 @@
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+class _Missing:
+    """Type of ``MISSING``; pickles by reference, so it stays a singleton."""
+
+    def __reduce__(self):
+        return 'MISSING'
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+class _Node:
+    """Trie node: ``bitmap`` marks which of the 32 child positions are used.
+
+    ``slots`` holds, in bit order, either a ``(key, value)`` pair, a nested
+    ``_Node`` or a ``_Collision``.
+    """
+
+    __slots__ = ('bitmap', 'slots')
+
+    def __init__(self, bitmap, slots):
+        self.bitmap = bitmap
+        self.slots = slots
+
+
+class _Collision:
+    """Pairs whose keys have the same hash."""
+
+    __slots__ = ('hash', 'pairs')
+
+    def __init__(self, hash, pairs):
+        self.hash = hash
+        self.pairs = pairs
+
+
+EMPTY_NODE = _Node(0, ())
+
+
+def _position(bitmap, bit):
+    return (bitmap & (bit - 1)).bit_count()
+
+
+def _replace(node, index, slot):
+    slots = node.slots
+    return _Node(node.bitmap, slots[:index] + (slot,) + slots[index + 1:])
+
+
+def _merge(shift, hash1, slot1, hash2, slot2):
+    """A node holding two slots whose hashes differ."""
+    bit1 = 1 << ((hash1 >> shift) & MASK)
+    bit2 = 1 << ((hash2 >> shift) & MASK)
+    if bit1 == bit2:
+        return _Node(bit1, (_merge(shift + BITS, hash1, slot1, hash2, slot2),))
+    slots = (slot1, slot2) if bit1 < bit2 else (slot2, slot1)
+    return _Node(bit1 | bit2, slots)
+
+
+def _slot_hash(slot):
+    return slot.hash if type(slot) is _Collision else hash(slot[0])
+
+
+def _assoc(node, shift, key_hash, key, value):
+    """``node`` with ``key`` set; returns (node, added). Unchanged nodes are returned as is."""
+    bit = 1 << ((key_hash >> shift) & MASK)
+    index = _position(node.bitmap, bit)
+    if not node.bitmap & bit:
+        slots = node.slots
+        return _Node(node.bitmap | bit, slots[:index] + ((key, value),) + slots[index:]), True
+
+    slot = node.slots[index]
+    kind = type(slot)
+    if kind is _Node:
+        child, added = _assoc(slot, shift + BITS, key_hash, key, value)
+        return (node if child is slot else _replace(node, index, child)), added
+    if kind is _Collision:
+        if slot.hash == key_hash:
+            pairs = [pair for pair in slot.pairs if pair[0] != key]
+            added = len(pairs) == len(slot.pairs)
+            return _replace(node, index, _Collision(key_hash, tuple(pairs) + ((key, value),))), added
+    elif slot[0] == key:
+        if slot[1] is value:
+            return node, False
+        return _replace(node, index, (key, value)), False
+    elif hash(slot[0]) == key_hash:
+        return _replace(node, index, _Collision(key_hash, (slot, (key, value)))), True
+    child = _merge(shift + BITS, _slot_hash(slot), slot, key_hash, (key, value))
+    return _replace(node, index, child), True
+
+
+def _dissoc(node, shift, key_hash, key):
+    """``node`` without ``key`` (None once empty); returns (node, removed)."""
+    bit = 1 << ((key_hash >> shift) & MASK)
+    if not node.bitmap & bit:
+        return node, False
+    index = _position(node.bitmap, bit)
+    slot = node.slots[index]
+    kind = type(slot)
+    if kind is _Node:
+        child, removed = _dissoc(slot, shift + BITS, key_hash, key)
+        if not removed:
+            return node, False
+        if child is not None:
+            # A nested node left with one pair folds back into its parent.
+            if len(child.slots) == 1 and type(child.slots[0]) is not _Node:
+                child = child.slots[0]
+            return _replace(node, index, child), True
+    elif kind is _Collision:
+        pairs = tuple(pair for pair in slot.pairs if pair[0] != key)
+        if len(pairs) == len(slot.pairs):
+            return node, False
+        return _replace(node, index, pairs[0] if len(pairs) == 1 else _Collision(slot.hash, pairs)), True
+    elif slot[0] != key:
+        return node, False
+    if node.bitmap == bit:
+        return None, True
+    slots = node.slots
+    return _Node(node.bitmap & ~bit, slots[:index] + slots[index + 1:]), True
+
+
+def _lookup(node, key_hash, key, default):
+    shift = 0
+    while True:
+        bit = 1 << ((key_hash >> shift) & MASK)
+        if not node.bitmap & bit:
+            return default
+        slot = node.slots[_position(node.bitmap, bit)]
+        kind = type(slot)
+        if kind is _Node:
+            node = slot
+            shift += BITS
+        elif kind is _Collision:
+            for pair_key, value in slot.pairs:
+                if pair_key == key:
+                    return value
+            return default
+        else:
+            return slot[1] if slot[0] == key else default
+
+
+def _pairs(slot):
+    kind = type(slot)
+    if kind is _Node:
+        for child in slot.slots:
+            yield from _pairs(child)
+    elif kind is _Collision:
+        yield from slot.pairs
+    else:
+        yield slot
+
+
+def _diff(old, new):
+    if old is new:
+        return
+    if type(old) is _Node and type(new) is _Node:
+        old_slots, new_slots = old.slots, new.slots
+        bitmap = old.bitmap | new.bitmap
+        while bitmap:
+            bit = bitmap & -bitmap
+            bitmap ^= bit
+            a = old_slots[_position(old.bitmap, bit)] if old.bitmap & bit else None
+            b = new_slots[_position(new.bitmap, bit)] if new.bitmap & bit else None
+            yield from _diff(a, b)
+        return
+    # Different shapes at this position: compare the few pairs below it.
+    before = dict(_pairs(old)) if old is not None else {}
+    after = dict(_pairs(new)) if new is not None else {}
+    for key, value in before.items():
+        other = after.get(key, MISSING)
+        if other is not value and other != value:
+            yield key, value, other
+    for key, value in after.items():
+        if key not in before:
+            yield key, MISSING, value
+
+
+class PersistentMap:
+    """Immutable hash map with structural sharing (a hash array mapped trie).
+
+    ``set`` and ``delete`` return a new map in O(log32 n) that shares every
+    untouched node with the original, so keeping many versions of a large
+    map costs one copy plus the changed paths. ``diff`` skips subtrees the
+    two maps share, making it proportional to the size of the change.
+    """
+
+    __slots__ = ('_root', '_size')
+
+    def __init__(self, items=()):
+        root, size = EMPTY_NODE, 0
+        for key, value in items.items() if isinstance(items, dict) else items:
+            root, added = _assoc(root, 0, hash(key), key, value)
+            size += added
+        self._root = root
+        self._size = size
+
+    @classmethod
+    def _make(cls, root, size):
+        result = cls.__new__(cls)
+        result._root = root
+        result._size = size
+        return result
+
+    def get(self, key, default=None):
+        return _lookup(self._root, hash(key), key, default)
+
+    def __getitem__(self, key):
+        value = _lookup(self._root, hash(key), key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return _lookup(self._root, hash(key), key, MISSING) is not MISSING
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return (key for key, _ in _pairs(self._root))
+
+    def items(self):
+        return _pairs(self._root)
+
+    def values(self):
+        return (value for _, value in _pairs(self._root))
+
+    def set(self, key, value):
+        root, added = _assoc(self._root, 0, hash(key), key, value)
+        if root is self._root:
+            return self
+        return self._make(root, self._size + added)
+
+    def delete(self, key):
+        root, removed = _dissoc(self._root, 0, hash(key), key)
+        if not removed:
+            return self
+        return self._make(root if root is not None else EMPTY_NODE, self._size - 1)
+
+    def diff(self, other):
+        """``(key, old, new)`` for every key whose value differs in ``other``.
+
+        Values are compared by identity, then equality; ``MISSING`` stands
+        for an absent key.
+        """
+        return _diff(self._root, other._root)
+
+    def __repr__(self):
+        return f"PersistentMap({dict(self.items())!r})"
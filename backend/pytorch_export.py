@@ -0,0 +1,280 @@
+import threading
+from collections import OrderedDict
+
+from shape_inference import shape_inference_for, topological_order
+from layers.layer import merge_input_shapes, expand_tuple, ShapeError
+from layers.misc_layers.input_layer import BaseInputLayer
+from layers.misc_layers.normalization_layer import NormalizationType
+from layers.activation_function_layers.pooling_layer import PaddingType, PoolingType
+
+
+class ExportError(ValueError):
+    """The network cannot be turned into a module: it has a cycle or shape errors."""
+
+
+def _tuple(value):
+    if isinstance(value, (list, tuple)):
+        return repr(tuple(value)) if len(value) > 1 else repr(value[0])
+    return repr(value)
+
+
+def _args(*positional, **keywords):
+    """Argument list; keyword values are either pre-formatted source or scalars."""
+    parts = [repr(v) for v in positional]
+    parts += [f"{k}={v}" for k, v in keywords.items()]
+    return ", ".join(parts)
+
+
+def _input_dim(input_shapes, index, fallback):
+    try:
+        return merge_input_shapes(input_shapes)[index]
+    except (ShapeError, IndexError):
+        return fallback
+
+
+def _group_count(channels, limit=32):
+    return max(g for g in range(1, min(channels, limit) + 1) if channels % g == 0)
+
+
+def _padding_mode(value):
+    mode = getattr(value, 'value', value)
+    return 'zeros' if mode in ('zeroes', 0, None) else mode
+
+
+def emit_convolutional(config, input_shapes):
+    ndim = int(config['conv_type'].value[-2])
+    in_channels = _input_dim(input_shapes, 0, config['in_channels'])
+    return f"nn.Conv{ndim}d(" + _args(
+        in_channels, config['filters'],
+        kernel_size=_tuple(expand_tuple(config['kernel_size'], ndim)),
+        stride=_tuple(expand_tuple(config['stride'], ndim)),
+        padding=_tuple(expand_tuple(config['padding'], ndim)),
+        dilation=_tuple(expand_tuple(config['dilation'], ndim)),
+        groups=config['groups'],
+        bias=config['bias'],
+        padding_mode=repr(_padding_mode(config['padding_mode'])),
+    ) + ")"
+
+
+def emit_pooling(config, input_shapes):
+    ndim = int(config['pool_dimension'].value[-2])
+    kernel = expand_tuple(config['kernel_size'], ndim)
+    # PyTorch pools have no SAME mode; (k - 1) // 2 matches it for odd kernels
+    # and for stride == kernel on even input sizes.
+    padding = tuple((k - 1) // 2 for k in kernel) if config['padding'] == PaddingType.SAME else 0
+    if config['pooling_type'] == PoolingType.MAX:
+        return f"nn.MaxPool{ndim}d(" + _args(
+            kernel_size=_tuple(kernel),
+            stride=_tuple(expand_tuple(config['stride'], ndim)),
+            padding=_tuple(padding),
+            dilation=_tuple(config['dilation']),
+            return_indices=config['return_indices'],
+            ceil_mode=config['ceil_mode'],
+        ) + ")"
+    return f"nn.AvgPool{ndim}d(" + _args(
+        kernel_size=_tuple(kernel),
+        stride=_tuple(expand_tuple(config['stride'], ndim)),
+        padding=_tuple(padding),
+        ceil_mode=config['ceil_mode'],
+    ) + ")"
+
+
+def emit_dense(config, input_shapes):
+    in_features = _input_dim(input_shapes, -1, config['in_features'])
+    return f"nn.Linear({_args(in_features, config['units'], bias=config['bias'])})"
+
+
+def emit_flattening(config, input_shapes):
+    return f"nn.Flatten({_args(start_dim=config['start_dim'], end_dim=config['end_dim'])})"
+
+
+def emit_dropout(config, input_shapes):
+    return f"nn.Dropout({_args(p=config['probability'], inplace=config['inplace'])})"
+
+
+def emit_embedding(config, input_shapes):
+    return f"nn.Embedding({_args(config['num_embeddings'], config['embedding_dim'], padding_idx=config['padding_idx'], max_norm=config['max_norm'], norm_type=config['norm_type'], scale_grad_by_freq=config['scale_grad_by_freq'], sparse=config['sparse'])})"
+
+
+def emit_attention(config, input_shapes):
+    return f"nn.MultiheadAttention({_args(config['embed_dim'], config['num_heads'], dropout=config['dropout'], bias=config['bias'], add_bias_kv=config['add_bias_kv'], add_zero_attn=config['add_zero_attn'], kdim=config['kdim'], vdim=config['vdim'], batch_first=config['batch_first'])})"
+
+
+def emit_normalization(config, input_shapes):
+    norm_type = config['normalization_type']
+    channels = _input_dim(input_shapes, 0, 1)
+    if norm_type == NormalizationType.LAYER_NORMALIZATION:
+        return f"nn.LayerNorm({_input_dim(input_shapes, -1, 1)})"
+    if norm_type == NormalizationType.GROUP_NORMALIZATION:
+        return f"nn.GroupNorm({_group_count(channels)}, {channels})"
+    ndim = norm_type.name[-2]
+    kind = 'BatchNorm' if norm_type.name.startswith('BATCH') else 'InstanceNorm'
+    return f"nn.{kind}{ndim}d({channels})"
+
+
+def emit_recurrent(config, input_shapes):
+    input_size = _input_dim(input_shapes, -1, config['input_size'])
+    return f"nn.{config['recurrent_type'].value}({_args(input_size, config['hidden_size'], num_layers=config['num_layers'], bias=config['bias'], batch_first=config['batch_first'], dropout=config['dropout'], bidirectional=config['bidirectional'])})"
+
+
+EMITTERS = {
+    'ConvolutionalLayer': emit_convolutional,
+    'PoolingLayer': emit_pooling,
+    'ReLUFunction': lambda config, input_shapes: "nn.ReLU()",
+    'LeakyReLUFunction': lambda config, input_shapes: f"nn.LeakyReLU({config['alpha']!r})",
+    'TanhFunction': lambda config, input_shapes: "nn.Tanh()",
+    'SoftMaxFunction': lambda config, input_shapes: "nn.Softmax(dim=-1)",
+    'DenseLayer': emit_dense,
+    'FlatteningLayer': emit_flattening,
+    'EmbeddingLayer': emit_embedding,
+    'AttentionLayer': emit_attention,
+    'NormalizationLayer': emit_normalization,
+    'DropoutLayer': emit_dropout,
+    'RecurrentLayer': emit_recurrent,
+    # A custom layer has no definition to export; it passes its input through.
+    'CustomLayer': lambda config, input_shapes: "nn.Identity()  # CustomLayer: passthrough",
+}
+
+# Modules whose forward returns a tuple whose first item is the output.
+TUPLE_OUTPUTS = {'AttentionLayer', 'RecurrentLayer'}
+# Modules with a batch_first flag; forward tensors are always batch-first,
+# so the others get their inputs and output transposed.
+SEQUENCE_LAYERS = {'AttentionLayer', 'RecurrentLayer'}
+
+
+class SnippetCache:
+    """Bounded cache of emitted module expressions.
+
+    Keyed on the layer's config key plus its inferred input shapes, so
+    re-exporting a network only emits the layers that changed.
+    """
+
+    def __init__(self, max_entries=65536):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, layer, input_shapes):
+        key = (layer.config_key(), tuple(input_shapes or ()))
+        with self._lock:
+            snippet = self._entries.get(key)
+            if snippet is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return snippet
+        emitter = EMITTERS.get(type(layer).__name__)
+        if emitter is None:
+            snippet = f"nn.Identity()  # no PyTorch mapping for {type(layer).__name__}"
+        else:
+            snippet = emitter(layer.get_config(), input_shapes or [])
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = snippet
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snippet
+
+
+snippet_cache = SnippetCache()
+
+
+def _call_arguments(layer, sources, input_shapes):
+    """Forward arguments combining the outputs of the upstream layers."""
+    if type(layer).__name__ == 'AttentionLayer':
+        # (query, key, value): self-attention, then key = value, then all three.
+        query = sources[0]
+        key = sources[1] if len(sources) > 1 else query
+        return [query, key, sources[2] if len(sources) > 2 else key]
+    if len(sources) == 1:
+        return sources
+    if input_shapes and all(shape == input_shapes[0] for shape in input_shapes):
+        return [" + ".join(sources)]
+    return [f"torch.cat([{', '.join(sources)}], dim=1)"]
+
+
+def _call(layer_id, layer, sources, input_shapes):
+    arguments = _call_arguments(layer, sources, input_shapes)
+    transpose = type(layer).__name__ in SEQUENCE_LAYERS and not layer.batch_first
+    if transpose:
+        arguments = [f"({argument}).transpose(0, 1)" if " " in argument else f"{argument}.transpose(0, 1)"
+                     for argument in arguments]
+    call = f"self.layer{layer_id}({', '.join(arguments)})"
+    if type(layer).__name__ in TUPLE_OUTPUTS:
+        call += "[0]"
+    return call + ".transpose(0, 1)" if transpose else call
+
+
+def check_exportable(network):
+    """Raise ExportError unless ``network`` is acyclic and free of shape errors.
+
+    Layer sizes in the module come from inferred shapes, and every layer
+    but the inputs must be fed by another, so the same graphs that cannot
+    run cannot be exported.
+    """
+    order, cyclic = topological_order(network)
+    if cyclic:
+        raise ExportError(f"Network has a cycle through layers {sorted(cyclic)}")
+    shapes = shape_inference_for(network).update()
+    problems = [f"layer {i}: {shapes[i].error}" for i in order if shapes[i].error]
+    if problems:
+        raise ExportError("Cannot export a network with shape errors: " + "; ".join(problems))
+
+
+def generate_pytorch(network, class_name="GeneratedNet"):
+    """Yield the source of an nn.Module for ``network`` piece by piece.
+
+    Layers are emitted in topological order; each value in ``forward`` is
+    named after the layer id, so branches and merges are expressed
+    directly rather than as a single chained ``x``. Raises ExportError
+    (see ``check_exportable``) before yielding anything.
+    """
+    check_exportable(network)
+    engine = shape_inference_for(network)
+    shapes = engine.update()
+    order = engine.order()
+    layers = network.layers
+
+    inputs = [i for i in order if isinstance(layers[i], BaseInputLayer)]
+    outputs = [i for i in order if not network.outgoing[i] and i not in inputs]
+
+    yield "import torch\nimport torch.nn as nn\n\n\n"
+    yield f"class {class_name}(nn.Module):\n"
+    yield "    def __init__(self):\n        super().__init__()\n"
+    for layer_id in order:
+        if layer_id in inputs:
+            continue
+        snippet = snippet_cache.get(layers[layer_id], shapes[layer_id].input_shapes)
+        yield f"        self.layer{layer_id} = {snippet}\n"
+
+    args = ", ".join(f"input{i}" for i in inputs) or "x"
+    yield f"\n    def forward(self, {args}):\n"
+    for layer_id in order:
+        layer = layers[layer_id]
+        if layer_id in inputs:
+            continue
+        sources = [
+            f"input{c.source.id}" if c.source.id in inputs else f"x{c.source.id}"
+            for c in network.incoming[layer_id].values()
+        ]
+        yield f"        x{layer_id} = {_call(layer_id, layer, sources, shapes[layer_id].input_shapes)}\n"
+
+    if outputs:
+        yield f"        return {', '.join(f'x{i}' for i in outputs)}\n"
+    else:
+        yield f"        return {args}\n"
+    yield f"\n\nmodel = {class_name}()\n"
+
+
+def stream_pytorch(network, class_name="GeneratedNet", chunk_size=64 * 1024):
+    """``generate_pytorch`` regrouped into chunks of about ``chunk_size`` characters."""
+    buffer, size = [], 0
+    for piece in generate_pytorch(network, class_name):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
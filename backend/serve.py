@@ -0,0 +1,51 @@
+"""Production launcher: serves asgi.application with uvicorn.
+
+Settings come from the command line or, for deployments, the environment
+(HOST, PORT, WEB_CONCURRENCY, KEEP_ALIVE, ASGI_THREADS). Networks live in
+each worker's memory unless NETWORK_STORE_PATH points at a SQLite file,
+so more than one worker needs it.
+
+    python backend/serve.py --workers 4 --keep-alive 15
+    NETWORK_STORE_PATH=/var/tmp/deep_sketch.db WEB_CONCURRENCY=4 python backend/serve.py
+"""
+import argparse
+import os
+import sys
+
+import uvicorn
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.getenv('HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '5001')))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', '1')),
+                        help="worker processes")
+    parser.add_argument('--keep-alive', type=int, default=int(os.getenv('KEEP_ALIVE', '5')),
+                        help="seconds an idle connection stays open")
+    parser.add_argument('--threads', type=int, default=int(os.getenv('ASGI_THREADS', '32')),
+                        help="request threads per worker")
+    parser.add_argument('--log-level', default='warning')
+    args = parser.parse_args()
+    if args.workers > 1 and not os.getenv('NETWORK_STORE_PATH'):
+        parser.error("more than one worker needs NETWORK_STORE_PATH so that workers share networks")
+
+    # Workers import the app themselves, so settings reach them through the environment.
+    os.environ['ASGI_THREADS'] = str(args.threads)
+    sys.path.insert(0, BACKEND_DIR)
+    uvicorn.run(
+        'asgi:application',
+        app_dir=BACKEND_DIR,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_keep_alive=args.keep_alive,
+        log_level=args.log_level,
+        lifespan='on',
+    )
+
+
+if __name__ == '__main__':
+    main()
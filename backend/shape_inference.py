@@ -0,0 +1,206 @@
+import heapq
+import threading
+from collections import deque
+
+
+class LayerShape:
+    """Inferred shapes and costs of one layer (per sample, batch excluded)."""
+
+    __slots__ = ('layer_id', 'input_shapes', 'output_shape', 'params', 'flops', 'error')
+
+    def __init__(self, layer_id, input_shapes=None, output_shape=None, params=0, flops=0, error=None):
+        self.layer_id = layer_id
+        self.input_shapes = input_shapes
+        self.output_shape = output_shape
+        self.params = params
+        self.flops = flops
+        self.error = error
+
+    def to_dict(self):
+        return {
+            "id": self.layer_id,
+            "input_shapes": [list(shape) for shape in self.input_shapes or []],
+            "output_shape": list(self.output_shape) if self.output_shape is not None else None,
+            "params": self.params,
+            "flops": self.flops,
+            "error": self.error,
+        }
+
+
+def topological_order(network):
+    """Kahn's algorithm over the network.
+
+    Returns ``(order, cyclic)`` where ``cyclic`` holds the ids of layers that
+    sit on, or downstream of, a cycle; they are appended to ``order`` last.
+    """
+    in_degree = {layer_id: len(edges) for layer_id, edges in network.incoming.items()}
+    ready = deque(layer_id for layer_id, degree in in_degree.items() if degree == 0)
+    order = []
+    while ready:
+        layer_id = ready.popleft()
+        order.append(layer_id)
+        for connection in network.outgoing[layer_id].values():
+            target_id = connection.target.id
+            in_degree[target_id] -= 1
+            if in_degree[target_id] == 0:
+                ready.append(target_id)
+    cyclic = [layer_id for layer_id, degree in in_degree.items() if degree > 0]
+    return order + cyclic, set(cyclic)
+
+
+class ShapeInference:
+    """Propagates tensor shapes, parameter counts and FLOPs through a network.
+
+    The engine subscribes to the network's mutation events and only marks
+    the layers those events touch as dirty. ``update`` recomputes the dirty
+    layers in topological order and continues downstream only while a
+    layer's output shape or error changes, so one edit costs the size of the
+    affected subgraph rather than the whole model.
+
+    Results are memoized on the layer's config key and input shapes, so the
+    repeated blocks of a model (see ``structural_hash.BlockIndex``) are
+    analyzed once per block structure; every further instance is a lookup.
+
+    Concurrent readers may call ``update`` on the same engine, so bringing
+    it up to date holds an internal lock.
+    """
+
+    MEMO_LIMIT = 65536
+
+    def __init__(self, network):
+        self.network = network
+        self.results = {}
+        self.recomputed = 0
+        self.reused = 0
+        self._keys = {}
+        self._memo = {}
+        self._dirty = set(network.layers)
+        self._order = None
+        self._position = {}
+        self._cyclic = set()
+        self._lock = threading.RLock()
+        network.listeners.append(self)
+
+    # NeuralNetwork listener interface
+
+    def layer_added(self, network, layer):
+        self._order = None
+        self._dirty.add(layer.id)
+
+    def layer_removed(self, network, layer):
+        self._order = None
+        self._dirty.discard(layer.id)
+        self.results.pop(layer.id, None)
+        self._keys.pop(layer.id, None)
+
+    def layer_changed(self, network, layer):
+        self._dirty.add(layer.id)
+        self._keys.pop(layer.id, None)
+
+    def connection_added(self, network, connection):
+        self._order = None
+        self._dirty.add(connection.target.id)
+
+    def connection_removed(self, network, connection):
+        self._order = None
+        self._dirty.add(connection.target.id)
+
+    def order(self):
+        with self._lock:
+            if self._order is None:
+                previous = self._cyclic
+                self._order, self._cyclic = topological_order(self.network)
+                # Layers joining or leaving a cycle change error without any shape changing.
+                self._dirty |= (previous ^ self._cyclic) & set(self.network.layers)
+                self._position = {layer_id: index for index, layer_id in enumerate(self._order)}
+            return self._order
+
+    def config_key(self, layer_id):
+        """``config_key`` of a layer, cached until the layer changes."""
+        key = self._keys.get(layer_id)
+        if key is None:
+            key = self._keys[layer_id] = self.network.layers[layer_id].config_key()
+        return key
+
+    def _analyze(self, layer_id):
+        network = self.network
+        layer = network.layers[layer_id]
+        if layer_id in self._cyclic:
+            return LayerShape(layer_id, error="Layer is part of, or fed by, a cycle")
+
+        input_shapes = []
+        for connection in network.incoming[layer_id].values():
+            upstream = self.results.get(connection.source.id)
+            if upstream is None or upstream.output_shape is None:
+                return LayerShape(layer_id, error=f"Upstream layer {connection.source.id} has no shape")
+            input_shapes.append(upstream.output_shape)
+
+        memo_key = (self.config_key(layer_id), tuple(input_shapes))
+        memo = self._memo.get(memo_key)
+        if memo is not None:
+            self.reused += 1
+            return LayerShape(layer_id, input_shapes, *memo)
+
+        try:
+            output_shape = tuple(layer.compute_output_shape(input_shapes))
+            params = layer.count_params(input_shapes)
+            flops = layer.count_flops(input_shapes, output_shape)
+            memo = (output_shape, params, flops, None)
+        except Exception as e:
+            memo = (None, 0, 0, str(e))
+        if len(self._memo) >= self.MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[memo_key] = memo
+        return LayerShape(layer_id, input_shapes, *memo)
+
+    def update(self):
+        """Bring ``results`` up to date and return it."""
+        with self._lock:
+            self.recomputed = 0
+            self.reused = 0
+            self.order()
+            if not self._dirty:
+                return self.results
+
+            position = self._position
+            heap = [(position[layer_id], layer_id) for layer_id in self._dirty]
+            heapq.heapify(heap)
+            self._dirty.clear()
+            done = set()
+            while heap:
+                _, layer_id = heapq.heappop(heap)
+                if layer_id in done:
+                    continue
+                done.add(layer_id)
+                previous = self.results.get(layer_id)
+                result = self._analyze(layer_id)
+                self.results[layer_id] = result
+                self.recomputed += 1
+                if (previous is None or previous.output_shape != result.output_shape
+                        or previous.error != result.error):
+                    for connection in self.network.outgoing[layer_id].values():
+                        target_id = connection.target.id
+                        if target_id not in done:
+                            heapq.heappush(heap, (position[target_id], target_id))
+            return self.results
+
+    def summary(self):
+        with self._lock:
+            results = self.update()
+            layers = [
+                dict(results[layer_id].to_dict(), type=type(self.network.layers[layer_id]).__name__)
+                for layer_id in self.order()
+            ]
+            return {
+                "layers": layers,
+                "total_params": sum(layer["params"] for layer in layers),
+                "total_flops": sum(layer["flops"] for layer in layers),
+                "errors": sum(1 for layer in layers if layer["error"]),
+                "recomputed": self.recomputed,
+                "reused": self.reused,
+            }
+
+
+def shape_inference_for(network) -> ShapeInference:
+    """The shape engine attached to ``network``, created on first use."""
+    return network.listener(ShapeInference)
@@ -0,0 +1,487 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from array import array
+
+from neural_network import NeuralNetwork
+from layers.layer import jsonable
+from structural_hash import block_index_for
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAGIC = b'NNSNAP'
+VERSION = 2
+JSON_FORMAT = 'nn-snapshot'
+FLAG_COMPRESSED = 1
+
+# magic, version, flags, metadata length
+HEADER = struct.Struct('<6sHHI')
+# layer count, connection count, next layer id, next connection id,
+# type table length, params length, copy count
+BODY_HEADER = struct.Struct('<qqqqIIq')
+# Version 1 bodies had no copies.
+BODY_HEADER_V1 = struct.Struct('<qqqqII')
+# Layer type index of a layer stored as a copy of a template layer.
+COPY = 0xFFFF
+
+
+class SnapshotError(ValueError):
+    """A snapshot is malformed, from an unknown version, or names unknown layer types."""
+
+
+def _ints(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _int_bytes(typecode, values):
+    values = array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def snapshot_metadata(network, name=None):
+    types = {}
+    for layer in network.layers.values():
+        type_name = type(layer).__name__
+        types[type_name] = types.get(type_name, 0) + 1
+    return {
+        "network_id": network.id,
+        "name": name,
+        "revision": network.revision,
+        "saved_at": int(time.time() * 1000),
+        "layer_count": len(network.layers),
+        "connection_count": len(network.connections),
+        "layer_types": types,
+    }
+
+
+def template_copies(network):
+    """Map each layer that repeats a template layer to that layer's id.
+
+    Instances after the first of every ``BlockIndex`` template are matched
+    to the first instance position by position; only layers with the same
+    configuration are mapped, so a copy rebuilds the layer exactly.
+    """
+    copies = {}
+    for template in block_index_for(network).templates():
+        first = [network.layers[layer_id] for layer_id in template.instances[0]]
+        keys = [layer.config_key() for layer in first]
+        for layer_ids in template.instances[1:]:
+            for source, key, layer_id in zip(first, keys, layer_ids):
+                if network.layers[layer_id].config_key() == key:
+                    copies[layer_id] = source.id
+    return copies
+
+
+def dumps(network, name=None, compress=True):
+    """Encode ``network`` in the binary snapshot format.
+
+    Layout (little-endian)::
+
+        header   magic, version, flags, metadata length
+        metadata JSON: ids, counts and a layer-type histogram
+        body     (zlib-compressed when flagged)
+                 counts and id counters, then
+                 type table  JSON list of layer type names
+                 params      JSON, per type: parameter names and one column
+                             of values per name, in layer order
+                 layer ids   int64[layers]
+                 layer types uint16[layers], indexes into the type table,
+                             or COPY
+                 edges       int64[connections] x 3: id, source, target
+                 copies      int64[copies], the layer each COPY layer
+                             repeats, in layer order
+
+    Repeated blocks are stored once: layers of later instances of a
+    template (see ``template_copies``) are COPY entries naming the layer of
+    the first instance they repeat, and have no params. The metadata sits
+    right after the fixed header so listings can read it without touching
+    the body.
+    """
+    copies = template_copies(network)
+    type_names = []
+    type_index = {}
+    columns = []
+    layer_ids = []
+    layer_types = []
+    copy_sources = []
+    for layer in network.layers.values():
+        layer_ids.append(layer.id)
+        source = copies.get(layer.id)
+        if source is not None:
+            layer_types.append(COPY)
+            copy_sources.append(source)
+            continue
+        cls = type(layer)
+        index = type_index.get(cls)
+        if index is None:
+            index = type_index[cls] = len(type_names)
+            type_names.append(cls.__name__)
+            names = cls.config_names()
+            columns.append({"names": list(names), "columns": [[] for _ in names]})
+        table = columns[index]
+        config = layer.get_config()
+        for param, column in zip(table["names"], table["columns"]):
+            column.append(jsonable(config.get(param)))
+        layer_types.append(index)
+
+    connections = network.connections.values()
+    type_table = json.dumps(type_names, separators=(',', ':')).encode()
+    params = json.dumps(columns, separators=(',', ':')).encode()
+    body = b''.join((
+        BODY_HEADER.pack(len(layer_ids), len(connections), network.next_layer_id,
+                         network.next_connection_id, len(type_table), len(params), len(copy_sources)),
+        type_table,
+        params,
+        _int_bytes('q', layer_ids),
+        _int_bytes('H', layer_types),
+        _int_bytes('q', [c.id for c in connections]),
+        _int_bytes('q', [c.source.id for c in connections]),
+        _int_bytes('q', [c.target.id for c in connections]),
+        _int_bytes('q', copy_sources),
+    ))
+    flags = 0
+    if compress:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_COMPRESSED
+    metadata = json.dumps(snapshot_metadata(network, name), separators=(',', ':')).encode()
+    return HEADER.pack(MAGIC, VERSION, flags, len(metadata)) + metadata + body
+
+
+def to_json(network, name=None):
+    """The JSON fallback format, readable without this module."""
+    return {
+        "format": JSON_FORMAT,
+        "version": VERSION,
+        "metadata": snapshot_metadata(network, name),
+        "next_layer_id": network.next_layer_id,
+        "next_connection_id": network.next_connection_id,
+        "layers": [
+            {"id": layer.id, "type": type(layer).__name__, "params": jsonable(layer.get_config())}
+            for layer in network.layers.values()
+        ],
+        "connections": [
+            {"id": c.id, "source": c.source.id, "target": c.target.id}
+            for c in network.connections.values()
+        ],
+    }
+
+
+def read_metadata(data):
+    """Metadata of a snapshot without decoding its graph."""
+    if data[:len(MAGIC)] == MAGIC:
+        _, _, _, length = _header(data)
+        try:
+            metadata = json.loads(bytes(data[HEADER.size:HEADER.size + length]))
+        except ValueError as e:
+            raise SnapshotError(f"Corrupt snapshot metadata: {e}")
+    else:
+        metadata = _json_document(data).get("metadata")
+    if not isinstance(metadata, dict):
+        raise SnapshotError("Snapshot metadata must be an object")
+    return metadata
+
+
+def _header(data):
+    if len(data) < HEADER.size:
+        raise SnapshotError("Truncated snapshot header")
+    header = HEADER.unpack_from(data)
+    if header[1] > VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {header[1]}")
+    return header
+
+
+def _json_document(data):
+    try:
+        document = json.loads(bytes(data))
+    except ValueError as e:
+        raise SnapshotError(f"Not a snapshot: {e}")
+    if not isinstance(document, dict) or document.get("format") != JSON_FORMAT:
+        raise SnapshotError("Not a snapshot")
+    version = document.get("version", 0)
+    if not _is_int(version):
+        raise SnapshotError("Snapshot version must be an integer")
+    if version > VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {document['version']}")
+    return document
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+_slot_names = {}
+
+
+def _copy_layer(source, layer_id):
+    """``source`` under a new id, without revalidating its params.
+
+    Layers are never changed in place (edits replace them), so the copy
+    shares its param values with ``source``.
+    """
+    cls = type(source)
+    names = _slot_names.get(cls)
+    if names is None:
+        names = _slot_names[cls] = tuple(
+            name for klass in cls.__mro__ for name in klass.__dict__.get('__slots__', ())
+            if name not in ('__dict__', '__weakref__', 'id'))
+    layer = cls.__new__(cls)
+    for name in names:
+        try:
+            setattr(layer, name, getattr(source, name))
+        except AttributeError:
+            pass
+    extra = getattr(source, '__dict__', None)
+    if extra:
+        layer.__dict__.update(extra)
+    layer.id = layer_id
+    return layer
+
+
+def _make_layer(layer_types, type_name, params, layer_id):
+    if not isinstance(type_name, str) or not isinstance(params, dict) or not _is_int(layer_id):
+        raise SnapshotError("Malformed layer entry in snapshot")
+    layer_class = layer_types.get(type_name)
+    if layer_class is None:
+        raise SnapshotError(f"Unknown layer type in snapshot: {type_name}")
+    layer = layer_class.from_params(params)
+    layer.id = layer_id
+    return layer
+
+
+def _json_graph(document, layer_types):
+    layers, connections = document.get("layers"), document.get("connections")
+    if not isinstance(layers, list) or not isinstance(connections, list):
+        raise SnapshotError("Snapshot layers and connections must be lists")
+    if not all(isinstance(entry, dict) for entry in layers + connections):
+        raise SnapshotError("Snapshot layers and connections must be objects")
+    edges = [(c.get("id"), c.get("source"), c.get("target")) for c in connections]
+    return [_make_layer(layer_types, entry.get("type"), entry.get("params", {}), entry.get("id"))
+            for entry in layers], edges
+
+
+def _binary_graph(body, layer_types, version):
+    try:
+        if version < 2:
+            counts = BODY_HEADER_V1.unpack_from(body) + (0,)
+            offset = BODY_HEADER_V1.size
+        else:
+            counts = BODY_HEADER.unpack_from(body)
+            offset = BODY_HEADER.size
+        layer_count, connection_count, next_layer_id, next_connection_id, type_length, params_length, \
+            copy_count = counts
+        type_names = json.loads(body[offset:offset + type_length])
+        offset += type_length
+        columns = json.loads(body[offset:offset + params_length])
+        offset += params_length
+    except (struct.error, ValueError) as e:
+        raise SnapshotError(f"Corrupt snapshot body: {e}")
+    if (not isinstance(type_names, list) or not isinstance(columns, list) or len(columns) != len(type_names)
+            or not all(isinstance(table, dict) and isinstance(table.get("names"), list)
+                       and isinstance(table.get("columns"), list)
+                       and len(table["names"]) == len(table["columns"])
+                       and all(isinstance(column, list) for column in table["columns"])
+                       for table in columns)):
+        raise SnapshotError("Corrupt snapshot body: malformed type or params table")
+    if min(layer_count, connection_count, copy_count) < 0:
+        raise SnapshotError("Corrupt snapshot body: negative counts")
+
+    def take(typecode, count):
+        nonlocal offset
+        size = array(typecode).itemsize * count
+        if offset + size > len(body):
+            raise SnapshotError("Corrupt snapshot body: truncated id arrays")
+        values = _ints(typecode, body[offset:offset + size])
+        offset += size
+        return values
+
+    layer_ids = take('q', layer_count)
+    type_indexes = take('H', layer_count)
+    connection_ids = take('q', connection_count)
+    sources = take('q', connection_count)
+    targets = take('q', connection_count)
+    copy_sources = take('q', copy_count)
+
+    rows = [0] * len(type_names)
+    layers = []
+    made = {}
+    copies = []
+    for layer_id, index in zip(layer_ids, type_indexes):
+        if index == COPY and version >= 2:
+            copies.append(len(layers))
+            layers.append(None)
+            continue
+        if index >= len(type_names):
+            raise SnapshotError(f"Corrupt snapshot body: type index {index} out of range")
+        table = columns[index]
+        row = rows[index]
+        rows[index] += 1
+        if any(row >= len(column) for column in table["columns"]):
+            raise SnapshotError("Corrupt snapshot body: params table is too short")
+        params = {name: column[row] for name, column in zip(table["names"], table["columns"])}
+        layer = made[layer_id] = _make_layer(layer_types, type_names[index], params, layer_id)
+        layers.append(layer)
+
+    if len(copies) != len(copy_sources):
+        raise SnapshotError("Corrupt snapshot body: copy count does not match the layer types")
+    for position, source_id in zip(copies, copy_sources):
+        # Only layers stored with params can be copied, so copies never chain.
+        source = made.get(source_id)
+        if source is None:
+            raise SnapshotError(f"Layer {layer_ids[position]} copies unknown layer {source_id}")
+        layers[position] = _copy_layer(source, layer_ids[position])
+    edges = list(zip(connection_ids, sources, targets))
+    return layers, edges, (next_layer_id, next_connection_id)
+
+
+def _check_graph(layers, edges, next_ids):
+    layer_ids = {layer.id for layer in layers}
+    if len(layer_ids) != len(layers):
+        raise SnapshotError("Snapshot has duplicate layer ids")
+    connection_ids = set()
+    for edge in edges:
+        if not all(_is_int(value) for value in edge):
+            raise SnapshotError("Malformed connection entry in snapshot")
+        connection_id, source, target = edge
+        if source not in layer_ids or target not in layer_ids:
+            raise SnapshotError(f"Connection {connection_id} names an unknown layer")
+        if connection_id in connection_ids:
+            raise SnapshotError("Snapshot has duplicate connection ids")
+        connection_ids.add(connection_id)
+    if not all(_is_int(value) for value in next_ids):
+        raise SnapshotError("Snapshot id counters must be integers")
+
+
+def loads(data, layer_types, network=None):
+    """Decode a binary or JSON snapshot into ``network``, or a new NeuralNetwork.
+
+    Params go through each class's ``from_params``, so snapshots written by
+    an older schema are validated like any other input. Layer and
+    connection ids are kept as saved, so ``network`` should be empty.
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        document = _json_document(data)
+        metadata = document.get("metadata")
+        layers, edges = _json_graph(document, layer_types)
+        next_ids = (document.get("next_layer_id", 0), document.get("next_connection_id", 0))
+    else:
+        _, version, flags, length = _header(data)
+        metadata = read_metadata(data)
+        body = data[HEADER.size + length:]
+        try:
+            body = zlib.decompress(body) if flags & FLAG_COMPRESSED else bytes(body)
+        except zlib.error as e:
+            raise SnapshotError(f"Corrupt snapshot body: {e}")
+        layers, edges, next_ids = _binary_graph(body, layer_types, version)
+    if not isinstance(metadata, dict):
+        raise SnapshotError("Snapshot metadata must be an object")
+    _check_graph(layers, edges, next_ids)
+
+    if network is None:
+        network = NeuralNetwork(metadata.get("network_id"))
+    network.restore(layers, edges, *next_ids)
+    return network
+
+
+class SnapshotStore:
+    """Snapshot files in one directory.
+
+    Listing reads only each file's metadata through a memory map, and caches
+    it per (size, mtime), so listing thousands of snapshots decodes no
+    graphs and re-reads only files that changed.
+    """
+
+    EXTENSIONS = {'.nns': 'binary', '.json': 'json'}
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._metadata = {}
+        self._lock = threading.Lock()
+
+    def _path(self, snapshot_id):
+        for extension in self.EXTENSIONS:
+            path = os.path.join(self.directory, snapshot_id + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def save(self, network, name=None, format='binary'):
+        if format not in ('binary', 'json'):
+            raise ValueError(f"Unknown snapshot format: {format}")
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_id = uuid.uuid4().hex[:16]
+        if format == 'json':
+            data = json.dumps(to_json(network, name), separators=(',', ':')).encode()
+            path = os.path.join(self.directory, snapshot_id + '.json')
+        else:
+            data = dumps(network, name)
+            path = os.path.join(self.directory, snapshot_id + '.nns')
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        return dict(read_metadata(data), id=snapshot_id, format=format, size=len(data))
+
+    def _file_metadata(self, path, snapshot_id, extension):
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._metadata.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                metadata = read_metadata(data)
+        metadata = dict(metadata, id=snapshot_id, format=self.EXTENSIONS[extension], size=stat.st_size)
+        with self._lock:
+            self._metadata[path] = (key, metadata)
+        return metadata
+
+    def list(self, network_id=None):
+        if not os.path.isdir(self.directory):
+            return []
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            snapshot_id, extension = os.path.splitext(entry.name)
+            if extension not in self.EXTENSIONS or entry.stat().st_size == 0:
+                continue
+            try:
+                metadata = self._file_metadata(entry.path, snapshot_id, extension)
+            except (OSError, SnapshotError, ValueError):
+                continue
+            if network_id is None or metadata.get("network_id") == network_id:
+                snapshots.append(metadata)
+        snapshots.sort(key=lambda m: m.get("saved_at", 0), reverse=True)
+        return snapshots
+
+    def read(self, snapshot_id):
+        """Raw bytes of a snapshot, or None."""
+        path = self._path(snapshot_id) if snapshot_id.isalnum() else None
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def load(self, snapshot_id, layer_types, network=None):
+        path = self._path(snapshot_id) if snapshot_id.isalnum() else None
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return loads(data, layer_types, network)
+
+
+def create_snapshot_store():
+    directory = os.getenv('SNAPSHOT_DIR') or os.path.join(PROJECT_ROOT, 'snapshots')
+    return SnapshotStore(directory)
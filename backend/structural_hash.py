@@ -0,0 +1,257 @@
+from collections import defaultdict
+from hashlib import blake2b
+
+from shape_inference import topological_order, shape_inference_for
+from layers.layer import jsonable
+
+# Stands for a layer outside the subgraph being hashed.
+EXTERNAL = -1
+
+
+def digest(value):
+    """64-bit digest of a config key or a tuple of digests.
+
+    Unlike ``hash()``, which Python salts per process, it is the same in
+    every worker and across restarts, so template hashes can be stored and
+    compared between processes.
+    """
+    return int.from_bytes(blake2b(repr(value).encode(), digest_size=8).digest(), 'little')
+
+
+def _key_digests(keys):
+    """``digest`` of each config key, computed once per distinct key."""
+    cache = {}
+    result = {}
+    for layer_id, key in keys.items():
+        value = cache.get(key)
+        if value is None:
+            value = cache[key] = digest(key)
+        result[layer_id] = value
+    return result
+
+
+def upstream_signatures(network, order=None, keys=None):
+    """Merkle-style hash of every layer over its config and its inputs.
+
+    A layer's signature covers its type, its params and, in input order, the
+    signatures of the layers feeding it, so two layers share a signature
+    when the whole subgraph above them is the same. Inputs that close a
+    cycle count as unknown. ``keys`` may hold precomputed config keys.
+    """
+    if order is None:
+        order, _ = topological_order(network)
+    if keys is None:
+        keys = {layer_id: layer.config_key() for layer_id, layer in network.layers.items()}
+    key_digests = _key_digests(keys)
+    signatures = {}
+    for layer_id in order:
+        inputs = tuple(signatures.get(c.source.id, 0) for c in network.incoming[layer_id].values())
+        signatures[layer_id] = digest((key_digests[layer_id], inputs))
+    return signatures
+
+
+def subgraph_hash(network, layer_ids, key_digests=None):
+    """Canonical hash of the subgraph induced by ``layer_ids`` (in topological order).
+
+    The same Merkle hash as ``upstream_signatures``, but every input from
+    outside the subgraph counts as ``EXTERNAL``, so the hash depends only
+    on the block's own layers and wiring, not on where it sits or on ids.
+    Returns ``(hash, local)`` with the per-layer local hashes.
+    ``key_digests`` may hold precomputed ``digest``s of the config keys.
+    """
+    members = set(layer_ids)
+    local = {}
+    for layer_id in layer_ids:
+        key = (key_digests[layer_id] if key_digests is not None
+               else digest(network.layers[layer_id].config_key()))
+        inputs = tuple(
+            local.get(c.source.id, 0) if c.source.id in members else EXTERNAL
+            for c in network.incoming[layer_id].values()
+        )
+        local[layer_id] = digest((key, inputs))
+    return digest(tuple(sorted(local.values()))), local
+
+
+def cut_points(network, order):
+    """Positions in ``order`` that every path across them goes through.
+
+    Layer ``i`` is a cut point when no edge jumps from before it to after
+    it. In a stack of blocks these are the layers between blocks, while a
+    residual connection keeps its whole block free of cut points. Edges to
+    layers left out of ``order`` (such as the layers of a cycle) are
+    ignored.
+    """
+    position = {layer_id: index for index, layer_id in enumerate(order)}
+    cuts = []
+    reach = -1
+    for index, layer_id in enumerate(order):
+        if reach <= index:
+            cuts.append(index)
+        for connection in network.outgoing[layer_id].values():
+            target = position.get(connection.target.id, -1)
+            if target > reach:
+                reach = target
+    return cuts
+
+
+class Template:
+    """One block structure and every place it occurs.
+
+    ``layers`` are the first instance's layers in canonical order and
+    ``edges`` the block's wiring as ``(source, target)`` local indexes, with
+    ``EXTERNAL`` for the layer feeding the block. Each instance lists its
+    layer ids in the same canonical order.
+    """
+
+    def __init__(self, key, network, layer_ids, edges):
+        self.key = key
+        self.network = network
+        self.edges = edges
+        self.instances = [layer_ids]
+
+    @property
+    def layers(self):
+        return [self.network.layers[layer_id] for layer_id in self.instances[0]]
+
+    def to_dict(self, shapes=None):
+        result = {
+            "hash": format(self.key, '016x'),
+            "size": len(self.instances[0]),
+            "layers": [{"type": type(layer).__name__, "params": jsonable(layer.get_config())}
+                       for layer in self.layers],
+            "edges": [list(edge) for edge in self.edges],
+            "instances": [list(layer_ids) for layer_ids in self.instances],
+        }
+        if shapes is not None:
+            first = [shapes.get(layer_id) for layer_id in self.instances[0]]
+            if all(shape is not None and shape.error is None for shape in first):
+                result["params_per_instance"] = sum(shape.params for shape in first)
+                result["flops_per_instance"] = sum(shape.flops for shape in first)
+        return result
+
+
+class BlockIndex:
+    """Repeated blocks of a network, kept as templates plus instances.
+
+    The network is cut into segments at its cut points, each segment gets a
+    canonical subgraph hash, and runs of segments that repeat back to back
+    (a stack of encoder layers, the blocks of a ResNet stage) become one
+    template. Multi-layer segments that recur elsewhere are templates too.
+    Recomputed lazily, in linear time, after the network changes.
+    """
+
+    def __init__(self, network, min_layers=2, max_period=16):
+        self.network = network
+        self.min_layers = min_layers
+        self.max_period = max_period
+        self._templates = None
+        network.listeners.append(self)
+
+    # NeuralNetwork listener interface
+
+    def _invalidate(self, network, item):
+        self._templates = None
+
+    layer_added = layer_removed = layer_changed = _invalidate
+    connection_added = connection_removed = _invalidate
+
+    def _segments(self):
+        network = self.network
+        order, cyclic = topological_order(network)
+        order = [layer_id for layer_id in order if layer_id not in cyclic]
+        keys = _key_digests({layer_id: network.layers[layer_id].config_key() for layer_id in order})
+        cuts = cut_points(network, order)
+        bounds = [0] + [cut + 1 for cut in cuts if cut + 1 < len(order)] + [len(order)]
+        segments = []
+        for start, end in zip(bounds, bounds[1:]):
+            layer_ids = order[start:end]
+            key, local = subgraph_hash(network, layer_ids, keys)
+            # Canonical order: by local hash, ties in topological order.
+            canonical = sorted(layer_ids, key=lambda i, rank={i: n for n, i in enumerate(layer_ids)}:
+                               (local[i], rank[i]))
+            segments.append((key, canonical))
+        return segments
+
+    def _edges(self, layer_ids):
+        index = {layer_id: n for n, layer_id in enumerate(layer_ids)}
+        edges = []
+        for layer_id in layer_ids:
+            for connection in self.network.incoming[layer_id].values():
+                edges.append((index.get(connection.source.id, EXTERNAL), index[layer_id]))
+        return sorted(edges)
+
+    def _add(self, templates, key, layer_ids):
+        edges = self._edges(layer_ids)
+        template = templates.get(key)
+        if template is None:
+            templates[key] = Template(key, self.network, layer_ids, edges)
+        elif template.edges == edges:
+            # Hash ties between symmetric layers could pick a different
+            # order; only instances whose wiring lines up are kept.
+            template.instances.append(layer_ids)
+
+    def templates(self):
+        if self._templates is not None:
+            return self._templates
+        segments = self._segments()
+        hashes = [key for key, _ in segments]
+        sizes = [0]
+        for _, layer_ids in segments:
+            sizes.append(sizes[-1] + len(layer_ids))
+        templates = {}
+        covered = [False] * len(segments)
+        index = 0
+        while index < len(segments):
+            best = None
+            for period in range(1, min(self.max_period, (len(segments) - index) // 2) + 1):
+                if hashes[index + period] != hashes[index]:
+                    continue
+                window = hashes[index:index + period]
+                repeats = 1
+                while hashes[index + repeats * period:index + (repeats + 1) * period] == window:
+                    repeats += 1
+                size = sizes[index + period] - sizes[index]
+                if repeats > 1 and size >= self.min_layers and (best is None or repeats * period > best[0] * best[1]):
+                    best = (repeats, period)
+            if best is None:
+                index += 1
+                continue
+            repeats, period = best
+            key = digest(tuple(hashes[index:index + period]))
+            for n in range(repeats):
+                start = index + n * period
+                layer_ids = [i for segment in segments[start:start + period] for i in segment[1]]
+                self._add(templates, key, layer_ids)
+                covered[start:start + period] = [True] * period
+            index += repeats * period
+
+        leftovers = defaultdict(list)
+        for n, (key, layer_ids) in enumerate(segments):
+            if not covered[n] and len(layer_ids) >= self.min_layers:
+                leftovers[key].append(layer_ids)
+        for key, instances in leftovers.items():
+            if len(instances) > 1:
+                for layer_ids in instances:
+                    self._add(templates, digest((key,)), layer_ids)
+
+        self._templates = [t for t in templates.values() if len(t.instances) > 1]
+        return self._templates
+
+    def summary(self):
+        templates = self.templates()
+        shapes = shape_inference_for(self.network).update()
+        templated = sum(len(t.instances) * len(t.instances[0]) for t in templates)
+        stored = sum(len(t.instances[0]) for t in templates)
+        layer_count = len(self.network.layers)
+        return {
+            "layer_count": layer_count,
+            "templated_layers": templated,
+            # Layers left to store when each template is kept once.
+            "unique_layers": layer_count - templated + stored,
+            "templates": [template.to_dict(shapes) for template in templates],
+        }
+
+
+def block_index_for(network) -> BlockIndex:
+    """The block index attached to ``network``, created on first use."""
+    return network.listener(BlockIndex)
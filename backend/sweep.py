@@ -0,0 +1,206 @@
+import math
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from cost_model import DTYPE_BYTES, cost_model
+from memory_planner import MemoryPlan
+from neural_network import NeuralNetwork
+from shape_inference import shape_inference_for
+from layers.layer import Layer
+from layers.misc_layers.input_layer import ImageInputLayer, TextInputLayer, AudioInputLayer
+
+# Grid points one request may ask for.
+MAX_POINTS = 20000
+COLUMNS = ('batch_size', 'resolution', 'params', 'param_bytes', 'gradient_bytes', 'activation_bytes',
+           'arena_bytes', 'training_memory_bytes', 'forward_flops', 'backward_flops', 'error')
+
+
+def _resize_image(shape, resolution):
+    return shape[:-2] + (resolution, resolution)
+
+
+def _resize_last(shape, resolution):
+    return shape[:-1] + (resolution,)
+
+
+# How the resolution axis applies to each input type: images get
+# resolution x resolution pixels, text that many tokens, audio that many
+# samples per channel.
+RESIZERS = {
+    ImageInputLayer: _resize_image,
+    TextInputLayer: _resize_last,
+    AudioInputLayer: _resize_last,
+}
+
+
+def parse_range(name, value):
+    """A list of positive ints, or ``{"start", "stop"}`` with a ``step`` or a ``factor``."""
+    if isinstance(value, dict):
+        start, stop = value.get('start'), value.get('stop')
+        step, factor = value.get('step'), value.get('factor')
+        if not all(isinstance(v, int) and v > 0 for v in (start, stop)) or start > stop:
+            raise ValueError(f"{name} needs positive integers start <= stop")
+        if factor is not None:
+            if not isinstance(factor, (int, float)) or factor <= 1:
+                raise ValueError(f"{name} factor must be greater than 1")
+            if math.log(stop / start) / math.log(factor) >= 10 * MAX_POINTS:
+                # Steps that round to an existing value add nothing, so the
+                # value check below alone would not bound the loop.
+                raise ValueError(f"{name} factor is too close to 1")
+            values = []
+            current = start
+            while current <= stop:
+                if not values or round(current) != values[-1]:
+                    values.append(round(current))
+                    if len(values) > MAX_POINTS:
+                        raise ValueError(f"{name} has more than {MAX_POINTS} values")
+                current *= factor
+            return values
+        step = 1 if step is None else step
+        if not isinstance(step, int) or step < 1:
+            raise ValueError(f"{name} step must be a positive integer")
+        if (stop - start) // step >= MAX_POINTS:
+            raise ValueError(f"{name} has more than {MAX_POINTS} values")
+        return list(range(start, stop + 1, step))
+    if isinstance(value, list) and value and all(isinstance(v, int) and not isinstance(v, bool) and v > 0
+                                                 for v in value):
+        return sorted(set(value))
+    raise ValueError(f"{name} must be a list of positive integers or a start/stop range")
+
+
+def sweepable_inputs(network):
+    return [layer for layer in network.layers.values()
+            if type(layer) in RESIZERS and layer.input_shape is not None]
+
+
+def resize_inputs(network, resolution):
+    """Give every image, text and audio input layer ``resolution``."""
+    for layer in sweepable_inputs(network):
+        shape = RESIZERS[type(layer)](tuple(layer.input_shape), resolution)
+        if shape != tuple(layer.input_shape):
+            network.replace_layer(layer.id, type(layer)(input_shape=list(shape)))
+
+
+def evaluate(network, resolution, batch_sizes, dtype):
+    """Table rows of ``network`` as it is now, one per batch size.
+
+    Everything but sparse embedding gradients is linear in the batch, so
+    the per-sample costs and the arena (planned unaligned, which makes it
+    scale exactly) are computed once and multiplied out.
+    """
+    engine = shape_inference_for(network)
+    shapes = engine.update()
+    errors = [f"layer {i}: {shapes[i].error}" for i in engine.order() if shapes[i].error]
+    if errors:
+        return [[batch, resolution] + [None] * (len(COLUMNS) - 3) + [errors[0]] for batch in batch_sizes]
+
+    dtype_bytes = DTYPE_BYTES[dtype]
+    params = activation = forward = backward = fixed_gradients = 0
+    batch_dependent = []
+    for layer_id in engine.order():
+        shape = shapes[layer_id]
+        layer = network.layers[layer_id]
+        cost = cost_model.layer_cost(layer, shape.input_shapes, shape.output_shape, 1, dtype_bytes,
+                                     engine.config_key(layer_id))
+        params += cost.params
+        activation += cost.activation_bytes_per_sample
+        forward += cost.forward_flops
+        backward += cost.backward_flops
+        if type(layer).count_gradient_params is Layer.count_gradient_params:
+            fixed_gradients += cost.gradient_bytes
+        else:
+            batch_dependent.append((layer, shape.input_shapes))
+    arena = MemoryPlan(network, 1, dtype, alignment=1).arena_bytes
+
+    rows = []
+    for batch in batch_sizes:
+        gradients = fixed_gradients + sum(layer.count_gradient_params(input_shapes, batch)
+                                          for layer, input_shapes in batch_dependent) * dtype_bytes
+        param_bytes = params * dtype_bytes
+        rows.append([batch, resolution, params, param_bytes, gradients, activation * batch, arena * batch,
+                     param_bytes + gradients + activation * batch, forward * batch, backward * batch, None])
+    return rows
+
+
+def evaluate_resolutions(payload, resolutions, batch_sizes, dtype):
+    """Rows for a run of resolutions; the process pool's unit of work.
+
+    ``payload`` is a ``Sweep.prepare`` snapshot. Consecutive resolutions
+    reuse one copy, so each only re-infers the layers whose input shapes
+    change and the cost model's cache serves every layer that stays the
+    same.
+    """
+    layers, edges = pickle.loads(payload)
+    network = NeuralNetwork('sweep')
+    network.restore(layers, edges)
+    rows = []
+    for resolution in resolutions:
+        if resolution is not None:
+            resize_inputs(network, resolution)
+        rows.extend(evaluate(network, resolution, batch_sizes, dtype))
+    return rows
+
+
+class Sweep:
+    """Params, FLOPs and memory of a network over a batch x resolution grid.
+
+    Resolutions are split into contiguous runs evaluated on a process pool
+    of SWEEP_WORKERS processes (the CPU count by default); with one worker
+    or one run everything stays in this process.
+    """
+
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    def __init__(self, batch_sizes, resolutions=None, dtype='float32'):
+        if dtype not in DTYPE_BYTES:
+            raise ValueError(f"Unknown dtype: {dtype}")
+        self.batch_sizes = parse_range('batch_sizes', batch_sizes)
+        self.resolutions = parse_range('resolutions', resolutions) if resolutions is not None else None
+        self.dtype = dtype
+        points = len(self.batch_sizes) * len(self.resolutions or [None])
+        if points > MAX_POINTS:
+            raise ValueError(f"The grid has {points} points; the limit is {MAX_POINTS}")
+
+    @staticmethod
+    def workers():
+        return max(1, int(os.getenv('SWEEP_WORKERS') or os.cpu_count() or 1))
+
+    @classmethod
+    def pool(cls):
+        with cls._pool_lock:
+            if cls._pool is None:
+                # Spawned rather than forked: the server has threads that may hold locks.
+                cls._pool = ProcessPoolExecutor(cls.workers(), mp_context=multiprocessing.get_context('spawn'))
+            return cls._pool
+
+    def prepare(self, network):
+        """Check ``network`` can be swept and snapshot it; call while holding it."""
+        if self.resolutions is not None and not sweepable_inputs(network):
+            raise ValueError("resolutions need an image, text or audio input layer with an input_shape")
+        # Layers and edges only; the history and other listeners stay behind.
+        edges = [(c.id, c.source.id, c.target.id) for c in network.connections.values()]
+        return pickle.dumps((list(network.layers.values()), edges))
+
+    def run(self, payload):
+        """The table for a network snapshot from ``prepare``."""
+        resolutions = self.resolutions or [None]
+        workers = min(self.workers(), len(resolutions))
+        if workers == 1:
+            rows = evaluate_resolutions(payload, resolutions, self.batch_sizes, self.dtype)
+        else:
+            size = -(-len(resolutions) // workers)
+            runs = [resolutions[i:i + size] for i in range(0, len(resolutions), size)]
+            futures = [self.pool().submit(evaluate_resolutions, payload, run, self.batch_sizes, self.dtype)
+                       for run in runs]
+            rows = [row for future in futures for row in future.result()]
+        return {
+            "dtype": self.dtype,
+            "columns": list(COLUMNS),
+            "rows": rows,
+            "points": len(rows),
+            "workers": workers,
+        }
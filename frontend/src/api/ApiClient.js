@@ -62,13 +62,59 @@ class ApiClient {
       if (!data.layer_types) {
         console.warn("ApiClient: No layer_types property in response");
       }
-      return data.layer_types || [];
+      const layerTypes = data.layer_types || [];
+      await this.resolveSvgAssets(layerTypes);
+      return layerTypes;
     } catch (error) {
       console.error("ApiClient: Error getting layer types:", error);
       throw error;
     }
   }
 
+  async getAsset(hash) {
+    if (!this.assetRequests) {
+      this.assetRequests = new Map();
+    }
+    if (!this.assetRequests.has(hash)) {
+      const request = fetch(`${API_URL}/assets/${hash}.svg`, { mode: "cors" })
+        .then((response) => {
+          if (!response.ok) {
+            throw new Error(`API error: ${response.status}`);
+          }
+          return response.text();
+        })
+        .catch((error) => {
+          this.assetRequests.delete(hash);
+          throw error;
+        });
+      this.assetRequests.set(hash, request);
+    }
+    return this.assetRequests.get(hash);
+  }
+
+  async resolveSvgAssets(layerTypes) {
+    // The catalog only lists content hashes; fill in svg_content and
+    // all_representations so the rest of the UI can keep using them.
+    await Promise.all(
+      layerTypes.map(async (layerType) => {
+        const svg = layerType.svg_representation;
+        if (!svg || !svg.svg_hash) {
+          return;
+        }
+        svg.svg_content = await this.getAsset(svg.svg_hash);
+        if (svg.all_hashes) {
+          const entries = await Promise.all(
+            Object.entries(svg.all_hashes).map(async ([name, hash]) => [
+              name,
+              await this.getAsset(hash),
+            ])
+          );
+          svg.all_representations = Object.fromEntries(entries);
+        }
+      })
+    );
+  }
+
   
 
   async connectLayers(networkId, sourceId, targetId) {
@@ -108,6 +154,127 @@ class ApiClient {
     return result.id;
   }
 
+  async applyBatch(networkId, operations) {
+    return this.fetchApi(`networks/${networkId}/batch`, {
+      method: "POST",
+      body: JSON.stringify({ operations }),
+    });
+  }
+
+  async importGraph(networkId, graph, replace = false) {
+    return this.fetchApi(`networks/${networkId}/batch`, {
+      method: "POST",
+      body: JSON.stringify({ graph, replace }),
+    });
+  }
+
+  async exportPyTorch(networkId) {
+    const response = await fetch(`${API_URL}/networks/${networkId}/export/pytorch`, {
+      headers: getAuthHeader(),
+      mode: "cors",
+    });
+    if (!response.ok) {
+      const errorData = await response.json().catch(() => ({}));
+      throw new Error(errorData.error || `API error: ${response.status}`);
+    }
+    return response.text();
+  }
+
+  async saveSnapshot(networkId, name = null, format = "binary") {
+    return this.fetchApi(`networks/${networkId}/snapshots`, {
+      method: "POST",
+      body: JSON.stringify({ name, format }),
+    });
+  }
+
+  async listSnapshots(networkId = null) {
+    const query = networkId === null ? "" : `?network_id=${encodeURIComponent(networkId)}`;
+    return this.fetchApi(`snapshots${query}`);
+  }
+
+  async restoreSnapshot(snapshotId) {
+    const result = await this.fetchApi(`snapshots/${snapshotId}/restore`, {
+      method: "POST",
+      body: JSON.stringify({}),
+    });
+    return result.id;
+  }
+
+  async undo(networkId) {
+    return this.fetchApi(`networks/${networkId}/undo`, { method: "POST" });
+  }
+
+  async redo(networkId) {
+    return this.fetchApi(`networks/${networkId}/redo`, { method: "POST" });
+  }
+
+  async getHistory(networkId) {
+    return this.fetchApi(`networks/${networkId}/history`);
+  }
+
+  async getVersion(networkId, number) {
+    return this.fetchApi(`networks/${networkId}/history/${number}`);
+  }
+
+  async checkoutVersion(networkId, number) {
+    return this.fetchApi(`networks/${networkId}/history/${number}`, { method: "POST" });
+  }
+
+  async diffNetworks(baseId, otherId, match = "id") {
+    return this.fetchApi("networks/diff", {
+      method: "POST",
+      body: JSON.stringify({ base: baseId, other: otherId, match }),
+    });
+  }
+
+  async mergeNetworks(baseId, oursId, theirsId, apply = false, match = "id") {
+    return this.fetchApi("networks/merge", {
+      method: "POST",
+      body: JSON.stringify({ base: baseId, ours: oursId, theirs: theirsId, apply, match }),
+    });
+  }
+
+  async getRepeatedBlocks(networkId) {
+    return this.fetchApi(`networks/${networkId}/blocks`);
+  }
+
+  async getMemoryPlan(networkId, batchSize = 1, dtype = "float32") {
+    return this.fetchApi(`networks/${networkId}/memory?batch_size=${batchSize}&dtype=${dtype}`);
+  }
+
+  async sweepNetwork(networkId, batchSizes, resolutions = null, dtype = "float32") {
+    // Ranges are lists or {start, stop, step|factor}; rows follow result.columns.
+    return this.fetchApi(`networks/${networkId}/sweep`, {
+      method: "POST",
+      body: JSON.stringify({ batch_sizes: batchSizes, resolutions, dtype }),
+    });
+  }
+
+  async runNetwork(networkId, batchSize = 1, inputs = null, seed = 0) {
+    // inputs maps input layer ids to batch-first nested arrays; random when null.
+    return this.fetchApi(`networks/${networkId}/run`, {
+      method: "POST",
+      body: JSON.stringify({ batch_size: batchSize, inputs, seed }),
+    });
+  }
+
+  async analyzeParallelism(networkId, devices = null, weight = "flops", latencies = null) {
+    // weight: "flops" | "training_flops" | "latency"; latencies maps layer ids to ms
+    // and is measured on the server when omitted.
+    return this.fetchApi(`networks/${networkId}/parallelism`, {
+      method: "POST",
+      body: JSON.stringify({ devices, weight, latencies }),
+    });
+  }
+
+  openLiveChannel(networkId, since = null) {
+    // Frames: {type: "hello"|"state"|"ops"|"ack"|"error", ...}; ops frames carry a seq
+    // to pass back as `since` when reconnecting.
+    const query = since === null ? "" : `?since=${since}`;
+    const url = `${API_URL.replace(/^http/, "ws")}/networks/${networkId}/live${query}`;
+    return new WebSocket(url);
+  }
+
   async sendLogToServer(event) {
     const response = await this.fetchApi('user-logs', {
       method: 'POST',